@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "app.accounts"
-    verbose_name = "用户账户"
\ No newline at end of file
+    verbose_name = "用户账户"
+
+    def ready(self):
+        # 注册管理面板统计快照的信号处理器
+        from . import signals  # noqa: F401
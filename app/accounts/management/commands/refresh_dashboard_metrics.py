@@ -0,0 +1,51 @@
+"""
+管理面板统计刷新Django命令
+重新统计用户、文章、评论、分类总数及今日注册/发文数，写入缓存快照
+建议通过定时任务执行，间隔小于 DASHBOARD_METRICS_TTL
+快照保存在默认缓存中，只有各进程共享的缓存（Redis、文件缓存等）才能把结果交给网站进程；
+LocMemCache（每个进程独立）和 DummyCache（不保存）下本命令的刷新对网站没有作用
+
+使用方法:
+python manage.py refresh_dashboard_metrics         # 刷新统计快照
+python manage.py refresh_dashboard_metrics --show  # 只显示当前快照，不刷新
+"""
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.accounts.services import DashboardMetricsService
+
+
+class Command(BaseCommand):
+    help = '刷新管理面板统计快照'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--show',
+            action='store_true',
+            help='显示当前缓存中的统计快照，不重新统计',
+        )
+
+    def handle(self, *args, **options):
+        # MeteredCache 只统计命中，实际存储在被包装的缓存中
+        backend = getattr(cache, 'backend', cache)
+        if isinstance(backend, (LocMemCache, DummyCache)):
+            self.stdout.write(self.style.WARNING(
+                f'默认缓存为 {type(backend).__name__}，不在进程间共享，刷新结果对网站进程不可见'
+            ))
+        if options['show']:
+            snapshot = DashboardMetricsService.get_snapshot()
+        else:
+            snapshot = DashboardMetricsService.refresh()
+
+        age = (timezone.now() - snapshot['generated_at']).total_seconds()
+        self.stdout.write(self.style.SUCCESS('=== 管理面板统计快照 ==='))
+        self.stdout.write(f"总用户数: {snapshot['total_users']}")
+        self.stdout.write(f"总文章数: {snapshot['total_posts']}")
+        self.stdout.write(f"总评论数: {snapshot['total_comments']}")
+        self.stdout.write(f"总分类数: {snapshot['total_categories']}")
+        self.stdout.write(f"今日注册: {snapshot['today_users']}")
+        self.stdout.write(f"今日发文: {snapshot['today_posts']}")
+        self.stdout.write(f"快照时间: {timezone.localtime(snapshot['generated_at']):%Y-%m-%d %H:%M:%S} ({age:.0f} 秒前)")
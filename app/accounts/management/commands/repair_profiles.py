@@ -0,0 +1,45 @@
+"""
+用户资料修复Django命令
+为缺少 UserProfile 的用户批量补建资料，可一次性执行或由定时任务周期执行
+
+使用方法:
+python manage.py repair_profiles                   # 补建所有缺失的用户资料
+python manage.py repair_profiles --dry-run         # 只统计缺失数量，不写入
+python manage.py repair_profiles --batch-size 500  # 指定每批写入数量
+"""
+from django.core.management.base import BaseCommand
+
+from app.accounts.services import ProfileRepairService
+
+
+class Command(BaseCommand):
+    help = '为缺少用户资料的用户批量创建UserProfile'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ProfileRepairService.DEFAULT_BATCH_SIZE,
+            help=f'每批创建的资料数量 (默认: {ProfileRepairService.DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='只统计缺失资料的用户数量，不写入数据库',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            missing_count = ProfileRepairService.repair_missing_profiles(dry_run=True)
+            self.stdout.write(f'缺少用户资料的用户: {missing_count} 个')
+            return
+
+        created_count = ProfileRepairService.repair_missing_profiles(
+            batch_size=max(1, options['batch_size'])
+        )
+        if created_count:
+            self.stdout.write(
+                self.style.SUCCESS(f'已补建 {created_count} 个用户资料')
+            )
+        else:
+            self.stdout.write('所有用户都已有用户资料')
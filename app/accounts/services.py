@@ -3,8 +3,17 @@
 负责处理登录相关的业务逻辑
 """
 from django.contrib.auth import login
+from django.contrib.auth.models import User
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+import hashlib
+import ipaddress
 import logging
+import time
+
+from app.blog.models import Post, Comment, PostCategory
+from .models import UserProfile
 
 # 获取日志记录器
 logger = logging.getLogger('accounts')
@@ -65,10 +74,312 @@ class LoginService:
         return None
 
 
+class LoginThrottleService:
+    """
+    登录限流服务 - 在密码哈希之前拒绝超限的登录尝试
+    按IP和用户名分别统计失败次数，使用共享缓存中的滑动窗口计数：
+    当前窗口计数 + 上一窗口计数 × 上一窗口仍在滑动窗口内的比例
+    """
+    
+    CACHE_PREFIX = 'login_throttle'
+    DEFAULT_WINDOW = 60 * 15       # 15分钟
+    DEFAULT_IP_LIMIT = 30          # 每个IP窗口内最多失败次数
+    DEFAULT_USERNAME_LIMIT = 5     # 每个用户名窗口内最多失败次数
+    
+    @staticmethod
+    def _window():
+        return getattr(settings, 'LOGIN_THROTTLE_WINDOW', LoginThrottleService.DEFAULT_WINDOW)
+    
+    @staticmethod
+    def _limits():
+        return {
+            'ip': getattr(settings, 'LOGIN_THROTTLE_IP_LIMIT', LoginThrottleService.DEFAULT_IP_LIMIT),
+            'username': getattr(settings, 'LOGIN_THROTTLE_USERNAME_LIMIT', LoginThrottleService.DEFAULT_USERNAME_LIMIT),
+        }
+    
+    @staticmethod
+    def _normalize_ip(value):
+        """
+        校验并规范化IP地址，无效时返回None
+        同一地址的不同写法（IPv6大小写/缩写、IPv4映射的IPv6地址）得到同一个缓存键
+        """
+        try:
+            ip = ipaddress.ip_address((value or '').strip())
+        except ValueError:
+            return None
+        if ip.version == 6:
+            if ip.ipv4_mapped:
+                ip = ip.ipv4_mapped
+            elif ip.scope_id:
+                ip = ipaddress.ip_address(str(ip).split('%', 1)[0])
+        return str(ip)
+    
+    @classmethod
+    def get_client_ip(cls, request):
+        """获取客户端IP，经nginx代理时使用其设置的X-Real-IP；头部不是合法IP时退回REMOTE_ADDR"""
+        if getattr(settings, 'LOGIN_THROTTLE_TRUST_X_REAL_IP', False):
+            real_ip = request.META.get('HTTP_X_REAL_IP')
+            if real_ip:
+                normalized = cls._normalize_ip(real_ip)
+                if normalized:
+                    return normalized
+                logger.warning(f'忽略无效的X-Real-IP: {real_ip[:64]!r}')
+        return cls._normalize_ip(request.META.get('REMOTE_ADDR')) or 'unknown'
+    
+    @staticmethod
+    def _username_identity(username):
+        """用户名统一小写并哈希，避免缓存键含非法字符"""
+        username = (username or '').strip().lower()
+        if not username:
+            return None
+        return hashlib.sha256(username.encode('utf-8')).hexdigest()[:32]
+    
+    @classmethod
+    def _identities(cls, request, username):
+        """返回需要统计的 (维度, 标识) 列表"""
+        identities = [('ip', cls.get_client_ip(request))]
+        username_identity = cls._username_identity(username)
+        if username_identity:
+            identities.append(('username', username_identity))
+        return identities
+    
+    @classmethod
+    def _bucket_keys(cls, scope, identity, now=None):
+        """返回当前窗口和上一窗口的缓存键，以及当前窗口已过去的比例"""
+        window = cls._window()
+        now = time.time() if now is None else now
+        index = int(now // window)
+        elapsed = (now % window) / window
+        current_key = f'{cls.CACHE_PREFIX}:{scope}:{identity}:{index}'
+        previous_key = f'{cls.CACHE_PREFIX}:{scope}:{identity}:{index - 1}'
+        return current_key, previous_key, elapsed
+    
+    @classmethod
+    def _sliding_count(cls, scope, identity):
+        current_key, previous_key, elapsed = cls._bucket_keys(scope, identity)
+        counts = cache.get_many([current_key, previous_key])
+        return counts.get(current_key, 0) + counts.get(previous_key, 0) * (1 - elapsed)
+    
+    @classmethod
+    def is_throttled(cls, request, username):
+        """检查IP或用户名是否超过失败次数限制，超限时记录日志"""
+        limits = cls._limits()
+        for scope, identity in cls._identities(request, username):
+            if cls._sliding_count(scope, identity) >= limits[scope]:
+                logger.warning(
+                    f'登录限流拒绝: 维度 {scope}, 用户名 {username}, '
+                    f'IP: {cls.get_client_ip(request)}'
+                )
+                return True
+        return False
+    
+    @classmethod
+    def record_failure(cls, request, username):
+        """记录一次登录失败"""
+        for scope, identity in cls._identities(request, username):
+            current_key, _previous_key, _elapsed = cls._bucket_keys(scope, identity)
+            # 计数保留两个窗口，保证下一窗口仍能读到本窗口的计数
+            if not cache.add(current_key, 1, cls._window() * 2):
+                try:
+                    cache.incr(current_key)
+                except ValueError:
+                    # 键在add与incr之间过期，重新写入
+                    cache.set(current_key, 1, cls._window() * 2)
+    
+    @classmethod
+    def reset_username(cls, username):
+        """登录成功后清除该用户名的失败计数（IP计数保留）"""
+        username_identity = cls._username_identity(username)
+        if username_identity:
+            current_key, previous_key, _elapsed = cls._bucket_keys('username', username_identity)
+            cache.delete_many([current_key, previous_key])
+
+
 class FormErrorHandler:
     """表单错误处理器 - 专门处理表单错误显示逻辑"""
     
     @staticmethod
     def create_clean_form(form_class, request=None):
         """创建一个干净的表单实例"""
-        return form_class(request) if request else form_class()
\ No newline at end of file
+        return form_class(request) if request else form_class()
+
+
+class ProfileRepairService:
+    """用户资料修复服务 - 为缺失UserProfile的用户批量补建资料"""
+    
+    DEFAULT_BATCH_SIZE = 1000
+    
+    @staticmethod
+    def missing_profile_user_ids():
+        """返回缺少UserProfile的用户ID查询集（LEFT JOIN，不加载用户对象）"""
+        return User.objects.filter(profile__isnull=True).order_by('id').values_list('id', flat=True)
+    
+    @staticmethod
+    def repair_missing_profiles(batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+        """
+        分批为缺失资料的用户创建UserProfile
+        返回补齐资料的用户数量（dry_run时为缺失资料的用户数量）
+        
+        ignore_conflicts 跳过的行（其他进程同时补建的资料）不返回主键，无法区分由谁创建，
+        因此按执行前后缺失数量之差计算，期间被并发补齐的用户同样计入
+        """
+        user_ids = ProfileRepairService.missing_profile_user_ids()
+        missing_before = user_ids.count()
+        if dry_run or not missing_before:
+            return missing_before
+        
+        # 每批重新查询第一页：已补建的用户不再出现在LEFT JOIN结果中
+        while True:
+            batch = list(user_ids[:batch_size])
+            if not batch:
+                break
+            UserProfile.objects.bulk_create(
+                [UserProfile(user_id=user_id) for user_id in batch],
+                ignore_conflicts=True,
+            )
+        
+        # 循环结束后才出现的缺失用户会让差值偏小，取0为下限
+        repaired_count = max(0, missing_before - user_ids.count())
+        if repaired_count:
+            logger.info(f'已为 {repaired_count} 个用户补建用户资料')
+        return repaired_count
+    
+    @staticmethod
+    def ensure_profiles_for(users):
+        """
+        只为给定的用户列表（通常是当前分页）补建缺失的资料
+        users 需已通过 select_related('profile') 加载
+        """
+        missing = {user.pk: user for user in users if not hasattr(user, 'profile')}
+        if not missing:
+            return 0
+        UserProfile.objects.bulk_create(
+            [UserProfile(user_id=user_id) for user_id in missing],
+            ignore_conflicts=True,
+        )
+        # ignore_conflicts 不回填主键，且冲突时数据库中是其他请求创建的资料，
+        # 重新读取已保存的资料回填反向一对一缓存，模板访问 user.profile 时不再查询
+        for profile in UserProfile.objects.filter(user_id__in=missing):
+            user = missing[profile.user_id]
+            profile.user = user
+            user.profile = profile
+        logger.info(f'当前页补建了 {len(missing)} 个用户资料')
+        return len(missing)
+
+
+class DashboardMetricsService:
+    """
+    管理面板统计快照服务
+    统计数据由定时任务（refresh_dashboard_metrics 命令）周期重算并存入缓存（不设过期时间），
+    期间的新增通过信号、删除由执行删除的视图按级联删除数量增量更新，面板加载时只读取快照。
+    快照超过 DASHBOARD_METRICS_TTL 未刷新时仍先返回旧快照，只由取得刷新锁的一个请求重算
+    """
+    
+    CACHE_KEY = 'accounts:dashboard_metrics'
+    # 过期快照的刷新锁，同一时间只有一个请求重算
+    REFRESH_LOCK_KEY = 'accounts:dashboard_metrics:refreshing'
+    REFRESH_LOCK_TIMEOUT = 60
+    DEFAULT_TTL = 60 * 10  # 10分钟
+    
+    # 快照字段与对应模型
+    COUNTED_MODELS = {
+        'total_users': User,
+        'total_posts': Post,
+        'total_comments': Comment,
+        'total_categories': PostCategory,
+    }
+    # 按天统计的字段与对应模型、时间字段
+    DAILY_MODELS = {
+        'today_users': (User, 'date_joined'),
+        'today_posts': (Post, 'created_at'),
+    }
+    
+    @staticmethod
+    def _ttl():
+        return getattr(settings, 'DASHBOARD_METRICS_TTL', DashboardMetricsService.DEFAULT_TTL)
+    
+    @staticmethod
+    def _today_start():
+        """当前时区今天零点"""
+        return timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    @classmethod
+    def compute_snapshot(cls):
+        """重新统计所有数据（COUNT查询，只应由定时任务或快照缺失、过期时调用）"""
+        today_start = cls._today_start()
+        snapshot = {
+            field: model.objects.count()
+            for field, model in cls.COUNTED_MODELS.items()
+        }
+        for field, (model, time_field) in cls.DAILY_MODELS.items():
+            snapshot[field] = model.objects.filter(**{f'{time_field}__gte': today_start}).count()
+        snapshot['date'] = today_start.date().isoformat()
+        snapshot['generated_at'] = timezone.now()
+        return snapshot
+    
+    @classmethod
+    def refresh(cls):
+        """重算快照并写入缓存（不过期，由下一次刷新覆盖）"""
+        snapshot = cls.compute_snapshot()
+        cache.set(cls.CACHE_KEY, snapshot, None)
+        logger.info(f'管理面板统计快照已刷新: {snapshot}')
+        return snapshot
+    
+    @classmethod
+    def is_stale(cls, snapshot):
+        """快照是否超过 DASHBOARD_METRICS_TTL 未刷新"""
+        return (timezone.now() - snapshot['generated_at']).total_seconds() >= cls._ttl()
+    
+    @classmethod
+    def get_snapshot(cls):
+        """
+        读取统计快照：缓存中没有时重算；快照过期时取得刷新锁的请求重算，
+        其他请求直接返回旧快照，不会同时重复执行统计查询
+        """
+        snapshot = cache.get(cls.CACHE_KEY)
+        if snapshot is None:
+            return cls.refresh()
+        if cls.is_stale(snapshot) and cache.add(cls.REFRESH_LOCK_KEY, True, cls.REFRESH_LOCK_TIMEOUT):
+            try:
+                snapshot = cls.refresh()
+            finally:
+                cache.delete(cls.REFRESH_LOCK_KEY)
+        return snapshot
+    
+    @classmethod
+    def apply_delta(cls, model, delta, created_at=None):
+        """
+        按模型增减快照中的计数，快照不存在时不做处理（下次读取时重算）
+        读改写非原子，多进程并发时可能有少量误差，由周期刷新校正
+        """
+        snapshot = cache.get(cls.CACHE_KEY)
+        if snapshot is None:
+            return
+        for field, counted_model in cls.COUNTED_MODELS.items():
+            if counted_model is model:
+                snapshot[field] = max(0, snapshot[field] + delta)
+        for field, (daily_model, _time_field) in cls.DAILY_MODELS.items():
+            if (daily_model is model and created_at is not None
+                    and timezone.localtime(created_at).date().isoformat() == snapshot['date']):
+                snapshot[field] = max(0, snapshot[field] + delta)
+        cache.set(cls.CACHE_KEY, snapshot, None)
+    
+    @classmethod
+    def apply_deletion(cls, instance, deleted):
+        """
+        删除记录后按删除数量减少统计计数，deleted 为 Model.delete() 返回的 {模型标签: 数量}
+        级联删除的记录一并计入总数；今日统计只能按被删除的记录本身判断，
+        级联删除的今日记录由周期刷新校正
+        """
+        snapshot = cache.get(cls.CACHE_KEY)
+        if snapshot is None:
+            return
+        for field, model in cls.COUNTED_MODELS.items():
+            count = deleted.get(model._meta.label, 0)
+            if count:
+                snapshot[field] = max(0, snapshot[field] - count)
+        for field, (model, time_field) in cls.DAILY_MODELS.items():
+            if (type(instance) is model
+                    and timezone.localtime(getattr(instance, time_field)).date().isoformat() == snapshot['date']):
+                snapshot[field] = max(0, snapshot[field] - 1)
+        cache.set(cls.CACHE_KEY, snapshot, None)
@@ -0,0 +1,36 @@
+"""
+账户应用信号处理模块
+在用户、文章、评论、分类新建时增量更新管理面板统计快照
+删除不使用 post_delete 信号：接收器会让Django逐行加载级联删除的记录（无法快速删除），
+改由执行删除的视图按 delete() 返回的级联删除数量调用 DashboardMetricsService.apply_deletion
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from app.blog.models import Post, Comment, PostCategory
+from .services import DashboardMetricsService
+
+# 需要计入管理面板统计的模型及其创建时间字段
+DASHBOARD_COUNTED_MODELS = {
+    User: 'date_joined',
+    Post: 'created_at',
+    Comment: 'created_at',
+    PostCategory: None,
+}
+
+
+def _created_at(instance):
+    time_field = DASHBOARD_COUNTED_MODELS[type(instance)]
+    return getattr(instance, time_field) if time_field else None
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=PostCategory)
+def increment_dashboard_metrics(sender, instance, created, raw=False, **kwargs):
+    """新建记录时增加统计计数"""
+    if created and not raw:
+        DashboardMetricsService.apply_delta(sender, 1, _created_at(instance))
+
@@ -1,3 +1,232 @@
-from django.test import TestCase
+"""
+用户应用测试
+查询预算：accounts/urls.py 中的每个URL都按视图声明的预算（@query_budget）检查查询次数，
+稿件管理页另外检查查询次数不随文章、分类、评论数量增长
+登录限流：X-Real-IP 校验与规范化、超限后在密码哈希之前拒绝、滑动窗口过去后解除限制
+用户资料修复：repair_profiles 命令的统计与分批补建、当前页补建时回填已保存的资料
+"""
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from app.blog.models import Post, PostCategory
+from app.blog.tests import add_posts, build_budget_fixture
+from app.core.querybudget import QueryBudgetTestMixin, QueryRecorder
+from . import urls as accounts_urls
+from .models import UserProfile
+from .services import LoginThrottleService, ProfileRepairService
+
+
+class AccountsQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """accounts/urls.py 中每个URL的查询预算"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = build_budget_fixture()
+        cls.data['own_post'] = Post.objects.filter(author=cls.data['author']).last()
+
+    def cases(self):
+        """路由 -> (URL名称, URL参数, 请求方法, 登录用户, 请求数据)"""
+        data = self.data
+        author, reader, stranger = data['author'], data['reader'], data['stranger']
+        category = data['category']
+        return {
+            'login/': ('login', {}, 'get', None, None),
+            'logout/': ('logout', {}, 'get', 'reader', None),
+            'signup/': ('signup', {}, 'get', None, None),
+            'profile/': ('profile_center', {}, 'get', 'author', None),
+            'profile/user/<int:user_id>/': ('user_profile', {'user_id': author.id}, 'get', 'reader', None),
+            'dashboard/': ('dashboard', {}, 'get', 'author', None),
+            'manuscripts/': ('manuscript_management', {}, 'get', 'author', None),
+            'manuscripts/user/<int:user_id>/': (
+                'user_manuscript_management', {'user_id': author.id}, 'get', 'reader', None),
+            'category/edit/<int:category_id>/': ('edit_category', {'category_id': category.id}, 'get', 'author', None),
+            'category/delete/<int:category_id>/': (
+                'delete_category', {'category_id': category.id}, 'get', 'author', None),
+            'category/<int:category_id>/posts/': ('category_posts', {'category_id': category.id}, 'get', 'author', None),
+            'user/<int:user_id>/category/<int:category_id>/posts/': (
+                'user_category_posts', {'user_id': author.id, 'category_id': category.id}, 'get', 'reader', None),
+            'post/create/': ('create_post', {}, 'get', 'author', None),
+            'post/create/<int:category_id>/': ('create_post', {'category_id': category.id}, 'get', 'author', None),
+            'post/edit/<int:post_id>/': ('edit_post', {'post_id': data['post'].id}, 'get', 'author', None),
+            'post/delete/<int:post_id>/': ('delete_post', {'post_id': data['own_post'].id}, 'post', 'author', None),
+            'settings/': ('user_settings', {}, 'get', 'author', None),
+            'settings/profile/': ('edit_profile', {}, 'get', 'author', None),
+            'settings/password/': ('change_password', {}, 'get', 'author', None),
+            'admin/': ('admin_panel', {}, 'get', 'admin', None),
+            'admin/users/': ('admin_users', {}, 'get', 'admin', None),
+            'admin/user/delete/<int:user_id>/': ('admin_delete_user', {'user_id': stranger.id}, 'get', 'admin', None),
+            'admin/user/mute/<int:user_id>/': (
+                'admin_mute_user', {'user_id': stranger.id}, 'post', 'admin', {'duration_hours': '2'}),
+            'admin/user/unmute/<int:user_id>/': ('admin_unmute_user', {'user_id': stranger.id}, 'post', 'admin', None),
+            'admin/user/ban/<int:user_id>/': ('admin_ban_user', {'user_id': reader.id}, 'post', 'admin', None),
+            'admin/user/unban/<int:user_id>/': ('admin_unban_user', {'user_id': reader.id}, 'post', 'admin', None),
+        }
+
+    def test_every_url_has_budget_case(self):
+        routes = {str(pattern.pattern) for pattern in accounts_urls.urlpatterns}
+        self.assertEqual(routes - set(self.cases()), set())
+
+    def test_urls_within_budget(self):
+        for route, (name, kwargs, method, user_key, payload) in self.cases().items():
+            with self.subTest(route=route):
+                self.client.logout()
+                if user_key:
+                    self.client.force_login(self.data[user_key])
+                self.assertViewQueryBudget(reverse(f'accounts:{name}', kwargs=kwargs), method=method, data=payload)
+
+
+class ManuscriptQueryScalingTests(TestCase):
+    """稿件管理页的查询次数不随文章、分类和评论数量增长"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = build_budget_fixture(posts_per_author=3, comments_per_post=2)
+
+    def count_queries(self, url):
+        with QueryRecorder() as recorder:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return recorder.count
+
+    def test_manuscripts_do_not_scale_with_content(self):
+        author = self.data['author']
+        self.client.force_login(author)
+        url = reverse('accounts:manuscript_management')
+        before = self.count_queries(url)
+        for number in range(3):
+            category = PostCategory.objects.create(name=f'扩展分类 {number}', owner=author)
+            add_posts(author, category, 2, 3, commenters=[self.data['reader'], self.data['stranger']])
+        self.assertEqual(self.count_queries(url), before)
+
+    def test_admin_category_changelist_does_not_scale_with_categories(self):
+        self.client.force_login(self.data['admin'])
+        url = reverse('admin:blog_postcategory_changelist')
+        before = self.count_queries(url)
+        for number in range(5):
+            category = PostCategory.objects.create(name=f'后台分类 {number}', owner=self.data['stranger'])
+            add_posts(self.data['stranger'], category, 1, 1, commenters=[self.data['reader']])
+        self.assertEqual(self.count_queries(url), before)
+
+
+@override_settings(LOGIN_THROTTLE_WINDOW=60, LOGIN_THROTTLE_USERNAME_LIMIT=3, LOGIN_THROTTLE_IP_LIMIT=30)
+class LoginThrottleTests(TestCase):
+    """登录限流的滑动窗口与客户端IP识别"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('throttled', password='correct-password')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def client_ip(self, remote_addr='127.0.0.1', real_ip=None):
+        extra = {'HTTP_X_REAL_IP': real_ip} if real_ip is not None else {}
+        return LoginThrottleService.get_client_ip(RequestFactory().get('/', REMOTE_ADDR=remote_addr, **extra))
+
+    def at(self, now):
+        """固定限流服务看到的当前时间"""
+        return mock.patch('app.accounts.services.time.time', return_value=now)
+
+    def test_client_ip_normalized(self):
+        with self.settings(LOGIN_THROTTLE_TRUST_X_REAL_IP=True):
+            self.assertEqual(self.client_ip(real_ip=' 203.0.113.7 '), '203.0.113.7')
+            self.assertEqual(self.client_ip(real_ip='2001:DB8:0:0::1'), '2001:db8::1')
+            self.assertEqual(self.client_ip(real_ip='::ffff:203.0.113.7'), '203.0.113.7')
+            self.assertEqual(self.client_ip(real_ip='fe80::1%eth0'), 'fe80::1')
+            # 非法的头部不进入缓存键，退回到连接地址
+            self.assertEqual(self.client_ip(real_ip='1.2.3.4:99 x'), '127.0.0.1')
+            self.assertEqual(self.client_ip(remote_addr='', real_ip='nonsense'), 'unknown')
+        with self.settings(LOGIN_THROTTLE_TRUST_X_REAL_IP=False):
+            self.assertEqual(self.client_ip(real_ip='203.0.113.7'), '127.0.0.1')
+
+    def test_throttled_before_password_check(self):
+        url = reverse('accounts:login')
+        with mock.patch.object(ModelBackend, 'authenticate', autospec=True,
+                               side_effect=ModelBackend.authenticate) as authenticate:
+            for _ in range(3):
+                self.client.post(url, {'username': 'throttled', 'password': 'wrong'})
+            self.assertEqual(authenticate.call_count, 3)
+
+            # 超限后即使密码正确也在哈希之前被拒绝
+            response = self.client.post(url, {'username': 'throttled', 'password': 'correct-password'})
+            self.assertRedirects(response, url, fetch_redirect_response=False)
+            self.assertEqual(authenticate.call_count, 3)
+            self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_sliding_window_releases(self):
+        request = RequestFactory().post('/', REMOTE_ADDR='198.51.100.1')
+        start = 1000 * 60
+        with self.at(start):
+            for _ in range(3):
+                LoginThrottleService.record_failure(request, 'throttled')
+            self.assertTrue(LoginThrottleService.is_throttled(request, 'throttled'))
+            # 其他用户名不受影响（IP仍未超限）
+            self.assertFalse(LoginThrottleService.is_throttled(request, 'someone-else'))
+        # 进入下一窗口时上一窗口的计数按剩余比例计入，不会在窗口边界一次性清零
+        with self.at(start + 60):
+            self.assertTrue(LoginThrottleService.is_throttled(request, 'throttled'))
+        with self.at(start + 60 + 30):
+            self.assertFalse(LoginThrottleService.is_throttled(request, 'throttled'))
+        with self.at(start + 120):
+            self.assertFalse(LoginThrottleService.is_throttled(request, 'throttled'))
+
+
+class ProfileRepairTests(TestCase):
+    """为缺少 UserProfile 的用户补建资料"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'no-profile-{number}') for number in range(5)]
+        cls.complete = User.objects.create_user('has-profile')
+        # 用户创建时信号会自动建资料，删除后模拟历史遗留数据
+        UserProfile.objects.filter(user__in=cls.users).delete()
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('repair_profiles', *args, stdout=out)
+        return out.getvalue().strip()
+
+    def test_command_repairs_in_batches(self):
+        self.assertEqual(self.run_command('--dry-run'), '缺少用户资料的用户: 5 个')
+        self.assertEqual(list(ProfileRepairService.missing_profile_user_ids()), [user.pk for user in self.users])
+
+        self.assertEqual(self.run_command('--batch-size', '2'), '已补建 5 个用户资料')
+        self.assertFalse(ProfileRepairService.missing_profile_user_ids().exists())
+        self.assertEqual(UserProfile.objects.count(), 6)
+        self.assertEqual(self.run_command(), '所有用户都已有用户资料')
+
+    def test_repair_count_from_missing_before_and_after(self):
+        # 已有资料的用户不计入；查询缺失用户之后其他进程补建的资料按文档计入（执行前后缺失数量之差）
+        bulk_create = UserProfile.objects.bulk_create
+
+        def concurrent_bulk_create(profiles, **kwargs):
+            if not UserProfile.objects.filter(user=self.users[0]).exists():
+                UserProfile.objects.create(user=self.users[0])
+            return bulk_create(profiles, **kwargs)
+
+        UserProfile.objects.create(user=self.users[1])
+        with mock.patch.object(UserProfile.objects, 'bulk_create', side_effect=concurrent_bulk_create):
+            self.assertEqual(ProfileRepairService.repair_missing_profiles(batch_size=10), 4)
+        self.assertEqual(UserProfile.objects.filter(user__in=self.users).count(), 5)
+
+    def test_ensure_profiles_attaches_saved_profiles(self):
+        users = list(User.objects.select_related('profile').order_by('pk'))
+        # 页面加载后、补建之前，另一个请求为其中一个用户建了资料
+        existing = UserProfile.objects.create(user=self.users[0], displayname='并发创建')
+
+        self.assertEqual(ProfileRepairService.ensure_profiles_for(users), 5)
+        with self.assertNumQueries(0):
+            profiles = {user.pk: user.profile for user in users}
+        self.assertTrue(all(profile.pk for profile in profiles.values()))
+        self.assertEqual(profiles[self.users[0].pk].pk, existing.pk)
+        self.assertEqual(profiles[self.users[0].pk].displayname, '并发创建')
+        self.assertIs(profiles[self.users[1].pk].user, users[1])
+        self.assertEqual(ProfileRepairService.ensure_profiles_for(users), 0)
@@ -18,10 +18,14 @@ from django.middleware.csrf import get_token
 # (目前没有第三方库导入)
 
 # 本地应用导入
+from app.core.db_router import read_from_replica
+from app.core.querybudget import query_budget
 from app.blog.models import PostCategory, Post, Comment, UserFollow
 from app.blog.forms import PostCategoryForm, PostForm
-from app.blog.views import get_visible_posts
-from .services import LoginService, FormErrorHandler
+from app.blog.views import attach_comment_counts, get_visible_posts
+from .services import (
+    LoginService, LoginThrottleService, FormErrorHandler, ProfileRepairService, DashboardMetricsService,
+)
 from .forms import CustomUserCreationForm, UserProfileForm, CustomPasswordChangeForm, CustomAuthenticationForm
 from .models import UserProfile
 
@@ -29,6 +33,7 @@ from .models import UserProfile
 logger = logging.getLogger('accounts')
 
 # signup视图，注册成功后重定向避免刷新提示
+@query_budget(8)
 def signup(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
@@ -48,6 +53,7 @@ def signup(request):
     return render(request, 'accounts/signup.html', {'form': form})
 
 # 重构后的登录视图 - 遵循模块化设计原则
+@query_budget(6)
 def custom_login(request):
     """登录视图 - 使用服务类处理业务逻辑"""
     if request.method == 'POST':
@@ -58,6 +64,13 @@ def custom_login(request):
 
 def _handle_login_post(request):
     """处理POST请求的登录逻辑"""
+    username = request.POST.get('username', '')
+    
+    # 超过失败次数限制时直接拒绝，不进入密码哈希
+    if LoginThrottleService.is_throttled(request, username):
+        messages.error(request, '登录失败次数过多，请稍后再试。')
+        return redirect('accounts:login')
+    
     form = CustomAuthenticationForm(request, data=request.POST)
     
     if form.is_valid():
@@ -65,10 +78,12 @@ def _handle_login_post(request):
         if user:
             # 使用登录服务处理成功登录
             remember_me = form.cleaned_data.get('remember_me')
+            LoginThrottleService.reset_username(username)
             LoginService.handle_successful_login(request, user, remember_me)
             return redirect('homepage')
     
-    # 登录失败，存储错误信息并重定向
+    # 登录失败，记录失败次数，存储错误信息并重定向
+    LoginThrottleService.record_failure(request, username)
     LoginService.store_login_errors(request, form)
     return redirect('accounts:login')
 
@@ -85,6 +100,7 @@ def _handle_login_get(request):
     return render(request, 'accounts/login.html', {'form': form})
 
 # 自定义退出登录视图（不显示消息）
+@query_budget(8)
 def custom_logout(request):
     """自定义退出登录视图，不显示消息提示"""
     logout(request)
@@ -92,6 +108,8 @@ def custom_logout(request):
 
 # 个人中心入口页面
 @login_required
+@read_from_replica
+@query_budget(10)
 def profile_center(request):
     """自己的个人中心入口页面，展示基本信息和快速操作"""
     target_user = request.user
@@ -113,6 +131,8 @@ def profile_center(request):
     return render(request, 'accounts/profile_center.html', context)
 
 @login_required
+@read_from_replica
+@query_budget(12)
 def user_profile(request, user_id):
     """其他用户的个人中心页面"""
     target_user = get_object_or_404(User, id=user_id)
@@ -144,6 +164,8 @@ def user_profile(request, user_id):
 # 稿件管理页面
 @login_required
 @csrf_protect
+@read_from_replica
+@query_budget(18, template_queries=2)
 def manuscript_management(request, user_id=None):
     """稿件管理页面，管理文章分类"""
     # 确定要查看的用户
@@ -165,36 +187,44 @@ def manuscript_management(request, user_id=None):
         # 查看别人的文章，根据权限过滤
         user_posts = get_visible_posts(request.user).filter(author=target_user)
     
-    total_posts = user_posts.count()
-    total_categories = PostCategory.objects.filter(owner=target_user).count()
+    # 文章只查询一次，按分类分组后在内存中统计篇数和字数
+    posts = list(user_posts.only(
+        'id', 'content', 'category_id', 'likes_count', 'favorites_count'
+    ))
+    categories = list(categories)
+    total_posts = len(posts)
+    total_categories = len(categories)
+    
+    posts_by_category = {}
+    for post in posts:
+        posts_by_category.setdefault(post.category_id, []).append(post)
     
     # 计算总字数
-    total_words = sum(post.word_count for post in user_posts)
+    total_words = sum(post.word_count for post in posts)
     
     # 计算未分类文章数量和字数
-    uncategorized_posts = user_posts.filter(category__isnull=True)
-    uncategorized_posts_count = uncategorized_posts.count()
+    uncategorized_posts = posts_by_category.get(None, [])
+    uncategorized_posts_count = len(uncategorized_posts)
     uncategorized_word_count = sum(post.word_count for post in uncategorized_posts)
     
     # 为每个分类计算字数
     categories_with_stats = []
     for category in categories:
-        category_posts = user_posts.filter(category=category)
-        category_word_count = sum(post.word_count for post in category_posts)
+        category_posts = posts_by_category.get(category.id, [])
         categories_with_stats.append({
             'category': category,
-            'post_count': category_posts.count(),
-            'word_count': category_word_count
+            'post_count': len(category_posts),
+            'word_count': sum(post.word_count for post in category_posts)
         })
     
     # 获取关注统计
     followers_count = UserFollow.objects.filter(following=target_user).count()
     following_count = UserFollow.objects.filter(follower=target_user).count()
     
-    # 计算总点赞数、收藏数、评论数
-    total_likes = sum(post.likes_count for post in user_posts)
-    total_favorites = sum(post.favorites_count for post in user_posts)
-    total_comments = sum(post.comments.count() for post in user_posts)
+    # 计算总点赞数、收藏数、评论数（评论数用一次COUNT查询）
+    total_likes = sum(post.likes_count for post in posts)
+    total_favorites = sum(post.favorites_count for post in posts)
+    total_comments = Comment.objects.filter(post__in=user_posts).count()
     
     # 检查当前用户是否关注了目标用户
     is_following = False
@@ -244,6 +274,7 @@ def manuscript_management(request, user_id=None):
 
 # 编辑文章分类
 @login_required
+@query_budget(10)
 def edit_category(request, category_id):
     """编辑文章分类"""
     category = get_object_or_404(PostCategory, id=category_id, owner=request.user)
@@ -270,13 +301,15 @@ def edit_category(request, category_id):
 
 # 删除文章分类
 @login_required
+@query_budget(12)
 def delete_category(request, category_id):
     """删除文章分类"""
     category = get_object_or_404(PostCategory, id=category_id, owner=request.user)
     
     if request.method == 'POST':
         category_name = category.name
-        category.delete()
+        deleted = category.delete()[1]
+        DashboardMetricsService.apply_deletion(category, deleted)
         # messages.success(request, f'分类「{category_name}」删除成功！')
         return redirect('accounts:manuscript_management')
     
@@ -287,6 +320,7 @@ def delete_category(request, category_id):
 
 # 分类详情页，管理该分类下的文章
 @login_required
+@query_budget(15, template_queries=2)
 def category_posts(request, category_id, user_id=None):
     """分类详情页，管理该分类下的文章"""
     # 确定要查看的用户
@@ -305,7 +339,7 @@ def category_posts(request, category_id, user_id=None):
             posts = Post.objects.filter(category=category, author=target_user).order_by('-created_at')
         else:
             # 查看别人的文章，根据权限过滤
-            user_posts = get_visible_posts(request.user).filter(category=category, author=target_user).order_by('-created_at')
+            posts = get_visible_posts(request.user).filter(category=category, author=target_user).order_by('-created_at')
     else:
         # 未分类文章 - 只显示目标用户的未分类文章
         if is_own_page:
@@ -314,10 +348,11 @@ def category_posts(request, category_id, user_id=None):
             # 查看别人的文章，根据权限过滤
             posts = get_visible_posts(request.user).filter(category__isnull=True, author=target_user).order_by('-created_at')
     
-    # 分页
-    paginator = Paginator(posts, 10)
+    # 分页，预加载文章卡片用到的作者资料和分类，评论数按页一次查询
+    paginator = Paginator(posts.select_related('author__profile', 'category'), 10)
     page_number = request.GET.get('page')
     posts = paginator.get_page(page_number)
+    attach_comment_counts(posts)
     
     context = {
         'category': category,
@@ -329,6 +364,7 @@ def category_posts(request, category_id, user_id=None):
 
 # 创建新文章
 @login_required
+@query_budget(12)
 def create_post(request, category_id=None):
     """创建新文章"""
     category = None
@@ -358,6 +394,7 @@ def create_post(request, category_id=None):
 
 # 编辑文章
 @login_required
+@query_budget(12)
 def edit_post(request, post_id):
     """编辑文章"""
     # 管理员可以编辑任何文章，普通用户只能编辑自己的文章
@@ -385,6 +422,7 @@ def edit_post(request, post_id):
 
 # 删除文章
 @login_required
+@query_budget(16)
 def delete_post(request, post_id):
     """删除文章"""
     # 管理员可以删除任何文章，普通用户只能删除自己的文章
@@ -396,7 +434,8 @@ def delete_post(request, post_id):
     if request.method == 'POST':
         category_id = post.category.id if post.category else None
         post_title = post.title
-        post.delete()
+        deleted = post.delete()[1]
+        DashboardMetricsService.apply_deletion(post, deleted)
         # messages.success(request, f'文章「{post_title}」删除成功！')
         if category_id:
             return redirect('accounts:category_posts', category_id=category_id)
@@ -405,6 +444,7 @@ def delete_post(request, post_id):
 
 # 新增：获取用户关注状态的AJAX视图
 @login_required
+@query_budget(8)
 def get_user_follow_status(request, user_id):
     """获取用户关注状态"""
     target_user = get_object_or_404(User, id=user_id)
@@ -429,6 +469,7 @@ def get_user_follow_status(request, user_id):
 
 # 保留原有的dashboard视图，但重定向到新的个人中心
 @login_required
+@query_budget(8)
 def dashboard(request):
     """重定向到新的个人中心"""
     return redirect('accounts:profile_center')
@@ -436,6 +477,7 @@ def dashboard(request):
 # ==================== 用户设置功能 ====================
 
 @login_required
+@query_budget(8)
 def user_settings(request):
     """用户设置主页"""
     # 获取要查看的用户ID（从URL参数）
@@ -462,6 +504,7 @@ def user_settings(request):
     return render(request, 'accounts/user_settings.html', context)
 
 @login_required
+@query_budget(10)
 def edit_profile(request):
     """修改用户信息"""
     # 获取要修改的用户ID（从URL参数）
@@ -500,6 +543,7 @@ def edit_profile(request):
     return render(request, 'accounts/edit_profile.html', context)
 
 @login_required
+@query_budget(10)
 def change_password(request):
     """修改密码"""
     # 获取要修改的用户ID（从URL参数）
@@ -550,6 +594,7 @@ def change_password(request):
 # ==================== 超级管理员功能 ====================
 
 @login_required
+@query_budget(18, template_queries=6)
 def admin_panel(request):
     """超级管理员面板"""
     if not request.user.is_superuser:
@@ -557,22 +602,24 @@ def admin_panel(request):
         return redirect('accounts:profile_center')
     
     
-    # 统计信息
-    total_users = User.objects.count()
-    total_posts = Post.objects.count()
-    total_comments = Comment.objects.count()
-    total_categories = PostCategory.objects.count()
+    # 统计信息 - 读取周期刷新的统计快照，不在请求中执行COUNT(*)
+    metrics = DashboardMetricsService.get_snapshot()
     
     # 最近活动
     recent_users = User.objects.order_by('-date_joined')[:3]  # 显示3个最近注册用户
-    recent_posts = Post.objects.order_by('-created_at')[:1]   # 显示1个最近文章
-    recent_comments = Comment.objects.select_related('author', 'post').order_by('-created_at')[:2]  # 显示2个最近评论
+    recent_posts = Post.objects.select_related('author__profile', 'category').order_by('-created_at')[:1]   # 显示1个最近文章
+    recent_comments = Comment.objects.select_related(
+        'author', 'post__author', 'post__category'
+    ).order_by('-created_at')[:2]  # 显示2个最近评论，预加载生成文章链接所需的作者和分类
     
     context = {
-        'total_users': total_users,
-        'total_posts': total_posts,
-        'total_comments': total_comments,
-        'total_categories': total_categories,
+        'total_users': metrics['total_users'],
+        'total_posts': metrics['total_posts'],
+        'total_comments': metrics['total_comments'],
+        'total_categories': metrics['total_categories'],
+        'today_users': metrics['today_users'],
+        'today_posts': metrics['today_posts'],
+        'metrics_generated_at': metrics['generated_at'],
         'recent_users': recent_users,
         'recent_posts': recent_posts,
         'recent_comments': recent_comments,
@@ -580,6 +627,7 @@ def admin_panel(request):
     return render(request, 'accounts/admin_panel.html', context)
 
 @login_required
+@query_budget(10, template_queries=2)
 def admin_users(request):
     """管理所有用户"""
     if not request.user.is_superuser:
@@ -587,28 +635,24 @@ def admin_users(request):
         return redirect('accounts:profile_center')
     
     
-    # 获取所有用户并预加载profile信息
-    users = User.objects.select_related('profile').all().order_by('-date_joined')
-    
-    # 为没有profile的用户创建profile
-    for user in users:
-        if not hasattr(user, 'profile'):
-            UserProfile.objects.create(user=user)
-    
-    # 重新获取以确保所有用户都有profile
-    users = User.objects.select_related('profile').all().order_by('-date_joined')
+    # 预加载profile信息，只查询当前页
+    users = User.objects.select_related('profile').order_by('-date_joined')
     
     # 分页
     paginator = Paginator(users, 20)  # 每页显示20个用户
     page_number = request.GET.get('page')
     users = paginator.get_page(page_number)
     
+    # 只为当前页缺失profile的用户补建资料，全量修复使用 repair_profiles 命令
+    ProfileRepairService.ensure_profiles_for(users)
+    
     context = {
         'users': users
     }
     return render(request, 'accounts/admin_users.html', context)
 
 @login_required
+@query_budget(12)
 def admin_delete_user(request, user_id):
     """管理员删除用户账户"""
     if not request.user.is_superuser:
@@ -631,7 +675,8 @@ def admin_delete_user(request, user_id):
     if request.method == 'POST':
         username = target_user.username
         # 删除用户将自动删除其所有文章和评论（因为 CASCADE 外键）
-        target_user.delete()
+        deleted = target_user.delete()[1]
+        DashboardMetricsService.apply_deletion(target_user, deleted)
         messages.success(request, f'管理员操作：已删除用户 {username} 及其所有数据。')
         return redirect('accounts:admin_users')
     
@@ -652,6 +697,7 @@ def admin_delete_user(request, user_id):
 
 @login_required
 @require_POST
+@query_budget(10)
 def admin_mute_user(request, user_id):
     """管理员禁言用户"""
     if not request.user.is_superuser:
@@ -691,6 +737,7 @@ def admin_mute_user(request, user_id):
 
 @login_required
 @require_POST
+@query_budget(10)
 def admin_unmute_user(request, user_id):
     """管理员解除禁言"""
     if not request.user.is_superuser:
@@ -719,6 +766,7 @@ def admin_unmute_user(request, user_id):
 
 @login_required
 @require_POST
+@query_budget(10)
 def admin_ban_user(request, user_id):
     """管理员封禁用户"""
     if not request.user.is_superuser:
@@ -758,6 +806,7 @@ def admin_ban_user(request, user_id):
 
 @login_required
 @require_POST
+@query_budget(10)
 def admin_unban_user(request, user_id):
     """管理员解除封禁"""
     if not request.user.is_superuser:
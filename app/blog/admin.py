@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Count
 from django.utils.html import mark_safe
 from .models import Post, PostCategory, Comment, PostLike, CommentLike, PostFavorite, UserFollow
 
@@ -39,9 +40,14 @@ class PostCategoryAdmin(admin.ModelAdmin):
     list_filter = ['owner']
     search_fields = ['name', 'owner__username']
     
+    def get_queryset(self, request):
+        # 列表页一次统计所有分类的文章数，避免逐行查询
+        return super().get_queryset(request).select_related('owner').annotate(post_total=Count('post'))
+    
     def post_count(self, obj):
-        return obj.post_set.count()
+        return obj.post_total
     post_count.short_description = '文章数量'
+    post_count.admin_order_field = 'post_total'
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -0,0 +1,297 @@
+"""
+博客互动接口的异步视图模块
+点赞、收藏、关注等JSON接口的异步实现，与 views.py 中的同步版本返回相同的数据；
+通过ASGI（gunicorn uvicorn worker）部署时由 urls.py 选用，
+等待数据库期间不占用worker，一个进程可以同时处理大量互动请求
+
+计数字段使用 F() 表达式原子更新，不调用 Post.save()，
+避免每次点赞都重新渲染Markdown，也避免并发点赞时计数丢失
+"""
+# 标准库导入
+import functools
+import logging
+
+# Django 核心导入
+from django.contrib.auth.views import redirect_to_login
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.http import require_POST
+
+# 本地应用导入
+from app.core.querybudget import query_budget
+from .models import Post, Comment, PostLike, CommentLike, PostFavorite, UserFollow
+
+# 获取日志记录器
+logger = logging.getLogger('blog')
+
+
+async def _request_user(request):
+    """
+    当前请求的用户，每个请求只查询一次：
+    同步中间件（UserStatusMiddleware）读取 request.user 后结果缓存在 _cached_user，
+    request.auser() 另有自己的缓存 _acached_user，这里让两者共用同一个对象
+    """
+    user = getattr(request, '_cached_user', None)
+    if user is None:
+        user = await request.auser()
+        request._cached_user = user
+    request._acached_user = user
+    return user
+
+
+def _login_required(view_func):
+    """异步视图的登录检查（同 login_required，但复用已加载的用户）"""
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = await _request_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+async def _adjust_counter(instance, field, delta):
+    """
+    原子增减计数字段，减少时不低于0；返回按已加载的值推算的新计数（用于界面显示），
+    不再单独查询一次，查询次数与同步版本相同
+    """
+    queryset = type(instance).objects.filter(pk=instance.pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gt': 0})
+    await queryset.aupdate(**{field: F(field) + delta})
+    return max(0, getattr(instance, field) + delta)
+
+
+@require_POST
+@_login_required
+@query_budget(12)
+async def post_like(request, post_id):
+    """文章点赞/取消点赞"""
+    post = await aget_object_or_404(Post, id=post_id)
+    user = await _request_user(request)
+
+    try:
+        # 检查是否已经点赞
+        like, created = await PostLike.objects.aget_or_create(user=user, post=post)
+
+        if created or user.is_superuser:
+            # 新点赞；管理员可以重复点赞
+            likes_count = await _adjust_counter(post, 'likes_count', 1)
+            is_liked = True
+        else:
+            # 普通用户取消点赞
+            await like.adelete()
+            likes_count = await _adjust_counter(post, 'likes_count', -1)
+            is_liked = False
+
+        return JsonResponse({
+            'success': True,
+            'is_liked': is_liked,
+            'likes_count': likes_count,
+            'message': ''
+        })
+
+    except Exception as e:
+        logger.error(f'文章点赞失败: {e}')
+        return JsonResponse({
+            'success': False,
+            'message': '操作失败，请重试'
+        })
+
+
+@require_POST
+@_login_required
+@query_budget(12)
+async def comment_like(request, comment_id):
+    """评论点赞/取消点赞"""
+    comment = await aget_object_or_404(Comment, id=comment_id)
+    user = await _request_user(request)
+
+    try:
+        # 检查是否已经点赞
+        like, created = await CommentLike.objects.aget_or_create(user=user, comment=comment)
+
+        if created or user.is_superuser:
+            # 新点赞；管理员可以重复点赞
+            likes_count = await _adjust_counter(comment, 'likes_count', 1)
+            is_liked = True
+        else:
+            # 普通用户取消点赞
+            await like.adelete()
+            likes_count = await _adjust_counter(comment, 'likes_count', -1)
+            is_liked = False
+
+        return JsonResponse({
+            'success': True,
+            'is_liked': is_liked,
+            'likes_count': likes_count,
+            'message': ''
+        })
+
+    except Exception as e:
+        logger.error(f'评论点赞失败: {e}')
+        return JsonResponse({
+            'success': False,
+            'message': '操作失败，请重试'
+        })
+
+
+@require_POST
+@_login_required
+@query_budget(12)
+async def post_favorite(request, post_id):
+    """文章收藏/取消收藏"""
+    post = await aget_object_or_404(Post, id=post_id)
+    user = await _request_user(request)
+
+    try:
+        # 检查是否已经收藏
+        favorite, created = await PostFavorite.objects.aget_or_create(user=user, post=post)
+
+        if created:
+            # 新收藏
+            await _adjust_counter(post, 'favorites_count', 1)
+            is_favorited = True
+        else:
+            # 已收藏，取消收藏
+            await favorite.adelete()
+            await _adjust_counter(post, 'favorites_count', -1)
+            is_favorited = False
+
+        return JsonResponse({
+            'success': True,
+            'is_favorited': is_favorited,
+            'message': ''
+        })
+
+    except Exception as e:
+        logger.error(f'文章收藏失败: {e}')
+        return JsonResponse({
+            'success': False,
+            'message': '操作失败，请重试'
+        })
+
+
+@require_POST
+@_login_required
+@query_budget(10)
+async def follow_user(request, user_id):
+    """关注用户"""
+    target_user = await aget_object_or_404(User, id=user_id)
+    current_user = await _request_user(request)
+
+    # 不能关注自己
+    if target_user == current_user:
+        logger.warning(f'用户 {current_user.username} 尝试关注自己')
+        return JsonResponse({
+            'success': False,
+            'message': '不能关注自己'
+        })
+
+    try:
+        # 检查是否已经关注（与同步版本相同的两条查询；并发重复提交由唯一约束拦截）
+        if await UserFollow.objects.filter(follower=current_user, following=target_user).aexists():
+            return JsonResponse({
+                'success': False,
+                'message': '已经关注过该用户'
+            })
+
+        await UserFollow.objects.acreate(
+            follower=current_user,
+            following=target_user
+        )
+
+        logger.info(f'用户 {current_user.username} 关注了 {target_user.username}')
+
+        return JsonResponse({
+            'success': True,
+            'is_following': True,
+            'message': f'已关注 {target_user.username}'
+        })
+
+    except Exception as e:
+        logger.error(f'关注操作失败: {e}')
+        return JsonResponse({
+            'success': False,
+            'message': '关注失败，请重试'
+        })
+
+
+@require_POST
+@_login_required
+@query_budget(10)
+async def unfollow_user(request, user_id):
+    """取消关注用户"""
+    target_user = await aget_object_or_404(User, id=user_id)
+    current_user = await _request_user(request)
+
+    # 不能取消关注自己
+    if target_user == current_user:
+        return JsonResponse({
+            'success': False,
+            'message': '不能取消关注自己'
+        })
+
+    try:
+        # 直接删除关注关系，按删除行数判断是否关注过
+        deleted, _details = await UserFollow.objects.filter(
+            follower=current_user,
+            following=target_user
+        ).adelete()
+
+        if not deleted:
+            return JsonResponse({
+                'success': False,
+                'message': '未关注该用户'
+            })
+
+        logger.info(f'用户 {current_user.username} 取消关注了 {target_user.username}')
+
+        return JsonResponse({
+            'success': True,
+            'is_following': False,
+            'message': f'已取消关注 {target_user.username}'
+        })
+
+    except Exception as e:
+        logger.error(f'取消关注操作失败: {e}')
+        return JsonResponse({
+            'success': False,
+            'message': '取消关注失败，请重试'
+        })
+
+
+@_login_required
+@query_budget(8)
+async def get_follow_status(request, user_id):
+    """获取关注状态"""
+    target_user = await aget_object_or_404(User, id=user_id)
+    current_user = await _request_user(request)
+
+    if target_user == current_user:
+        return JsonResponse({
+            'success': False,
+            'message': '不能关注自己'
+        })
+
+    try:
+        is_following = await UserFollow.objects.filter(
+            follower=current_user,
+            following=target_user
+        ).aexists()
+
+        return JsonResponse({
+            'success': True,
+            'is_following': is_following,
+            'user_id': user_id,
+            'username': target_user.username
+        })
+
+    except Exception as e:
+        logger.error(f'获取关注状态失败: {e}')
+        return JsonResponse({
+            'success': False,
+            'message': '获取关注状态失败'
+        })
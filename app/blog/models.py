@@ -156,6 +156,13 @@ class Post(models.Model):
         text = re.sub(r'\s+', '', text)
         return len(text)
     
+    @property
+    def comment_count(self):
+        """评论数：视图已批量统计并设置 comments_total 时直接使用，否则查询数据库"""
+        if hasattr(self, 'comments_total'):
+            return self.comments_total
+        return self.comments.count()
+    
     @property
     def html_content(self):
         """获取HTML内容，如果没有则实时转换"""
@@ -1,3 +1,256 @@
-from django.test import TestCase
+"""
+博客应用测试
+查询预算：blog/urls.py 中的每个URL都按视图声明的预算（@query_budget）检查查询次数，
+N+1 容易出现的页面另外检查查询次数不随数据量增长；
+互动接口的异步版本（ASYNC_INTERACTION_VIEWS）按同样的预算检查，并在没有同步中间件读取用户时直接调用
+"""
+import importlib
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import User
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import clear_url_caches, resolve, reverse
+
+from app.core.querybudget import QueryBudgetTestMixin, QueryRecorder
+from . import urls as blog_urls
+from .models import Post, PostCategory, Comment, PostLike, CommentLike, PostFavorite, UserFollow
+
+
+def build_budget_fixture(posts_per_author=6, comments_per_post=3):
+    """
+    创建查询预算测试数据：作者、读者（与作者互相关注）、陌生人和超级管理员，
+    以及分类、各种可见权限的文章、评论、点赞、收藏
+    """
+    author = User.objects.create_user('budget_author', password='pass12345')
+    reader = User.objects.create_user('budget_reader', password='pass12345')
+    stranger = User.objects.create_user('budget_stranger', password='pass12345')
+    admin = User.objects.create_superuser('budget_admin', password='pass12345')
+    UserFollow.objects.create(follower=author, following=reader)
+    UserFollow.objects.create(follower=reader, following=author)
+    UserFollow.objects.create(follower=stranger, following=author)
+
+    category = PostCategory.objects.create(name='预算分类', owner=author)
+    add_posts(author, category, posts_per_author, comments_per_post, commenters=[reader, stranger])
+    add_posts(reader, None, 2, comments_per_post, commenters=[author])
+
+    return {
+        'author': author,
+        'reader': reader,
+        'stranger': stranger,
+        'admin': admin,
+        'category': category,
+        'post': Post.objects.filter(author=author, category=category, visibility='public').first(),
+        'uncategorized_post': Post.objects.filter(author=reader).first(),
+        'comment': Comment.objects.filter(post__author=author).first(),
+    }
+
+
+def add_posts(author, category, count, comments_per_post, commenters):
+    """为作者追加文章，每篇带评论、点赞和收藏"""
+    visibilities = ['public', 'mutual', 'public', 'private']
+    for index in range(count):
+        post = Post.objects.create(
+            title=f'{author.username} 的文章 {Post.objects.count()}',
+            content=f'# 标题\n\n正文 **{index}**\n\n```python\nprint({index})\n```',
+            author=author,
+            category=category,
+            visibility=visibilities[index % len(visibilities)],
+        )
+        for number in range(comments_per_post):
+            commenter = commenters[number % len(commenters)]
+            comment = Comment.objects.create(post=post, author=commenter, content=f'评论 {number}')
+            CommentLike.objects.get_or_create(user=author, comment=comment)
+            PostLike.objects.get_or_create(user=commenter, post=post)
+            PostFavorite.objects.get_or_create(user=commenter, post=post)
+            Comment.objects.filter(pk=comment.pk).update(likes_count=1)
+        Post.objects.filter(pk=post.pk).update(
+            likes_count=PostLike.objects.filter(post=post).count(),
+            favorites_count=PostFavorite.objects.filter(post=post).count(),
+        )
+
+
+class BlogQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """blog/urls.py 中每个URL的查询预算"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = build_budget_fixture()
+
+    def cases(self):
+        """路由 -> (URL名称, URL参数, 请求方法, 登录用户)"""
+        data = self.data
+        post, comment = data['post'], data['comment']
+        return {
+            '': ('post_list', {}, 'get', 'reader'),
+            'user/<int:user_id>/post/<int:post_id>/': (
+                'post_detail', {'user_id': data['reader'].id, 'post_id': data['uncategorized_post'].id}, 'get', 'author'),
+            'user/<int:user_id>/category/<int:category_id>/post/<int:post_id>/': (
+                'post_detail_with_category',
+                {'user_id': data['author'].id, 'category_id': data['category'].id, 'post_id': post.id}, 'get', 'reader'),
+            'post/<int:pk>/': ('post_detail_legacy', {'pk': post.id}, 'get', None),
+            'comment/delete/<int:comment_id>/': ('delete_comment', {'comment_id': comment.id}, 'get', 'author'),
+            'admin/post/delete/<int:pk>/': ('admin_delete_post', {'pk': post.id}, 'get', 'admin'),
+            'post/<int:post_id>/like/': ('post_like', {'post_id': post.id}, 'post', 'stranger'),
+            'comment/<int:comment_id>/like/': ('comment_like', {'comment_id': comment.id}, 'post', 'stranger'),
+            'post/<int:post_id>/favorite/': ('post_favorite', {'post_id': post.id}, 'post', 'stranger'),
+            'user/<int:user_id>/follow/': ('follow_user', {'user_id': data['reader'].id}, 'post', 'stranger'),
+            'user/<int:user_id>/unfollow/': ('unfollow_user', {'user_id': data['author'].id}, 'post', 'stranger'),
+            'user/<int:user_id>/follow-status/': ('get_follow_status', {'user_id': data['author'].id}, 'get', 'reader'),
+        }
+
+    def request_case(self, name, kwargs, method, user_key):
+        if user_key:
+            self.client.force_login(self.data[user_key])
+        return self.assertViewQueryBudget(reverse(f'blog:{name}', kwargs=kwargs), method=method)
+
+    def test_every_url_has_budget_case(self):
+        routes = {str(pattern.pattern) for pattern in blog_urls.urlpatterns}
+        self.assertEqual(routes - set(self.cases()), set())
+
+    def test_urls_within_budget(self):
+        for route, case in self.cases().items():
+            with self.subTest(route=route):
+                self.client.logout()
+                self.request_case(*case)
+
+    def test_post_list_sorts_and_search_within_budget(self):
+        self.client.force_login(self.data['reader'])
+        for params in ({'sort': 'created'}, {'sort': 'updated'}, {'sort': 'likes'}, {'search': '文章'}):
+            with self.subTest(params=params):
+                self.assertViewQueryBudget(reverse('blog:post_list') + '?' + '&'.join(
+                    f'{key}={value}' for key, value in params.items()
+                ))
+
+
+class AsyncInteractionQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """异步互动接口（ASGI部署时使用）的查询预算：不能比同步版本多查询"""
+
+    INTERACTION_VIEWS = (
+        'post_like', 'comment_like', 'post_favorite', 'follow_user', 'unfollow_user', 'get_follow_status',
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # blog/urls.py 在导入时按设置选择视图模块，切换设置后重新加载
+        cls._async_settings = override_settings(ASYNC_INTERACTION_VIEWS=True)
+        cls._async_settings.enable()
+        cls.reload_urls()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._async_settings.disable()
+        cls.reload_urls()
+        super().tearDownClass()
+
+    @staticmethod
+    def reload_urls():
+        # 根URL配置中的 include() 保存着已解析的子路由，也要重新加载
+        importlib.reload(blog_urls)
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = build_budget_fixture()
+
+    def cases(self):
+        return {route: case for route, case in BlogQueryBudgetTests.cases(self).items()
+                if case[0] in self.INTERACTION_VIEWS}
+
+    request_case = BlogQueryBudgetTests.request_case
+
+    def test_async_views_are_routed(self):
+        from . import async_views
+        for name in self.INTERACTION_VIEWS:
+            self.assertIs(resolve_view(name, self.cases()), getattr(async_views, name))
+
+    def test_urls_within_budget(self):
+        for route, case in self.cases().items():
+            with self.subTest(route=route):
+                self.client.logout()
+                self.request_case(*case)
+
+
+class AsyncInteractionViewTests(TestCase):
+    """
+    直接调用异步视图：只经过会话和认证中间件，没有 UserStatusMiddleware 等先读取 request.user，
+    用户由 request.auser() 加载
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = build_budget_fixture()
+
+    def make_request(self, path, user=None):
+        request = RequestFactory().post(path)
+        SessionMiddleware(lambda request: None).process_request(request)
+        if user is not None:
+            request.session[SESSION_KEY] = str(user.pk)
+            request.session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+            request.session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        AuthenticationMiddleware(lambda request: None).process_request(request)
+        return request
+
+    async def test_views_load_user_with_auser(self):
+        from . import async_views
+        post, reader = self.data['post'], self.data['reader']
+        request = self.make_request(f'/posts/{post.id}/like/', reader)
+        response = await async_views.post_like(request, post_id=post.id)
+        self.assertEqual(response.status_code, 200)
+        # request.user 与 request.auser() 共用同一个已加载的用户
+        self.assertEqual(request._cached_user.pk, reader.pk)
+        self.assertIs(request._acached_user, request._cached_user)
+
+        stranger = self.data['stranger']
+        request = self.make_request(f'/follow/{reader.id}/', stranger)
+        response = await async_views.follow_user(request, user_id=reader.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(await UserFollow.objects.filter(follower=stranger, following=reader).aexists())
+
+    async def test_anonymous_redirects_to_login(self):
+        from . import async_views
+        post = self.data['post']
+        response = await async_views.post_like(self.make_request(f'/posts/{post.id}/like/'), post_id=post.id)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(settings.LOGIN_URL, response.url)
+
+
+def resolve_view(name, cases):
+    """按用例中的URL参数解析URL名称对应的视图函数"""
+    kwargs = next(case[1] for case in cases.values() if case[0] == name)
+    return resolve(reverse(f'blog:{name}', kwargs=kwargs)).func
+
+
+class BlogQueryScalingTests(TestCase):
+    """列表和详情页的查询次数不随文章、评论数量增长"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = build_budget_fixture(posts_per_author=3, comments_per_post=2)
+
+    def count_queries(self, url):
+        with QueryRecorder() as recorder:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return recorder.count
+
+    def test_post_list_does_not_scale_with_posts(self):
+        self.client.force_login(self.data['reader'])
+        url = reverse('blog:post_list')
+        before = self.count_queries(url)
+        add_posts(self.data['stranger'], None, 6, 2, commenters=[self.data['reader'], self.data['author']])
+        self.assertEqual(self.count_queries(url), before)
+
+    def test_post_detail_does_not_scale_with_comments(self):
+        self.client.force_login(self.data['reader'])
+        post = self.data['post']
+        url = reverse('blog:post_detail_legacy', kwargs={'pk': post.id})
+        before = self.count_queries(url)
+        for number in range(8):
+            commenter = User.objects.create_user(f'budget_commenter_{number}', password='pass12345')
+            Comment.objects.create(post=post, author=commenter, content='更多评论')
+        self.assertEqual(self.count_queries(url), before)
@@ -1,6 +1,13 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# 互动接口（点赞/收藏/关注）：ASGI部署时使用异步视图，WSGI部署时使用同步视图
+if settings.ASYNC_INTERACTION_VIEWS:
+    from . import async_views as interaction_views
+else:
+    interaction_views = views
+
 app_name = 'blog'
 
 urlpatterns = [
@@ -18,12 +25,12 @@ urlpatterns = [
     # 新增：管理员功能
     path('admin/post/delete/<int:pk>/', views.admin_delete_post, name='admin_delete_post'),
     # 新增：点赞功能
-    path('post/<int:post_id>/like/', views.post_like, name='post_like'),
-    path('comment/<int:comment_id>/like/', views.comment_like, name='comment_like'),
+    path('post/<int:post_id>/like/', interaction_views.post_like, name='post_like'),
+    path('comment/<int:comment_id>/like/', interaction_views.comment_like, name='comment_like'),
     # 新增：收藏功能
-    path('post/<int:post_id>/favorite/', views.post_favorite, name='post_favorite'),
+    path('post/<int:post_id>/favorite/', interaction_views.post_favorite, name='post_favorite'),
     # 新增：关注功能
-    path('user/<int:user_id>/follow/', views.follow_user, name='follow_user'),
-    path('user/<int:user_id>/unfollow/', views.unfollow_user, name='unfollow_user'),
-    path('user/<int:user_id>/follow-status/', views.get_follow_status, name='get_follow_status'),
+    path('user/<int:user_id>/follow/', interaction_views.follow_user, name='follow_user'),
+    path('user/<int:user_id>/unfollow/', interaction_views.unfollow_user, name='unfollow_user'),
+    path('user/<int:user_id>/follow-status/', interaction_views.get_follow_status, name='get_follow_status'),
 ]
\ No newline at end of file
@@ -10,12 +10,15 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.urls import reverse
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db.models import Count, Q
 
 # 第三方库导入
 # (目前没有第三方库导入)
 
 # 本地应用导入
+from app.accounts.services import DashboardMetricsService
+from app.core.db_router import read_from_replica
+from app.core.querybudget import query_budget
 from .forms import CommentForm
 from .models import Post, Comment, PostLike, CommentLike, PostFavorite, UserFollow
 
@@ -41,6 +44,21 @@ def get_post_url(post):
         })
 
 
+def attach_comment_counts(posts):
+    """
+    用一次分组查询为一页文章设置评论数（Post.comment_count 读取该值），
+    避免模板中逐篇执行 COUNT 查询。返回文章列表
+    """
+    posts = list(posts)
+    comment_counts = dict(
+        Comment.objects.filter(post__in=posts)
+        .values_list('post').annotate(total=Count('id')).order_by()
+    )
+    for post in posts:
+        post.comments_total = comment_counts.get(post.id, 0)
+    return posts
+
+
 def get_visible_posts(user):
     """
     根据用户权限获取可见的文章
@@ -102,6 +120,8 @@ def can_view_post(post, user):
 
 
 # post_list 视图，添加分页和搜索功能
+@read_from_replica
+@query_budget(14, template_queries=1)
 def post_list(request):
     # 获取排序参数
     sort_by = request.GET.get('sort', 'default')
@@ -129,20 +149,31 @@ def post_list(request):
     else:  # default - 按点赞数排序
         posts = posts.order_by('-likes_count', '-created_at')
     
-    # 为每个文章添加收藏数统计和关注状态
-    for post in posts:
-        post.favorites_count = PostFavorite.objects.filter(post=post).count()
-        # 添加关注状态 - 改进逻辑
-        if request.user.is_authenticated and request.user != post.author:
-            post.is_following = UserFollow.objects.filter(follower=request.user, following=post.author).exists()
-        else:
-            post.is_following = False
+    # 一次取出作者、作者资料和分类，避免模板中逐篇查询
+    posts = posts.select_related('author', 'author__profile', 'category')
     
     # 分页
     paginator = Paginator(posts, 10)  # 每页显示10篇文章
     page_number = request.GET.get('page')
     posts = paginator.get_page(page_number)
     
+    # 为当前页的文章添加评论数、收藏数统计和关注状态（各一次查询）
+    page_posts = attach_comment_counts(posts)
+    favorite_counts = dict(
+        PostFavorite.objects.filter(post__in=page_posts)
+        .values_list('post').annotate(total=Count('id')).order_by()
+    )
+    followed_ids = set()
+    if request.user.is_authenticated:
+        followed_ids = set(UserFollow.objects.filter(
+            follower=request.user,
+            following__in={post.author_id for post in page_posts}
+        ).values_list('following_id', flat=True))
+    for post in page_posts:
+        post.favorites_count = favorite_counts.get(post.id, 0)
+        # 自己的文章不显示已关注
+        post.is_following = post.author_id != request.user.id and post.author_id in followed_ids
+    
     context = {
         'posts': posts,
         'current_sort': sort_by,
@@ -153,6 +184,8 @@ def post_list(request):
 
 
 # 新增：文章详情页的视图（包含评论功能）
+@read_from_replica
+@query_budget(16, template_queries=1)
 def post_detail(request, pk=None, post_id=None, user_id=None, category_id=None):
     """
     这个视图负责显示单篇文章的详情和评论功能
@@ -161,7 +194,7 @@ def post_detail(request, pk=None, post_id=None, user_id=None, category_id=None):
     # 1. 根据URL参数获取文章
     if post_id is not None:
         # 新URL结构：使用post_id
-        post = get_object_or_404(Post, pk=post_id)
+        post = get_object_or_404(Post.objects.select_related('author__profile', 'category'), pk=post_id)
         
         # 验证用户ID是否匹配（如果提供了user_id）
         if user_id is not None and post.author.id != user_id:
@@ -182,15 +215,15 @@ def post_detail(request, pk=None, post_id=None, user_id=None, category_id=None):
                     return redirect('blog:post_list')
     else:
         # 旧URL结构：使用pk（向后兼容）
-        post = get_object_or_404(Post, pk=pk)
+        post = get_object_or_404(Post.objects.select_related('author__profile', 'category'), pk=pk)
     
     # 2. 检查用户是否有权限查看该文章
     if not can_view_post(post, request.user):
         messages.error(request, '您没有权限查看这篇文章。')
         return redirect('blog:post_list')
     
-    # 3. 获取该文章的所有评论，按时间顺序排列
-    comments = post.comments.all().order_by('created_at')
+    # 3. 获取该文章的所有评论，按时间顺序排列（连同评论者及其资料一起取出）
+    comments = post.comments.select_related('author__profile').order_by('created_at')
     
     # 4. 处理评论表单提交
     if request.method == 'POST' and request.user.is_authenticated:
@@ -232,6 +265,8 @@ def post_detail(request, pk=None, post_id=None, user_id=None, category_id=None):
         is_following = UserFollow.objects.filter(follower=request.user, following=post.author).exists()
     
     # 7. 检查用户对每个评论的点赞状态和关注状态
+    comments = list(comments)
+    post.comments_total = len(comments)
     comment_likes = set()
     if request.user.is_authenticated:
         liked_comment_ids = CommentLike.objects.filter(
@@ -240,19 +275,20 @@ def post_detail(request, pk=None, post_id=None, user_id=None, category_id=None):
         ).values_list('comment_id', flat=True)
         comment_likes = set(liked_comment_ids)
         
-        # 为每个评论添加关注状态
+        # 一次查出当前用户关注了哪些评论者，再为每个评论添加关注状态
+        followed_ids = set(UserFollow.objects.filter(
+            follower=request.user,
+            following__in={comment.author_id for comment in comments}
+        ).values_list('following_id', flat=True))
         for comment in comments:
-            if request.user != comment.author:
-                comment.is_following = UserFollow.objects.filter(follower=request.user, following=comment.author).exists()
-            else:
-                comment.is_following = False
+            comment.is_following = comment.author_id != request.user.id and comment.author_id in followed_ids
     
     # 8. 将文章、评论和表单传递给模板
     context = {
         'post': post,
         'comments': comments,
         'comment_form': comment_form,
-        'comments_count': comments.count(),
+        'comments_count': len(comments),
         'is_post_liked': is_post_liked,
         'is_post_favorited': is_post_favorited,
         'is_following': is_following,
@@ -262,6 +298,7 @@ def post_detail(request, pk=None, post_id=None, user_id=None, category_id=None):
 
 # 新增：删除评论的视图（增强管理员权限）
 @login_required
+@query_budget(12)
 def delete_comment(request, comment_id):
     """删除评论（评论作者、文章作者或超级管理员可以删除）"""
     comment = get_object_or_404(Comment, id=comment_id)
@@ -277,7 +314,8 @@ def delete_comment(request, comment_id):
         post_author_id = comment.post.author.id
         comment_author = comment.author.username
         comment_content = comment.content[:50] + '...' if len(comment.content) > 50 else comment.content
-        comment.delete()
+        deleted = comment.delete()[1]
+        DashboardMetricsService.apply_deletion(comment, deleted)
         
         # 记录删除日志
         if request.user.is_superuser and request.user != comment.author:
@@ -297,6 +335,7 @@ def delete_comment(request, comment_id):
 
 # 新增：管理员删除文章功能
 @login_required
+@query_budget(12)
 def admin_delete_post(request, pk):
     """管理员删除任意文章（超级管理员或文章作者可以使用）"""
     post = get_object_or_404(Post, pk=pk)
@@ -312,7 +351,8 @@ def admin_delete_post(request, pk):
         post_author = post.author.username
         post_id = post.pk
         post_author_id = post.author.id
-        post.delete()
+        deleted = post.delete()[1]
+        DashboardMetricsService.apply_deletion(post, deleted)
         
         # 记录删除日志
         if request.user.is_superuser and request.user != post.author:
@@ -333,6 +373,7 @@ def admin_delete_post(request, pk):
 
 @require_POST
 @login_required
+@query_budget(12)
 def post_like(request, post_id):
     """文章点赞/取消点赞"""
     post = get_object_or_404(Post, id=post_id)
@@ -381,6 +422,7 @@ def post_like(request, post_id):
 
 @require_POST
 @login_required
+@query_budget(12)
 def comment_like(request, comment_id):
     """评论点赞/取消点赞"""
     comment = get_object_or_404(Comment, id=comment_id)
@@ -429,6 +471,7 @@ def comment_like(request, comment_id):
 
 @require_POST
 @login_required
+@query_budget(12)
 def post_favorite(request, post_id):
     """文章收藏/取消收藏"""
     post = get_object_or_404(Post, id=post_id)
@@ -468,6 +511,7 @@ def post_favorite(request, post_id):
 
 @require_POST
 @login_required
+@query_budget(10)
 def follow_user(request, user_id):
     """关注用户"""
     target_user = get_object_or_404(User, id=user_id)
@@ -514,6 +558,7 @@ def follow_user(request, user_id):
 
 @require_POST
 @login_required
+@query_budget(10)
 def unfollow_user(request, user_id):
     """取消关注用户"""
     target_user = get_object_or_404(User, id=user_id)
@@ -559,6 +604,7 @@ def unfollow_user(request, user_id):
 
 
 @login_required
+@query_budget(8)
 def get_follow_status(request, user_id):
     """获取关注状态"""
     target_user = get_object_or_404(User, id=user_id)
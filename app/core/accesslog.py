@@ -0,0 +1,233 @@
+"""
+访问日志分析模块
+逐行读取 gunicorn / nginx 的访问日志（包括 logmanage --archive 生成的 .gz 归档），
+把请求路径映射为URL名称，按路由汇总请求数、状态码分布、响应字节数和延迟分位数，供 accesslog 命令使用
+
+日志格式：
+    两者都使用 combined 格式，行末附加请求耗时：
+    gunicorn.conf.py 的 access_log_format 末尾为 %(D)s（整数，微秒），
+    nginx.conf 的 log_format timed 末尾为 $request_time（带小数，秒）。
+    没有耗时字段的旧日志仍统计请求数、状态码和字节数，不计入延迟分位数。
+
+延迟分位数：
+    LatencySketch 按对数划分桶（相对误差 RELATIVE_ACCURACY），只保存每个桶的计数，
+    内存占用与请求数无关，多个草图可以合并。
+"""
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = ['LatencySketch', 'RouteStats', 'parse_line', 'route_name', 'AccessLogReport']
+
+# 分位数估计的相对误差
+RELATIVE_ACCURACY = 0.01
+
+# 低于该值（秒）的耗时归入同一个桶，限制桶的数量
+MIN_LATENCY = 1e-6
+
+# 路径到路由名称的缓存条数（带ID的路径各不相同，缓存有上限）
+ROUTE_CACHE_SIZE = 65536
+
+# 无法解析的路由
+UNMATCHED = '<unmatched>'
+
+
+class LatencySketch:
+    """对数分桶的分位数草图：估计值与真实分位数的相对误差不超过 accuracy"""
+
+    __slots__ = ('gamma', '_log_gamma', 'buckets', 'count', 'total', 'min', 'max')
+
+    def __init__(self, accuracy=RELATIVE_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        key = math.ceil(math.log(max(value, MIN_LATENCY)) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def quantile(self, fraction):
+        """第 fraction 分位数的估计值（秒），没有数据时返回None"""
+        if not self.count:
+            return None
+        rank = fraction * (self.count - 1)
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # 桶 (gamma^(key-1), gamma^key] 的中点（相对误差意义上）
+                estimate = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+
+class RouteStats:
+    """单个路由的汇总"""
+
+    __slots__ = ('requests', 'statuses', 'bytes', 'latency')
+
+    def __init__(self):
+        self.requests = 0
+        # 状态码分类（2xx/3xx/4xx/5xx）的计数
+        self.statuses = Counter()
+        self.bytes = 0
+        self.latency = LatencySketch()
+
+    def add(self, status, size, latency):
+        self.requests += 1
+        self.statuses[f'{status // 100}xx'] += 1
+        self.bytes += size
+        if latency is not None:
+            self.latency.add(latency)
+
+    def merge(self, other):
+        self.requests += other.requests
+        self.statuses.update(other.statuses)
+        self.bytes += other.bytes
+        self.latency.merge(other.latency)
+
+    def as_dict(self):
+        def milliseconds(value):
+            return round(value * 1000, 2) if value is not None else None
+
+        return {
+            'requests': self.requests,
+            'statuses': dict(sorted(self.statuses.items())),
+            'bytes': self.bytes,
+            'latency_ms': {
+                'count': self.latency.count,
+                'mean': milliseconds(self.latency.total / self.latency.count) if self.latency.count else None,
+                'p50': milliseconds(self.latency.quantile(0.50)),
+                'p95': milliseconds(self.latency.quantile(0.95)),
+                'p99': milliseconds(self.latency.quantile(0.99)),
+                'max': milliseconds(self.latency.max),
+            },
+        }
+
+
+# ==================== 解析 ====================
+
+# combined 格式：地址 标识 用户 [时间] "请求行" 状态码 字节数 "来源" "UA"，之后是附加字段
+_COMBINED = re.compile(
+    r'^\S+ \S+ \S+ \[[^\]]*\] "((?:[^"\\]|\\.)*)" (\d{3}) (\d+|-)'
+    r'(?: "(?:[^"\\]|\\.)*" "(?:[^"\\]|\\.)*")?(.*)$'
+)
+_LATENCY = re.compile(r'(\d+(?:\.\d+)?)\s*$')
+
+
+def parse_line(line):
+    """
+    解析一行访问日志，返回 (方法, 路径, 状态码, 字节数, 耗时秒数或None)；无法识别的行返回None
+    行末的耗时带小数时按秒（nginx $request_time），整数时按微秒（gunicorn %(D)s）
+    """
+    match = _COMBINED.match(line)
+    if not match:
+        return None
+    request, status, size, extra = match.groups()
+    parts = request.split(' ')
+    if len(parts) < 2:
+        # 非HTTP请求（如扫描器发送的乱码），请求行不完整
+        method, path = '-', '-'
+    else:
+        method, path = parts[0], parts[1].split('?', 1)[0]
+
+    latency = None
+    latency_match = _LATENCY.search(extra)
+    if latency_match:
+        value = latency_match.group(1)
+        latency = float(value) if '.' in value else int(value) / 1_000_000
+    return method, path, int(status), 0 if size == '-' else int(size), latency
+
+
+@lru_cache(maxsize=ROUTE_CACHE_SIZE)
+def route_name(path):
+    """请求路径对应的URL名称（如 blog:post_detail）；静态文件和媒体文件归为一类"""
+    if settings.STATIC_URL and path.startswith(settings.STATIC_URL):
+        return '<static>'
+    if settings.MEDIA_URL and path.startswith(settings.MEDIA_URL):
+        return '<media>'
+    try:
+        # 日志中的路径是百分号编码的，URL配置匹配的是解码后的路径
+        match = resolve(unquote(path))
+    except Resolver404:
+        return UNMATCHED
+    # 未命名的URL以视图函数的导入路径表示
+    return match.view_name
+
+
+class AccessLogReport:
+    """按路由汇总访问日志"""
+
+    def __init__(self):
+        self.routes = {}
+        self.total = RouteStats()
+        self.lines = 0
+        self.skipped = 0
+
+    def add_line(self, line):
+        self.lines += 1
+        entry = parse_line(line)
+        if entry is None:
+            self.skipped += 1
+            return
+        method, path, status, size, latency = entry
+        route = route_name(path) if path != '-' else UNMATCHED
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = RouteStats()
+        stats.add(status, size, latency)
+        self.total.add(status, size, latency)
+
+    def add_file(self, file_obj):
+        """逐行读取已打开的文本文件"""
+        for line in file_obj:
+            self.add_line(line.rstrip('\n'))
+
+    def sorted_routes(self, key='requests'):
+        """按请求数、总字节数或某个延迟分位数降序排列的 [(路由, 汇总)]"""
+        if key in ('p50', 'p95', 'p99'):
+            fraction = int(key[1:]) / 100
+
+            def sort_key(item):
+                return item[1].latency.quantile(fraction) or 0
+        else:
+            def sort_key(item):
+                return getattr(item[1], key)
+        return sorted(self.routes.items(), key=sort_key, reverse=True)
+
+    def as_dict(self, key='requests', top=None):
+        routes = self.sorted_routes(key)
+        if top:
+            routes = routes[:top]
+        return {
+            'lines': self.lines,
+            'skipped': self.skipped,
+            'total': self.total.as_dict(),
+            'routes': {name: stats.as_dict() for name, stats in routes},
+        }
@@ -1,7 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "app.core"
-    verbose_name = "核心功能"
\ No newline at end of file
+    verbose_name = "核心功能"
+
+    def ready(self):
+        # JSON日志：日志记录创建时附加当前请求的上下文字段
+        if getattr(settings, 'LOG_FORMAT', 'text') == 'json':
+            from . import jsonlog
+            jsonlog.install_record_factory()
+
+        # 日志处理器移到后台监听线程（LOGGING 已在此之前由Django配置完成）
+        if getattr(settings, 'LOGGING_QUEUE_ENABLED', False):
+            from . import logqueue
+            logqueue.install(getattr(settings, 'LOGGING_QUEUE_SIZE', logqueue.DEFAULT_QUEUE_SIZE))
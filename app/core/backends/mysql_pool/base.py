@@ -0,0 +1,278 @@
+"""
+带进程内连接池的MySQL数据库后端
+在 django.db.backends.mysql 的基础上，把 Django 关闭的连接放回本进程的连接池，
+下次请求直接复用，省去TCP握手、认证以及 init_command 等会话初始化语句
+
+配置示例（settings_production.py）：
+    DATABASES['default']['ENGINE'] = 'app.core.backends.mysql_pool'
+    DATABASES['default']['CONN_MAX_AGE'] = 0      # 每个请求结束后归还连接
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': 10,          # 每个进程最多持有的连接数
+        'TIMEOUT': 10,           # 连接耗尽时等待的秒数
+        'MAX_LIFETIME': 1800,    # 单个连接最长使用秒数
+        'PING_INTERVAL': 30,     # 空闲超过该秒数的连接取出时先 ping 检查
+    }
+
+连接池按进程隔离：gunicorn fork 出 worker 后，子进程会丢弃从主进程继承的连接
+（不关闭套接字，避免影响主进程），重新建立自己的连接。
+
+统计信息（新建/复用/等待/超时/丢弃次数及当前连接数）同时写入 app.core.metrics，
+在 /metrics 中以 meowsite_db_pool_* 输出。
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.mysql import base as mysql_base
+
+from app.core.metrics import record_pool_event, set_pool_connections
+
+# 获取日志记录器
+logger = logging.getLogger('core')
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = ['DatabaseWrapper', 'ConnectionPool', 'get_pool_stats', 'reset_pools_after_fork']
+
+DEFAULT_POOL_OPTIONS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 10,
+    'MAX_LIFETIME': 1800,
+    'PING_INTERVAL': 30,
+}
+
+
+class PoolTimeout(mysql_base.Database.OperationalError):
+    """等待空闲连接超时"""
+
+
+class _PooledConnection:
+    """连接池中的一条连接及其元数据"""
+    __slots__ = ('raw', 'created_at', 'released_at')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.released_at = self.created_at
+
+
+class ConnectionPool:
+    """单个数据库别名在本进程内的连接池"""
+
+    def __init__(self, alias, options):
+        self.alias = alias
+        self.max_size = int(options['MAX_SIZE'])
+        self.timeout = float(options['TIMEOUT'])
+        self.max_lifetime = float(options['MAX_LIFETIME'])
+        self.ping_interval = float(options['PING_INTERVAL'])
+        self._condition = threading.Condition()
+        self._reset_state()
+
+    def _reset_state(self):
+        self.pid = os.getpid()
+        self._idle = deque()
+        self._checked_out = {}
+        self.stats = {
+            'opens': 0,       # 新建连接次数
+            'reuses': 0,      # 复用空闲连接次数
+            'waits': 0,       # 连接耗尽时等待的次数
+            'timeouts': 0,    # 等待超时次数
+            'discards': 0,    # 因过期、失效或事务未结束而丢弃的连接数
+        }
+
+    def reset_after_fork(self):
+        """fork后在子进程中调用：丢弃继承的连接但不关闭套接字"""
+        self._condition = threading.Condition()
+        self._reset_state()
+        self._update_gauges()
+
+    def _count(self, event):
+        """累计一次连接池事件（调用方持有锁）"""
+        self.stats[event] += 1
+        record_pool_event(self.alias, event)
+
+    def _update_gauges(self):
+        """更新当前连接数指标（调用方持有锁）"""
+        set_pool_connections(self.alias, len(self._idle), len(self._checked_out))
+
+    def _is_expired(self, pooled, now):
+        return self.max_lifetime and now - pooled.created_at > self.max_lifetime
+
+    def _discard(self, pooled):
+        self._count('discards')
+        try:
+            pooled.raw.close()
+        except Exception:
+            pass
+
+    def acquire(self, connect):
+        """
+        取出一条连接，返回 (原始连接, 是否为复用连接)
+        connect 为新建连接的回调
+        """
+        if self.pid != os.getpid():
+            self.reset_after_fork()
+
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            with self._condition:
+                pooled = self._idle.pop() if self._idle else None
+                can_open = pooled is None and len(self._checked_out) < self.max_size
+                if pooled is None and not can_open:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._count('timeouts')
+                        raise PoolTimeout(
+                            f'数据库连接池 {self.alias} 已耗尽（{self.max_size} 个连接），'
+                            f'等待 {self.timeout} 秒超时'
+                        )
+                    if not waited:
+                        self._count('waits')
+                        waited = True
+                    self._condition.wait(remaining)
+                    continue
+                if can_open:
+                    # 先占位，避免并发时超过连接上限
+                    placeholder = object()
+                    self._checked_out[id(placeholder)] = placeholder
+
+            if pooled is not None:
+                now = time.monotonic()
+                if self._is_expired(pooled, now) or (
+                        now - pooled.released_at > self.ping_interval and not self._ping(pooled)):
+                    with self._condition:
+                        self._discard(pooled)
+                    continue
+                with self._condition:
+                    self._checked_out[id(pooled.raw)] = pooled
+                    self._count('reuses')
+                    self._update_gauges()
+                return pooled.raw, True
+
+            try:
+                raw = connect()
+            except Exception:
+                with self._condition:
+                    self._checked_out.pop(id(placeholder), None)
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self._checked_out.pop(id(placeholder), None)
+                self._checked_out[id(raw)] = _PooledConnection(raw)
+                self._count('opens')
+                self._update_gauges()
+            return raw, False
+
+    @staticmethod
+    def _ping(pooled):
+        try:
+            pooled.raw.ping(reconnect=False)
+        except Exception:
+            return False
+        return True
+
+    def release(self, raw, reusable=True):
+        """归还连接，不可复用的连接直接关闭"""
+        with self._condition:
+            pooled = self._checked_out.pop(id(raw), None)
+            if pooled is None or self.pid != os.getpid():
+                # 不属于本进程连接池的连接（例如fork前借出的）
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+                return
+            now = time.monotonic()
+            if reusable and not self._is_expired(pooled, now):
+                pooled.released_at = now
+                self._idle.append(pooled)
+            else:
+                self._discard(pooled)
+            self._update_gauges()
+            self._condition.notify()
+
+    def snapshot(self):
+        """返回当前连接池统计信息"""
+        with self._condition:
+            return {
+                'alias': self.alias,
+                'pid': self.pid,
+                'max_size': self.max_size,
+                'idle': len(self._idle),
+                'in_use': len(self._checked_out),
+                **self.stats,
+            }
+
+
+# 本进程内的连接池：数据库别名 -> ConnectionPool
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(alias, settings_dict):
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                options = {**DEFAULT_POOL_OPTIONS, **settings_dict.get('POOL', {})}
+                pool = _pools[alias] = ConnectionPool(alias, options)
+    return pool
+
+
+def get_pool_stats():
+    """返回本进程所有连接池的统计信息列表"""
+    return [pool.snapshot() for pool in list(_pools.values())]
+
+
+def reset_pools_after_fork():
+    """fork后重置本进程的连接池"""
+    for pool in list(_pools.values()):
+        pool.reset_after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_pools_after_fork)
+
+
+class DatabaseWrapper(mysql_base.DatabaseWrapper):
+    """从进程内连接池获取连接的MySQL数据库包装器"""
+
+    def check_settings(self):
+        super().check_settings()
+        if self.settings_dict['CONN_MAX_AGE'] != 0:
+            raise ImproperlyConfigured(
+                '使用连接池时 CONN_MAX_AGE 必须为 0，连接的复用由连接池负责。'
+            )
+
+    def get_new_connection(self, conn_params):
+        pool = _get_pool(self.alias, self.settings_dict)
+        raw, self._pool_reused = pool.acquire(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+        )
+        return raw
+
+    def init_connection_state(self):
+        # 复用的连接已经执行过会话初始化语句，无需重复执行
+        if getattr(self, '_pool_reused', False):
+            return
+        super().init_connection_state()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # 事务未结束的连接不放回连接池；出现过数据库错误的连接需确认仍然可用
+        reusable = not self.in_atomic_block
+        if reusable:
+            try:
+                reusable = self.connection.get_autocommit()
+                if reusable and self.errors_occurred:
+                    self.connection.ping(reconnect=False)
+            except Exception:
+                reusable = False
+        pool = _get_pool(self.alias, self.settings_dict)
+        with self.wrap_database_errors:
+            pool.release(self.connection, reusable=reusable)
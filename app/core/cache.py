@@ -0,0 +1,434 @@
+"""
+缓存后端模块
+TieredCache：在每个进程内的小型LRU缓存（L1）之后挂接一个多进程共享的缓存（L2，Redis或Memcached），
+并通过存放在L2中的分组版本戳让任一worker的写入/删除对所有worker可见
+MeteredCache：包装任意缓存别名，只统计读取的命中/未命中（/metrics），用于不使用两级缓存的配置
+
+两者都通过 app.core.metrics.record_cache_access 记录命中情况，
+CACHES 中视图使用的缓存应配置为其中之一，否则缓存命中指标为0
+
+配置示例：
+    CACHES = {
+        'default': {
+            'BACKEND': 'app.core.cache.TieredCache',
+            'LOCATION': 'shared',            # L2 使用的缓存别名
+            'OPTIONS': {
+                'L1_MAX_ENTRIES': 500,       # 每个进程内最多缓存的条目数
+                'L1_TIMEOUT': 30,            # L1 条目最长存活秒数
+                'STAMP_CHECK_INTERVAL': 1,   # 检查L2版本戳的间隔秒数（0 表示每次读取都检查）
+                'STAMP_BUCKETS': 64,         # 版本戳分组数
+                'L1_EXCLUDE_PREFIXES': ['login_throttle:'],  # 频繁写入的键直接走L2
+            },
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:6379/1',
+        },
+    }
+
+一致性说明：
+    缓存键按哈希分为 STAMP_BUCKETS 组，每组在L2中有一个版本戳。任一进程写入或删除某个键时
+    递增该键所在组的版本戳；其他进程每隔 STAMP_CHECK_INTERVAL 秒用一次 get_many 读取全部版本戳，
+    只丢弃版本戳变化的组中的L1条目，跨进程的失效延迟以该间隔为上限。
+    版本戳依赖L2的原子递增，incr 为“读取再写入”的后端（FileBasedCache、DatabaseCache）
+    并发递增时会丢失失效通知，不能作为L2。
+
+过期时间：
+    L1可缓存的值在L2中与其过期时间（墙钟时间）一起保存，从L2读入L1时存活时间不超过L2中剩余的时间。
+    整数值（计数器）按原样保存以便 incr 仍是L2的原子操作，不进入L1。
+"""
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+
+from .metrics import record_cache_access
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = ['TieredCache', 'MeteredCache']
+
+# 存放在L2中的分组版本戳键前缀
+STAMP_KEY_PREFIX = '__tiered_cache_stamp__:'
+
+# incr 不是原子操作的L2后端
+NON_ATOMIC_INCR_BACKENDS = (FileBasedCache, DatabaseCache)
+
+# L2中带过期时间的值：(标记, 过期时间或None, 值)
+_ENVELOPE_TAG = '__tiered__'
+
+_MISSING = object()
+
+
+def _wrap(value, expires_at):
+    return (_ENVELOPE_TAG, expires_at, value)
+
+
+def _unwrap(stored):
+    """L2中保存的值 -> (值, 过期时间或None, 是否可进入L1)"""
+    if type(stored) is tuple and len(stored) == 3 and stored[0] == _ENVELOPE_TAG:
+        return stored[2], stored[1], True
+    # 整数计数器或不经本后端写入的值：剩余时间未知，不进入L1
+    return stored, None, False
+
+
+class TieredCache(BaseCache):
+    """进程内LRU（L1） + 共享缓存（L2）的两级缓存后端"""
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location or options.get('L2', 'shared')
+        self._l1_max_entries = int(options.get('L1_MAX_ENTRIES', 500))
+        self._l1_timeout = float(options.get('L1_TIMEOUT', 30))
+        self._stamp_check_interval = float(options.get('STAMP_CHECK_INTERVAL', 1))
+        self._exclude_prefixes = tuple(options.get('L1_EXCLUDE_PREFIXES', ()))
+        self._stamp_buckets = max(1, int(options.get('STAMP_BUCKETS', 64)))
+        self._stamp_keys = [f'{STAMP_KEY_PREFIX}{bucket}' for bucket in range(self._stamp_buckets)]
+        self._l2_checked = False
+
+        # L1: 缓存键 -> (序列化后的值, 过期时间, 版本戳分组)
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        # 本进程已知的各组版本戳：分组 -> 版本戳
+        self._stamps = {}
+        self._stamp_checked_at = 0.0
+
+        # 命中统计，便于监控L1效果
+        self.l1_hits = 0
+        self.l1_misses = 0
+
+    # ==================== 内部工具 ====================
+
+    @property
+    def l2(self):
+        """共享缓存，通过别名获取以遵循Django的线程本地连接管理"""
+        l2 = caches[self._l2_alias]
+        if not self._l2_checked:
+            if isinstance(l2, NON_ATOMIC_INCR_BACKENDS):
+                raise ImproperlyConfigured(
+                    f'TieredCache 的L2（{self._l2_alias}: {type(l2).__name__}）不支持原子递增，'
+                    f'跨进程失效会丢失，请使用Redis或Memcached'
+                )
+            self._l2_checked = True
+        return l2
+
+    def _use_l1(self, key):
+        return not (self._exclude_prefixes and str(key).startswith(self._exclude_prefixes))
+
+    def _bucket(self, cache_key):
+        # crc32 在各进程中结果相同（内置 hash() 按进程随机化）
+        return zlib.crc32(cache_key.encode('utf-8')) % self._stamp_buckets
+
+    def _expires_at(self, timeout):
+        """L2条目的过期时间（墙钟时间），永不过期时为None"""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.l2.default_timeout
+        return None if timeout is None else time.time() + timeout
+
+    def _to_l2(self, key, value, timeout):
+        """写入L2的值：L1可缓存的非整数值附带过期时间"""
+        if not self._use_l1(key) or (isinstance(value, int) and not isinstance(value, bool)):
+            return value
+        return _wrap(value, self._expires_at(timeout))
+
+    def _l1_ttl(self, timeout=DEFAULT_TIMEOUT, expires_at=None):
+        """L1条目的存活秒数，不超过 L1_TIMEOUT、调用方指定的超时和L2中剩余的时间"""
+        ttl = self._l1_timeout
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            ttl = min(ttl, timeout)
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        return ttl
+
+    def _l1_get(self, cache_key):
+        with self._lock:
+            entry = self._l1.get(cache_key)
+            if entry is None:
+                return _MISSING
+            pickled, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                del self._l1[cache_key]
+                return _MISSING
+            self._l1.move_to_end(cache_key)
+        return pickle.loads(pickled)
+
+    def _l1_set(self, cache_key, value, ttl, stamp=_MISSING):
+        """
+        写入L1；stamp 为从L2读取前该键所在组的版本戳，读取期间版本戳已变化
+        （其他进程写入了同组的键）时不写入，避免把旧值放回L1
+        """
+        bucket = self._bucket(cache_key)
+        if ttl <= 0:
+            self._l1_discard(cache_key)
+            return
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._lock:
+            if stamp is not _MISSING and self._stamps.get(bucket) != stamp:
+                return
+            self._l1[cache_key] = (pickled, time.monotonic() + ttl, bucket)
+            self._l1.move_to_end(cache_key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_fill(self, cache_key, stored, stamp):
+        """L2命中后写入L1，返回解包后的值"""
+        value, expires_at, cacheable = _unwrap(stored)
+        if cacheable:
+            self._l1_set(cache_key, value, self._l1_ttl(expires_at=expires_at), stamp)
+        return value
+
+    def _l1_discard(self, *cache_keys):
+        with self._lock:
+            for cache_key in cache_keys:
+                self._l1.pop(cache_key, None)
+
+    def _drop_buckets(self, buckets):
+        """丢弃属于指定分组的L1条目（调用方持有锁）"""
+        for cache_key in [key for key, entry in self._l1.items() if entry[2] in buckets]:
+            del self._l1[cache_key]
+
+    def _sync_stamps(self):
+        """按间隔读取L2中的全部版本戳，丢弃版本戳变化的分组中的L1条目"""
+        now = time.monotonic()
+        if now - self._stamp_checked_at < self._stamp_check_interval:
+            return
+        found = self.l2.get_many(self._stamp_keys)
+        stamps = {bucket: found.get(key) for bucket, key in enumerate(self._stamp_keys)}
+        with self._lock:
+            changed = {bucket for bucket, stamp in stamps.items() if self._stamps.get(bucket) != stamp}
+            if changed:
+                self._drop_buckets(changed)
+            self._stamps = stamps
+            self._stamp_checked_at = now
+
+    def _bump_stamps(self, cache_keys):
+        """递增这些键所在分组的版本戳，通知其他进程丢弃这些分组的L1条目"""
+        for bucket in sorted({self._bucket(cache_key) for cache_key in cache_keys}):
+            stamp_key = self._stamp_keys[bucket]
+            try:
+                stamp = self.l2.incr(stamp_key)
+            except ValueError:
+                # 版本戳不存在（首次使用或被清理），用毫秒时间戳初始化，避免与旧值重复
+                stamp = int(time.time() * 1000)
+                if not self.l2.add(stamp_key, stamp, None):
+                    stamp = self.l2.incr(stamp_key)
+            with self._lock:
+                # 期间没有其他进程写入该组时保留本进程的L1，否则同样需要丢弃
+                previous = self._stamps.get(bucket)
+                if previous is None or stamp != previous + 1:
+                    self._drop_buckets({bucket})
+                self._stamps[bucket] = stamp
+
+    # ==================== 缓存接口 ====================
+
+    def get(self, key, default=None, version=None):
+        if not self._use_l1(key):
+            value = self.l2.get(key, _MISSING, version)
+            if value is _MISSING:
+                record_cache_access(misses=1)
+                return default
+            record_cache_access(hits=1)
+            return value
+
+        self._sync_stamps()
+        cache_key = self.make_and_validate_key(key, version=version)
+        value = self._l1_get(cache_key)
+        if value is not _MISSING:
+            self.l1_hits += 1
+            record_cache_access(hits=1)
+            return value
+
+        self.l1_misses += 1
+        stamp = self._stamps.get(self._bucket(cache_key))
+        stored = self.l2.get(key, _MISSING, version)
+        if stored is _MISSING:
+            record_cache_access(misses=1)
+            return default
+        record_cache_access(hits=1)
+        return self._l1_fill(cache_key, stored, stamp)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = {}
+        l2_keys = []
+        self._sync_stamps()
+        stamps = dict(self._stamps)
+        for key in keys:
+            if self._use_l1(key):
+                value = self._l1_get(self.make_and_validate_key(key, version=version))
+                if value is not _MISSING:
+                    self.l1_hits += 1
+                    found[key] = value
+                    continue
+                self.l1_misses += 1
+            l2_keys.append(key)
+
+        if l2_keys:
+            for key, stored in self.l2.get_many(l2_keys, version=version).items():
+                if self._use_l1(key):
+                    cache_key = self.make_and_validate_key(key, version=version)
+                    found[key] = self._l1_fill(cache_key, stored, stamps.get(self._bucket(cache_key)))
+                else:
+                    found[key] = stored
+        record_cache_access(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    def has_key(self, key, version=None):
+        if self._use_l1(key):
+            self._sync_stamps()
+            if self._l1_get(self.make_and_validate_key(key, version=version)) is not _MISSING:
+                return True
+        return self.l2.has_key(key, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, self._to_l2(key, value, timeout), timeout, version)
+        if self._use_l1(key):
+            cache_key = self.make_and_validate_key(key, version=version)
+            self._bump_stamps([cache_key])
+            self._set_local(cache_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed_keys = self.l2.set_many(
+            {key: self._to_l2(key, value, timeout) for key, value in data.items()}, timeout, version,
+        )
+        l1_keys = {key: self.make_and_validate_key(key, version=version) for key in data if self._use_l1(key)}
+        if l1_keys:
+            self._bump_stamps(l1_keys.values())
+            for key, cache_key in l1_keys.items():
+                if key not in failed_keys:
+                    self._set_local(cache_key, data[key], timeout)
+        return failed_keys
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, self._to_l2(key, value, timeout), timeout, version)
+        if added and self._use_l1(key):
+            cache_key = self.make_and_validate_key(key, version=version)
+            self._bump_stamps([cache_key])
+            self._set_local(cache_key, value, timeout)
+        return added
+
+    def _set_local(self, cache_key, value, timeout):
+        """本进程写入后更新L1（整数计数器不进入L1）"""
+        if isinstance(value, int) and not isinstance(value, bool):
+            self._l1_discard(cache_key)
+        else:
+            self._l1_set(cache_key, value, self._l1_ttl(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        # L2中附带的过期时间不随之更新：延长时L1按原过期时间提前失效（多读一次L2），
+        # 缩短时通过版本戳让各进程丢弃该键所在组的L1条目
+        touched = self.l2.touch(key, timeout, version)
+        if self._use_l1(key):
+            cache_key = self.make_and_validate_key(key, version=version)
+            self._l1_discard(cache_key)
+            self._bump_stamps([cache_key])
+        return touched
+
+    def incr(self, key, delta=1, version=None):
+        value = self.l2.incr(key, delta, version)
+        if self._use_l1(key):
+            cache_key = self.make_and_validate_key(key, version=version)
+            self._l1_discard(cache_key)
+            self._bump_stamps([cache_key])
+        return value
+
+    def delete(self, key, version=None):
+        deleted = self.l2.delete(key, version)
+        if self._use_l1(key):
+            cache_key = self.make_and_validate_key(key, version=version)
+            self._l1_discard(cache_key)
+            self._bump_stamps([cache_key])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.l2.delete_many(keys, version)
+        cache_keys = [self.make_and_validate_key(key, version=version) for key in keys if self._use_l1(key)]
+        if cache_keys:
+            self._l1_discard(*cache_keys)
+            self._bump_stamps(cache_keys)
+
+    def clear(self):
+        # 清空L2的同时删除了全部版本戳，写入新的版本戳让其他进程丢弃整个L1
+        self.l2.clear()
+        stamp = int(time.time() * 1000)
+        self.l2.set_many({key: stamp for key in self._stamp_keys}, None)
+        with self._lock:
+            self._l1.clear()
+            self._stamps = dict.fromkeys(range(self._stamp_buckets), stamp)
+            self._stamp_checked_at = time.monotonic()
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
+
+
+class MeteredCache(BaseCache):
+    """
+    统计命中/未命中的缓存包装：LOCATION 为实际使用的缓存别名，全部操作原样转发
+    （键前缀、版本和过期时间由被包装的缓存处理）
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._alias = location
+
+    @property
+    def backend(self):
+        """被包装的缓存，通过别名获取以遵循Django的线程本地连接管理"""
+        return caches[self._alias]
+
+    def get(self, key, default=None, version=None):
+        value = self.backend.get(key, _MISSING, version)
+        if value is _MISSING:
+            record_cache_access(misses=1)
+            return default
+        record_cache_access(hits=1)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self.backend.get_many(keys, version=version)
+        record_cache_access(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    def has_key(self, key, version=None):
+        return self.backend.has_key(key, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.backend.set(key, value, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.backend.set_many(data, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.backend.add(key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.backend.touch(key, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        return self.backend.incr(key, delta, version)
+
+    def decr(self, key, delta=1, version=None):
+        return self.backend.decr(key, delta, version)
+
+    def delete(self, key, version=None):
+        return self.backend.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        self.backend.delete_many(keys, version)
+
+    def clear(self):
+        self.backend.clear()
+
+    def close(self, **kwargs):
+        self.backend.close(**kwargs)
@@ -0,0 +1,325 @@
+"""
+响应压缩模块
+HTML空白精简（保留 pre/textarea/script/style 以及带 data-preserve-whitespace 属性的元素中的原样内容）
+以及 gzip / brotli 压缩，供 app.core.middleware.CompressionMiddleware 和 benchmark 命令使用
+
+空白精简规则（只处理标签之间的空白，不改变渲染结果）：
+    两个标签之间只有空白时，含换行的折叠为一个换行，否则折叠为一个空格；去掉普通HTML注释
+    （保留 <!--[if ...]> 条件注释）。文本内容和属性值中的空白一律不动。
+    模板缩进是列表页体积的主要来源，几乎都位于标签之间。
+    white-space: pre-wrap 等样式下标签之间的空白也会显示，这类元素需加 data-preserve-whitespace 属性
+    （如文章详情页的评论内容），其中的全部内容（包括嵌套的同名元素）原样保留。
+
+流式响应：
+    HtmlMinifier 按块处理并在块之间保留状态（是否处于 pre 等原样区域、未完整的标签和空白），
+    压缩器每块输出后刷新，客户端能逐块收到数据。
+"""
+import gzip
+import re
+import secrets
+import zlib
+
+from django.utils.text import StreamingBuffer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = [
+    'HtmlMinifier', 'minify_html', 'choose_encoding',
+    'compress', 'compress_stream', 'acompress_stream', 'brotli_available',
+]
+
+# 内容原样保留的元素：pre 等固定的元素，以及带 data-preserve-whitespace 属性的任意元素
+_PROTECTED_OPEN = re.compile(
+    r'<(pre|textarea|script|style)\b[^>]*>'
+    r'|<([a-zA-Z][\w-]*)\b[^>]*?\sdata-preserve-whitespace\b[^>]*>',
+    re.IGNORECASE,
+)
+_CLOSE_TAGS = {tag: re.compile(rf'</{tag}\s*>', re.IGNORECASE) for tag in ('pre', 'textarea', 'script', 'style')}
+_CONDITIONAL_COMMENT = re.compile(r'<!--\s*\[if|<!--\s*<!\[endif')
+# 标签之间只有空白（开头的 > 属于前一个标签，其后紧跟下一个标签、结束标签或注释）
+_BETWEEN_TAGS = re.compile(r'>(\s+)(?=<[a-zA-Z/!])')
+# 占位：表示其后不再有需要原样保留的元素
+_NO_MATCH = object()
+
+# BREACH缓解：gzip文件名字段中加入随机长度的填充（同 Django GZipMiddleware）
+MAX_RANDOM_BYTES = 100
+
+# 动态内容使用的压缩级别（静态文件的预压缩见 app.core.storage，使用最高级别）
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def brotli_available():
+    return brotli is not None
+
+
+# ==================== HTML空白精简 ====================
+
+def _between_tags(match):
+    return '>\n' if '\n' in match.group(1) else '> '
+
+
+def _collapse(text, after_tag=False, before_tag=False):
+    """
+    折叠标签之间的空白；after_tag / before_tag 表示这段文本前后紧挨着已单独输出的标签
+    （原样区域的开始或结束标签、条件注释等）
+    """
+    if after_tag:
+        text = '>' + text
+    if before_tag:
+        text += '<a'
+    text = _BETWEEN_TAGS.sub(_between_tags, text)
+    if after_tag:
+        text = text[1:]
+    if before_tag:
+        text = text[:-2]
+    return text
+
+
+def _nested_tags(tag):
+    return re.compile(rf'<(/?){re.escape(tag)}\b[^>]*>', re.IGNORECASE)
+
+
+class HtmlMinifier:
+    """
+    可按块输入的HTML空白精简器
+    每次 feed 返回可以安全输出的部分，剩余内容（可能被截断的标签、空白串或结束标签）留到下一块，
+    最后调用 flush 输出全部剩余内容
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        # 当前所在的原样区域：标签名；带 data-preserve-whitespace 的元素另记录同名标签的嵌套层数
+        self._protected = None
+        self._nested = None
+        self._depth = 0
+        # 已输出内容是否以标签结尾（下一段开头的空白可能位于两个标签之间）
+        self._after_tag = False
+
+    def feed(self, text):
+        self._buffer += text
+        return self._drain(final=False)
+
+    def flush(self):
+        return self._drain(final=True)
+
+    def _emit(self, output, text):
+        if text:
+            output.append(text)
+            self._after_tag = text.endswith('>')
+
+    def _collapse_text(self, output, text, before_tag):
+        self._emit(output, _collapse(''.join(text), self._after_tag, before_tag))
+        text.clear()
+
+    def _drain_protected(self, buffer, position, size, output, final):
+        """在原样区域中前进，返回 (新的位置, 区域是否已结束)；未结束时剩余内容留到下一块"""
+        if self._nested is None:
+            match = _CLOSE_TAGS[self._protected].search(buffer, position)
+            if match:
+                self._emit(output, buffer[position:match.end()])
+                self._protected = None
+                return match.end(), True
+            # 保留可能是被截断的结束标签的尾部
+            keep = 0 if final else len(self._protected) + 8
+        else:
+            for match in self._nested.finditer(buffer, position):
+                self._depth += -1 if match.group(1) else 1
+                if self._depth == 0:
+                    self._emit(output, buffer[position:match.end()])
+                    self._protected = self._nested = None
+                    return match.end(), True
+            # 已计数的标签不能再次计数：只保留最后一个可能被截断的标签
+            keep = 0
+            if not final:
+                last_open = buffer.rfind('<', position)
+                if last_open != -1 and buffer.find('>', last_open) == -1:
+                    keep = size - last_open
+        if size - position > keep:
+            self._emit(output, buffer[position:size - keep])
+            position = size - keep
+        return position, False
+
+    def _drain(self, final):
+        # 按位置扫描而不是反复切片，整体开销与输入长度成线性关系
+        buffer = self._buffer
+        size = len(buffer)
+        output = []
+        text = []  # 待折叠的普通文本片段（已去掉注释，注释两侧的空白得以合并）
+        position = 0
+        protected_open = None
+        while position < size:
+            if self._protected:
+                position, finished = self._drain_protected(buffer, position, size, output, final)
+                if not finished:
+                    break
+                continue
+
+            if protected_open not in (None, _NO_MATCH) and protected_open.start() < position:
+                protected_open = None
+            if protected_open is None:
+                protected_open = _PROTECTED_OPEN.search(buffer, position) or _NO_MATCH
+            limit = protected_open.start() if protected_open is not _NO_MATCH else size
+            comment = buffer.find('<!--', position, limit)
+            if comment != -1:
+                text.append(buffer[position:comment])
+                end = buffer.find('-->', comment + 4)
+                if end == -1 and not final:
+                    # 注释尚未结束，留到下一块
+                    position = comment
+                    break
+                if end != -1 and not _CONDITIONAL_COMMENT.match(buffer, comment):
+                    position = end + 3
+                    continue
+                end = size if end == -1 else end + 3
+                self._collapse_text(output, text, before_tag=True)
+                self._emit(output, buffer[comment:end])
+                position = end
+                continue
+            if protected_open is not _NO_MATCH:
+                text.append(buffer[position:protected_open.start()])
+                self._collapse_text(output, text, before_tag=True)
+                self._emit(output, protected_open.group(0))
+                if protected_open.group(1):
+                    self._protected = protected_open.group(1).lower()
+                else:
+                    self._protected = protected_open.group(2).lower()
+                    self._nested = _nested_tags(self._protected)
+                    self._depth = 1
+                position = protected_open.end()
+                continue
+            text.append(buffer[position:])
+            position = size
+
+        pending = ''.join(text)
+        if final:
+            self._emit(output, _collapse(pending, self._after_tag))
+            pending = ''
+        elif pending:
+            cut = self._safe_cut(pending)
+            self._emit(output, _collapse(pending[:cut], self._after_tag))
+            pending = pending[cut:]
+        self._buffer = pending + buffer[position:]
+        return ''.join(output)
+
+    @staticmethod
+    def _safe_cut(text):
+        """不截断未闭合的标签和末尾空白串时可以输出的最大长度"""
+        cut = len(text)
+        last_open = text.rfind('<')
+        if last_open != -1 and text.find('>', last_open) == -1:
+            cut = last_open
+        return len(text[:cut].rstrip())
+
+
+def minify_html(html):
+    """精简一段完整的HTML文本"""
+    minifier = HtmlMinifier()
+    return minifier.feed(html) + minifier.flush()
+
+
+# ==================== 压缩 ====================
+
+_ENCODING_TOKEN = re.compile(r'\s*([a-z0-9*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?', re.IGNORECASE)
+
+
+def choose_encoding(accept_encoding, allow_brotli=True):
+    """根据 Accept-Encoding 选择 br 或 gzip（q=0 表示拒绝），都不接受时返回 None"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        match = _ENCODING_TOKEN.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        accepted[match.group(1).lower()] = quality
+    if allow_brotli and brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def _random_filename():
+    return secrets.token_hex(secrets.randbelow(MAX_RANDOM_BYTES // 2) + 1).encode('ascii')
+
+
+def compress(data, encoding):
+    """压缩完整的响应体"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    buffer = StreamingBuffer()
+    with gzip.GzipFile(filename=_random_filename(), mode='wb', compresslevel=GZIP_LEVEL,
+                       fileobj=buffer, mtime=0) as zfile:
+        zfile.write(data)
+    return buffer.read()
+
+
+class _StreamCompressor:
+    """逐块压缩并刷新，每块输入都会立即产生可解码的输出"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._buffer = StreamingBuffer()
+            self._gzip = gzip.GzipFile(filename=_random_filename(), mode='wb', compresslevel=GZIP_LEVEL,
+                                       fileobj=self._buffer, mtime=0)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._brotli.process(data) + self._brotli.flush()
+        self._gzip.write(data)
+        self._gzip.flush(zlib.Z_SYNC_FLUSH)
+        return self._buffer.read()
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        self._gzip.close()
+        return self._buffer.read()
+
+
+def _encode_chunk(chunk, charset, minifier):
+    if minifier is None:
+        return chunk
+    return minifier.feed(chunk.decode(charset, errors='surrogateescape')).encode(charset, errors='surrogateescape')
+
+
+def compress_stream(chunks, encoding, minifier=None, charset='utf-8'):
+    """压缩（并可选精简）同步的流式响应"""
+    compressor = _StreamCompressor(encoding) if encoding else None
+    for chunk in chunks:
+        data = _encode_chunk(chunk, charset, minifier)
+        if compressor is not None:
+            data = compressor.compress(data) if data else b''
+        if data:
+            yield data
+    tail = minifier.flush().encode(charset, errors='surrogateescape') if minifier is not None else b''
+    if compressor is not None:
+        tail = (compressor.compress(tail) if tail else b'') + compressor.finish()
+    if tail:
+        yield tail
+
+
+async def acompress_stream(chunks, encoding, minifier=None, charset='utf-8'):
+    """compress_stream 的异步版本，用于异步迭代器的流式响应"""
+    compressor = _StreamCompressor(encoding) if encoding else None
+    async for chunk in chunks:
+        data = _encode_chunk(chunk, charset, minifier)
+        if compressor is not None:
+            data = compressor.compress(data) if data else b''
+        if data:
+            yield data
+    tail = minifier.flush().encode(charset, errors='surrogateescape') if minifier is not None else b''
+    if compressor is not None:
+        tail = (compressor.compress(tail) if tail else b'') + compressor.finish()
+    if tail:
+        yield tail
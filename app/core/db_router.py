@@ -0,0 +1,83 @@
+"""
+主从数据库路由模块
+只读视图通过 read_from_replica 装饰器把读查询发往 replica 别名，写操作始终走 default；
+用户刚执行过写操作（POST等）后的一段时间内，其请求固定读主库，保证能读到自己的写入
+
+配置示例：
+    DATABASES['replica'] = {...}          # 只读副本，未配置时装饰器不生效
+    DATABASE_ROUTERS = ['app.core.db_router.PrimaryReplicaRouter']
+    MIDDLEWARE += ['app.core.middleware.ReplicaPinMiddleware']
+    REPLICA_PIN_SECONDS = 10              # 写操作后固定读主库的秒数
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = [
+    'PrimaryReplicaRouter', 'read_from_replica', 'replica_available',
+    'is_pinned_to_primary', 'PRIMARY_ALIAS', 'REPLICA_ALIAS', 'PIN_COOKIE_NAME',
+]
+
+PRIMARY_ALIAS = 'default'
+REPLICA_ALIAS = 'replica'
+
+# 写操作后设置的Cookie，存在时读请求固定走主库
+PIN_COOKIE_NAME = 'meow_pin_primary'
+
+# 始终读主库的应用（会话数据写入后立即就要读到）
+PRIMARY_ONLY_APP_LABELS = {'sessions'}
+
+# 当前上下文的读库别名，只在 read_from_replica 包裹的视图内设置
+_read_alias = ContextVar('meowsite_read_alias', default=None)
+
+
+def replica_available():
+    """是否配置了只读副本"""
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def is_pinned_to_primary(request):
+    """请求是否需要固定读主库（用户刚执行过写操作）"""
+    return PIN_COOKIE_NAME in request.COOKIES
+
+
+def read_from_replica(view_func):
+    """
+    只读视图装饰器
+    GET/HEAD 请求在视图执行期间把读查询路由到只读副本；
+    其他请求方法、未配置副本或用户刚写入过数据时保持读主库
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or not replica_available()
+                or is_pinned_to_primary(request)):
+            return view_func(request, *args, **kwargs)
+        token = _read_alias.set(REPLICA_ALIAS)
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return _wrapped_view
+
+
+class PrimaryReplicaRouter:
+    """主从路由：写入走主库，read_from_replica 范围内的读取走副本"""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or model._meta.app_label in PRIMARY_ONLY_APP_LABELS:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 主库与副本数据相同，允许跨别名建立关联
+        allowed = {PRIMARY_ALIAS, REPLICA_ALIAS}
+        if obj1._state.db in allowed and obj2._state.db in allowed:
+            return True
+        return None
@@ -0,0 +1,166 @@
+"""
+结构化日志模块
+可选的JSON Lines日志格式（LOG_FORMAT=json）：每行一个JSON对象，带上请求ID、用户ID、视图名称、
+请求开始至今的耗时和已执行的查询次数，日志可以直接按字段过滤和汇总，不必用正则解析文本
+
+请求上下文：
+    RequestContextMiddleware 为每个请求生成请求ID（或沿用nginx传入的 X-Request-ID），
+    并在 X-Request-ID 响应头中返回。日志记录创建时（在请求线程中）由记录工厂把上下文字段附加到记录上，
+    记录交给后台线程（app.core.logqueue）格式化时字段仍是记录产生时的值。
+    用户ID只取已经加载过的用户，写日志不会额外查询数据库。
+
+本模块不依赖Django，log_viewer.py 等脚本可以直接使用 parse_line / line_level 解析两种格式的日志行
+"""
+import contextvars
+import json
+import logging
+import re
+import time
+import uuid
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = [
+    'CONTEXT_FIELDS', 'JsonFormatter', 'install_record_factory',
+    'begin_request', 'end_request', 'set_view', 'new_request_id',
+    'parse_line', 'line_level',
+]
+
+# 附加到日志记录上的上下文字段（名称避免与 logging 的 extra 参数冲突）
+CONTEXT_FIELDS = ('request_id', 'user_id', 'view_name', 'latency_ms', 'query_count')
+
+LEVEL_NAMES = ('CRITICAL', 'ERROR', 'WARNING', 'INFO', 'DEBUG')
+
+# 接受的外部请求ID（nginx 的 $request_id 为32位十六进制）
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{8,64}$')
+
+
+class RequestContext:
+    """单个请求的日志上下文"""
+
+    __slots__ = ('request_id', 'request', 'view_name', 'stats', 'started')
+
+    def __init__(self, request_id, request=None, stats=None):
+        self.request_id = request_id
+        self.request = request
+        self.view_name = None
+        # 运行时指标中间件的请求统计（app.core.metrics.RequestStats），用于读取查询次数
+        self.stats = stats
+        self.started = time.perf_counter()
+
+    def user_id(self):
+        """已加载用户的ID；request.user 仍是未求值的惰性对象时返回None，不触发查询"""
+        user = getattr(self.request, '__dict__', {}).get('user')
+        if user is None:
+            return None
+        # SimpleLazyObject 未求值时 _wrapped 为 django.utils.functional.empty（一个普通 object 实例）
+        wrapped = vars(user).get('_wrapped', user)
+        if type(wrapped) is object:
+            return None
+        return getattr(wrapped, 'pk', None)
+
+
+_current = contextvars.ContextVar('meowsite_log_context', default=None)
+
+
+def new_request_id(incoming=None):
+    """沿用格式合法的外部请求ID，否则生成新的"""
+    if incoming and _REQUEST_ID.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def begin_request(request_id, request=None, stats=None):
+    context = RequestContext(request_id, request, stats)
+    _current.set(context)
+    return context
+
+
+def end_request():
+    _current.set(None)
+
+
+def set_view(name):
+    context = _current.get()
+    if context is not None:
+        context.view_name = name
+
+
+# ==================== 日志记录工厂 ====================
+
+def install_record_factory():
+    """在日志记录创建时附加当前请求的上下文字段（只在请求内生效，重复调用无副作用）"""
+    base_factory = logging.getLogRecordFactory()
+    if getattr(base_factory, 'meowsite_context', False):
+        return
+
+    def factory(*args, **kwargs):
+        record = base_factory(*args, **kwargs)
+        context = _current.get()
+        if context is not None:
+            record.request_id = context.request_id
+            record.user_id = context.user_id()
+            record.view_name = context.view_name
+            record.latency_ms = round((time.perf_counter() - context.started) * 1000, 1)
+            record.query_count = context.stats.queries if context.stats is not None else None
+        return record
+
+    factory.meowsite_context = True
+    logging.setLogRecordFactory(factory)
+
+
+# ==================== 格式化 ====================
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出为一行JSON，上下文字段为空时省略"""
+
+    default_time_format = '%Y-%m-%dT%H:%M:%S'
+    default_msec_format = '%s.%03d'
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# ==================== 解析 ====================
+
+def parse_line(line):
+    """
+    解析一行日志：JSON行返回其字段；文本格式（verbose：级别在行首）返回 {'level', 'message'}；
+    无法识别的行（如异常堆栈的后续行）返回None
+    """
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        return entry if isinstance(entry, dict) else None
+    level, _, _rest = line.partition(' ')
+    if level in LEVEL_NAMES:
+        return {'level': level, 'message': line}
+    return None
+
+
+def line_level(line):
+    """日志行的级别名称，无法识别时返回None"""
+    entry = parse_line(line)
+    return entry.get('level') if entry else None
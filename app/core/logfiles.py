@@ -0,0 +1,505 @@
+"""
+日志文件读取模块
+供 log_viewer.py 和 logmanage 命令使用，不依赖Django
+
+tail_lines：
+    从文件末尾按固定大小的块向前读取，读到足够的换行符即停止，
+    内存占用只与要返回的行数有关，与文件大小无关。
+    按字节查找换行符后再逐行解码：UTF-8多字节字符的任何字节都不会是 0x0A，
+    块边界落在字符中间也不会产生错误的解码。
+
+按时间范围搜索（LogQuery）：
+    一个日志的全部文件（log_family）：logmanage --archive 生成的 {名称}.{时间戳}.gz 归档、
+    RotatingFileHandler 滚动出的 {名称}.N 备份和当前文件。
+    每个文件旁边保存一个稀疏索引 {文件名}.idx（JSON）：文件的首尾时间，以及每隔约 INDEX_INTERVAL 字节
+    一个 (时间, 偏移) 采样点。搜索时先按首尾时间跳过不相关的文件，再二分查找起始偏移，
+    读到晚于结束时间的记录即停止；.gz 归档以流的方式解压，跳到起始偏移时只解压不解析。
+    当前文件继续写入时索引从上次的位置增量扩展，文件被滚动（首行变化）或归档被替换时重建。
+    日志目录不可写时索引只在内存中使用。
+
+统计与归档（count_lines / gzip_file，供 logmanage 使用）：
+    按固定大小的块读取二进制数据，内存占用与文件大小无关；
+    gzip_file 先写入同目录的临时文件再改名，中断的归档不会留下不完整的 .gz 文件。
+
+跟随新增内容（LogFollower）：
+    按块读取新增的数据并拆分为完整记录。每次读取后比较路径当前指向的文件（inode）和已打开的文件：
+    不同说明发生了滚动，读完旧文件剩余内容后从头读取新文件；文件变小说明被截断（logmanage --archive
+    归档后会清空原文件），从头重新读取。
+
+    日志记录按写入时间大致有序（多个worker写同一文件时可能有毫秒级的乱序），
+    时间精确到秒；没有时间戳的行（异常堆栈等）归入上一条记录。
+"""
+import bisect
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from .jsonlog import LEVEL_NAMES
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = [
+    'tail_lines', 'BLOCK_SIZE',
+    'parse_header', 'parse_time_arg', 'log_family', 'load_index', 'LogQuery',
+    'INDEX_SUFFIX', 'LEVEL_RANKS', 'LogFollower', 'count_lines', 'gzip_file',
+]
+
+# 每次向前读取的字节数
+BLOCK_SIZE = 64 * 1024
+
+
+def tail_lines(file_path, lines=50, block_size=BLOCK_SIZE, encoding='utf-8'):
+    """返回文件的最后 lines 行（保留行尾换行符，与 readlines 一致）"""
+    if lines <= 0:
+        return []
+
+    with open(file_path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        blocks = []
+        newlines = 0
+        # 需要 lines+1 个换行符才能确定第一行的开头（文件末尾的换行符不会产生新行）
+        while position > 0 and newlines <= lines:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            blocks.append(block)
+            newlines += block.count(b'\n')
+
+    data = b''.join(reversed(blocks))
+    parts = data.split(b'\n')
+    if position > 0:
+        # 没读到文件开头时第一段是不完整的行
+        parts = parts[1:]
+    if parts and parts[-1] == b'':
+        parts.pop()
+        complete = True
+    else:
+        complete = False
+    parts = parts[-lines:]
+
+    # 与文本模式一致，\r\n 行尾按 \n 返回
+    result = [part.rstrip(b'\r').decode(encoding, errors='replace') + '\n' for part in parts]
+    if result and not complete:
+        # 最后一行没有换行符（正在写入或文件不以换行结尾），保持原样
+        result[-1] = result[-1][:-1]
+    return result
+
+
+# 统计和归档时每次读取的字节数
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+def count_lines(file_path, block_size=COPY_BLOCK_SIZE):
+    """统计文件行数（没有换行结尾的最后一行也计入）"""
+    count = 0
+    last = b'\n'
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            count += block.count(b'\n')
+            last = block[-1:]
+    return count if last == b'\n' else count + 1
+
+
+def gzip_file(source, destination, compresslevel=6, block_size=COPY_BLOCK_SIZE):
+    """
+    把 source 压缩为 destination（先写临时文件，完成后改名）
+    返回 (原始字节数, 压缩后字节数, 耗时秒数)；可以在进程池中调用
+    """
+    started = time.perf_counter()
+    destination = Path(destination)
+    temp_path = destination.with_name(f'.{destination.name}.{os.getpid()}.tmp')
+    try:
+        with open(source, 'rb') as f_in, open(temp_path, 'wb') as raw:
+            with gzip.GzipFile(filename=Path(source).name, mode='wb', compresslevel=compresslevel,
+                               fileobj=raw) as f_out:
+                shutil.copyfileobj(f_in, f_out, block_size)
+            original_size = f_in.tell()
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(temp_path, destination)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return original_size, destination.stat().st_size, time.perf_counter() - started
+
+
+# ==================== 记录首行解析 ====================
+
+# verbose 文本格式：级别 时间 ...；JSON格式：JsonFormatter 输出的前两个字段固定为 time、level
+_TEXT_HEADER = re.compile(rb'([A-Z]+) (\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)')
+_JSON_HEADER = re.compile(rb'\{"time": "(\d{4}-\d\d-\d\d)T(\d\d:\d\d:\d\d)[^"]*", "level": "([A-Z]+)"')
+
+_LEVELS = {name.encode(): name for name in LEVEL_NAMES}
+# 与 logging 模块的级别数值相同
+LEVEL_RANKS = {'CRITICAL': 50, 'ERROR': 40, 'WARNING': 30, 'INFO': 20, 'DEBUG': 10}
+
+
+def parse_header(line):
+    """
+    解析一行（bytes）的时间和级别，返回 ('YYYY-mm-dd HH:MM:SS', 级别)；
+    不是记录首行（异常堆栈等后续行）时返回 (None, None)
+    """
+    match = _TEXT_HEADER.match(line)
+    if match:
+        level = _LEVELS.get(match.group(1))
+        if level:
+            return match.group(2).decode('ascii'), level
+    match = _JSON_HEADER.match(line)
+    if match:
+        level = _LEVELS.get(match.group(3))
+        if level:
+            return f"{match.group(1).decode('ascii')} {match.group(2).decode('ascii')}", level
+    return None, None
+
+
+_RELATIVE_TIME = re.compile(r'^(\d+)([smhd])$')
+_RELATIVE_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days'}
+
+
+def parse_time_arg(value, end_of_day=False, now=None):
+    """
+    把命令行时间参数转换为 'YYYY-mm-dd HH:MM:SS'：
+    支持 2026-10-13、2026-10-13 08:00、2026-10-13T08:00:00 以及相对时间 30m / 2h / 7d；
+    只有日期且 end_of_day 为真时取当天最后一秒（用于 --until）
+    """
+    value = value.strip()
+    match = _RELATIVE_TIME.match(value)
+    if match:
+        moment = (now or datetime.now()) - timedelta(**{_RELATIVE_UNITS[match.group(2)]: int(match.group(1))})
+        return moment.strftime('%Y-%m-%d %H:%M:%S')
+    moment = datetime.fromisoformat(value)
+    if end_of_day and len(value) == 10:
+        moment = moment.replace(hour=23, minute=59, second=59)
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+
+# ==================== 日志文件族 ====================
+
+def log_family(log_path):
+    """
+    同一日志的全部文件，按时间从旧到新排列：
+    归档 {名称}.{YYYYmmdd_HHMMSS}.gz（按时间戳）、滚动备份 {名称}.N（N越大越旧）、当前文件
+    """
+    log_path = Path(log_path)
+    directory, name = log_path.parent, log_path.name
+    if not directory.exists():
+        return []
+    archive_pattern = re.compile(rf'^{re.escape(name)}\.(\d{{8}}_\d{{6}})\.gz$')
+    backup_pattern = re.compile(rf'^{re.escape(name)}\.(\d+)$')
+    archives, backups = [], []
+    for entry in directory.iterdir():
+        match = archive_pattern.match(entry.name)
+        if match:
+            archives.append((match.group(1), entry))
+            continue
+        match = backup_pattern.match(entry.name)
+        if match:
+            backups.append((int(match.group(1)), entry))
+    files = [entry for _key, entry in sorted(archives)]
+    files += [entry for _key, entry in sorted(backups, reverse=True)]
+    if log_path.exists():
+        files.append(log_path)
+    return files
+
+
+# ==================== 稀疏时间索引 ====================
+
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+# 采样间隔（字节，未压缩）：越小定位越精确，索引越大
+INDEX_INTERVAL = 1024 * 1024
+# 用于识别文件是否被替换（滚动）的文件头长度
+_HEAD_BYTES = 256
+
+
+def _open_log(path):
+    return gzip.open(path, 'rb') if path.suffix == '.gz' else open(path, 'rb')
+
+
+def _index_path(path):
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def _head_digest(path):
+    with _open_log(path) as f:
+        return hashlib.md5(f.read(_HEAD_BYTES)).hexdigest()
+
+
+def _scan_index(path, index, interval):
+    """从 index['size'] 处继续扫描（未压缩偏移），补充采样点和首尾时间；不完整的最后一行留到下次"""
+    offset = index['size'] if not index['compressed'] else 0
+    next_mark = index['entries'][-1][1] + interval if index['entries'] else 0
+    with _open_log(path) as f:
+        if offset:
+            f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n') and not index['compressed']:
+                break
+            timestamp, _level = parse_header(line)
+            if timestamp is not None:
+                if index['first'] is None:
+                    index['first'] = timestamp
+                if index['last'] is None or timestamp > index['last']:
+                    index['last'] = timestamp
+                if offset >= next_mark:
+                    index['entries'].append([timestamp, offset])
+                    next_mark = offset + interval
+            offset += len(line)
+    if not index['compressed']:
+        index['size'] = offset
+
+
+def load_index(path, interval=INDEX_INTERVAL):
+    """
+    读取（必要时建立或扩展）文件的稀疏索引：
+    {'first', 'last', 'entries': [[时间, 未压缩偏移], ...], 'size', 'mtime', 'head', 'compressed'}
+    """
+    path = Path(path)
+    stat = path.stat()
+    compressed = path.suffix == '.gz'
+    index_path = _index_path(path)
+    head = _head_digest(path)
+
+    index = None
+    try:
+        with open(index_path, encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        pass
+    if index is not None:
+        reusable = index.get('version') == INDEX_VERSION and index.get('head') == head
+        if compressed:
+            reusable = reusable and index.get('file_size') == stat.st_size and index.get('mtime') == stat.st_mtime
+        else:
+            reusable = reusable and index.get('size', 0) <= stat.st_size
+        if not reusable:
+            index = None
+        elif compressed or index['size'] == stat.st_size:
+            return index
+
+    if index is None:
+        index = {
+            'version': INDEX_VERSION, 'compressed': compressed, 'head': head,
+            'first': None, 'last': None, 'entries': [], 'size': 0,
+        }
+    _scan_index(path, index, interval)
+    index['file_size'] = stat.st_size
+    index['mtime'] = stat.st_mtime
+    _save_index(index_path, index)
+    return index
+
+
+def _save_index(index_path, index):
+    """先写临时文件再替换，其他进程不会读到写了一半的索引；目录不可写时忽略"""
+    temp_path = index_path.with_name(f'{index_path.name}.{os.getpid()}.tmp')
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(temp_path, index_path)
+    except OSError:
+        try:
+            temp_path.unlink()
+        except OSError:
+            pass
+
+
+# ==================== 搜索 ====================
+
+class LogQuery:
+    """
+    按时间范围、最低级别和正则搜索日志记录
+    since / until 为 'YYYY-mm-dd HH:MM:SS'（含两端），level 为最低级别名称，pattern 为正则表达式
+    """
+
+    def __init__(self, since=None, until=None, level=None, pattern=None):
+        self.since = since
+        self.until = until
+        self.min_rank = LEVEL_RANKS[level.upper()] if level else None
+        self.pattern = re.compile(pattern) if pattern else None
+        # 统计：扫描的未压缩字节数、因时间范围整体跳过的文件数
+        self.bytes_scanned = 0
+        self.files_skipped = 0
+
+    def search(self, paths):
+        """依次搜索各文件，逐条产生 (文件, 时间, 级别, 记录文本)"""
+        for path in paths:
+            yield from self.search_file(Path(path))
+
+    def search_file(self, path):
+        index = load_index(path)
+        if index['first'] is None or (self.since and index['last'] < self.since) \
+                or (self.until and index['first'] > self.until):
+            self.files_skipped += 1
+            return
+
+        start = 0
+        if self.since and index['entries']:
+            # 最后一个时间早于 since 的采样点之后才可能出现范围内的记录
+            position = bisect.bisect_left([entry[0] for entry in index['entries']], self.since) - 1
+            if position >= 0:
+                start = index['entries'][position][1]
+
+        with _open_log(path) as f:
+            if start:
+                f.seek(start)
+            offset = start
+            record, record_time, record_level = [], None, None
+            for line in f:
+                offset += len(line)
+                timestamp, level = parse_header(line)
+                if timestamp is None:
+                    if record:
+                        record.append(line)
+                    continue
+                if record:
+                    match = self.match(record, record_time, record_level)
+                    if match is not None:
+                        yield path, record_time, record_level, match
+                if self.until and timestamp > self.until:
+                    record = []
+                    break
+                record, record_time, record_level = [line], timestamp, level
+            if record:
+                match = self.match(record, record_time, record_level)
+                if match is not None:
+                    yield path, record_time, record_level, match
+            self.bytes_scanned += offset - start
+
+    def match(self, record, timestamp, level):
+        """记录（bytes 行列表）满足条件时返回其文本，否则返回None"""
+        if self.since and (timestamp is None or timestamp < self.since):
+            return None
+        if self.until and (timestamp is None or timestamp > self.until):
+            return None
+        if self.min_rank is not None and (level is None or LEVEL_RANKS[level] < self.min_rank):
+            return None
+        text = b''.join(record).decode('utf-8', errors='replace')
+        if self.pattern is not None and not self.pattern.search(text):
+            return None
+        return text
+
+
+# ==================== 跟随 ====================
+
+class LogFollower:
+    """
+    跟随一个日志文件的新增记录（可跨越文件滚动和截断）
+    poll() 返回自上次调用以来新增的完整记录 [(时间, 级别, [bytes 行...]), ...]；
+    最后一条记录可能还有后续的堆栈行，保留到下一条记录出现或某次调用没有新数据时再返回
+    """
+
+    def __init__(self, path, from_end=True, block_size=BLOCK_SIZE):
+        self.path = Path(path)
+        self.block_size = block_size
+        # 第一次打开时跳过已有内容；滚动后的新文件从头读取
+        self._from_end = from_end
+        self._file = None
+        self._identity = None
+        # 文件开头的内容（最多 _HEAD_BYTES 字节），用于发现截断后又写入超过原位置的情况
+        self._head = b''
+        self._partial = b''
+        self._pending = None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def poll(self):
+        lines = self._read_new_lines()
+        records = []
+        for line in lines:
+            timestamp, level = parse_header(line)
+            if timestamp is None and self._pending is not None:
+                self._pending[2].append(line)
+                continue
+            if self._pending is not None:
+                records.append(self._pending)
+            # 跟随开始前就已写入一半的记录的后续行单独成为一条没有时间和级别的记录
+            self._pending = (timestamp, level, [line])
+        if not lines and self._pending is not None:
+            records.append(self._pending)
+            self._pending = None
+        return records
+
+    def _open(self):
+        try:
+            self._file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+        stat = os.fstat(self._file.fileno())
+        self._identity = (stat.st_dev, stat.st_ino)
+        self._head = self._read_head()
+        if self._from_end:
+            self._file.seek(0, os.SEEK_END)
+            self._from_end = False
+        return True
+
+    def _read_head(self, size=_HEAD_BYTES):
+        """读取文件开头 size 字节，不改变当前读取位置"""
+        position = self._file.tell()
+        self._file.seek(0)
+        head = self._file.read(size)
+        self._file.seek(position)
+        return head
+
+    def _rewritten(self):
+        """
+        同一个文件是否被截断（copytruncate 等）：当前大小小于读取位置，
+        或截断后写入的内容已超过读取位置（大小不再变小），此时开头的内容与之前不同
+        """
+        if os.fstat(self._file.fileno()).st_size < self._file.tell():
+            return True
+        if len(self._head) < _HEAD_BYTES:
+            # 打开时文件不足 _HEAD_BYTES 字节，只比较已知的部分，之后补全
+            head = self._read_head()
+            if head[:len(self._head)] != self._head:
+                return True
+            self._head = head
+            return False
+        return self._read_head() != self._head
+
+    def _read_new_lines(self):
+        if self._file is None and not self._open():
+            return []
+        if self._rewritten():
+            # 先于读取检查：截断后写入的内容从头读，而不是从原来的位置接着读
+            self._file.seek(0)
+            self._partial = b''
+            self._head = self._read_head()
+        lines = self._read_available()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            # 滚动中：旧文件已改名，新文件尚未创建
+            return lines
+        if (stat.st_dev, stat.st_ino) != self._identity:
+            # 已滚动：旧文件中没有换行结尾的剩余内容作为最后一行
+            if self._partial:
+                lines.append(self._partial)
+                self._partial = b''
+            self.close()
+            if self._open():
+                lines += self._read_available()
+        return lines
+
+    def _read_available(self):
+        """读到文件当前末尾，返回完整的行；不完整的最后一行留到下次"""
+        lines = []
+        while True:
+            block = self._file.read(self.block_size)
+            if not block:
+                break
+            parts = (self._partial + block).split(b'\n')
+            self._partial = parts.pop()
+            lines.extend(part + b'\n' for part in parts)
+        return lines
@@ -0,0 +1,221 @@
+"""
+日志队列模块
+把 LOGGING 中配置的处理器（滚动文件、控制台、慢查询日志）交给每个进程一个的监听线程：
+请求线程中的日志调用只把记录放入有界队列，格式化、文件写入和滚动都在监听线程中完成，
+文件滚动不再阻塞触发它的请求
+
+工作方式：
+    install() 把每个日志记录器上的处理器替换为一个 QueueProxyHandler，原处理器交给监听线程。
+    每条记录仍只交给其记录器原来的处理器，级别和过滤器不变。
+    记录入队时保存当前的 contextvars 上下文，监听线程在该上下文中调用处理器，
+    依赖请求上下文的处理器（如慢查询日志按视图汇总）得到的结果与同步调用相同。
+
+有界队列：
+    队列满时丢弃新记录并计数，不阻塞请求；监听线程随后写出一条WARNING说明丢弃的数量
+
+多进程：
+    gunicorn 预加载应用时在主进程安装，fork出的worker自动换用新的队列并启动自己的监听线程。
+    worker退出（gunicorn.conf.py 的 worker_exit）或进程退出时 stop() 写完队列中剩余的记录，
+    并把处理器还给原来的日志记录器
+
+配置：
+    LOGGING_QUEUE_ENABLED  是否启用（生产环境默认启用）
+    LOGGING_QUEUE_SIZE     每个进程的队列容量（条）
+"""
+import atexit
+import contextvars
+import copy
+import logging
+import os
+import queue
+import threading
+import time
+
+# 获取日志记录器
+logger = logging.getLogger('core')
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = ['QueueProxyHandler', 'LogPipeline', 'install', 'stop', 'stats']
+
+DEFAULT_QUEUE_SIZE = 10000
+
+# 丢弃告警的最小间隔（秒），队列持续满载时不让告警本身占满队列
+DROP_REPORT_INTERVAL = 10
+
+# 通知监听线程退出的哨兵
+_STOP = object()
+
+# 当前进程的日志队列（未启用时为None）
+_pipeline = None
+
+
+class QueueProxyHandler(logging.Handler):
+    """代替某个日志记录器上的全部处理器：记录入队后由监听线程交给 targets 处理"""
+
+    def __init__(self, pipeline, targets):
+        super().__init__(level=min(handler.level for handler in targets))
+        self.pipeline = pipeline
+        self.targets = tuple(targets)
+
+    def emit(self, record):
+        try:
+            # 入队时求出消息文本，避免监听线程处理前参数对象被修改
+            record = copy.copy(record)
+            record.msg = record.getMessage()
+            record.args = None
+            self.pipeline.put((self.targets, contextvars.copy_context(), record))
+        except Exception:
+            self.handleError(record)
+
+
+class LogPipeline:
+    """有界日志队列和监听线程"""
+
+    def __init__(self, maxsize=DEFAULT_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.installed = []  # [(日志记录器, 原处理器列表, 代理处理器)]
+        self._reset()
+
+    def _reset(self):
+        self.dropped = 0
+        self._reported = 0
+        self._last_report = 0.0
+        self._drop_lock = threading.Lock()
+        self._queue = queue.Queue(self.maxsize)
+        self._thread = None
+
+    def put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='log-queue-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """写完队列中剩余的记录后停止监听线程"""
+        if not self.running:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+
+    def after_fork(self):
+        """子进程中换用新的队列：继承来的队列的锁可能正被父进程的线程持有"""
+        was_running = self._thread is not None
+        self._reset()
+        if was_running:
+            self.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            targets, context, record = item
+            self._dispatch(targets, context, record)
+            if self.dropped != self._reported and time.monotonic() - self._last_report >= DROP_REPORT_INTERVAL:
+                self.report_dropped()
+
+    @staticmethod
+    def _dispatch(targets, context, record):
+        for handler in targets:
+            if record.levelno >= handler.level:
+                try:
+                    context.run(handler.handle, record)
+                except Exception:
+                    # 过滤器等抛出的异常不能让监听线程退出
+                    handler.handleError(record)
+
+    def report_dropped(self):
+        """记录新丢弃的日志数量；在监听线程中直接交给 core 日志记录器的处理器，不经过可能已满的队列"""
+        dropped, self._reported = self.dropped - self._reported, self.dropped
+        self._last_report = time.monotonic()
+        if not dropped:
+            return
+        message = f'日志队列已满（容量 {self.maxsize}），丢弃了 {dropped} 条日志，累计 {self.dropped} 条'
+        proxy = next((proxy for target_logger, _handlers, proxy in self.installed
+                      if target_logger is logger and proxy in logger.handlers), None)
+        if proxy is None:
+            logger.warning(message)
+            return
+        record = logger.makeRecord(logger.name, logging.WARNING, __file__, 0, message, None, None)
+        self._dispatch(proxy.targets, contextvars.copy_context(), record)
+
+    def stats(self):
+        return {
+            'running': self.running,
+            'queued': self._queue.qsize(),
+            'maxsize': self.maxsize,
+            'dropped': self.dropped,
+        }
+
+
+def _existing_loggers():
+    yield logging.getLogger()
+    for name in list(logging.root.manager.loggerDict):
+        candidate = logging.root.manager.loggerDict.get(name)
+        if isinstance(candidate, logging.Logger):
+            yield candidate
+
+
+def install(maxsize=DEFAULT_QUEUE_SIZE):
+    """把已配置的日志处理器移到当前进程的监听线程（重复调用返回同一个队列）"""
+    global _pipeline
+    if _pipeline is not None:
+        return _pipeline
+
+    pipeline = LogPipeline(maxsize)
+    for target_logger in _existing_loggers():
+        handlers = list(target_logger.handlers)
+        if not handlers:
+            continue
+        proxy = QueueProxyHandler(pipeline, handlers)
+        for handler in handlers:
+            target_logger.removeHandler(handler)
+        target_logger.addHandler(proxy)
+        pipeline.installed.append((target_logger, handlers, proxy))
+
+    _pipeline = pipeline
+    pipeline.start()
+    # logging 模块的退出处理（关闭文件）先注册，atexit 后注册先执行：先写完队列再关闭文件
+    atexit.register(stop)
+    return pipeline
+
+
+def stop(timeout=5):
+    """写完队列中剩余的记录并把处理器还给原来的日志记录器，之后的日志同步写出"""
+    global _pipeline
+    pipeline, _pipeline = _pipeline, None
+    if pipeline is None:
+        return
+    pipeline.stop(timeout)
+    for target_logger, handlers, proxy in pipeline.installed:
+        target_logger.removeHandler(proxy)
+        for handler in handlers:
+            target_logger.addHandler(handler)
+    pipeline.report_dropped()
+
+
+def stats():
+    """当前进程日志队列的状态，未启用时返回None"""
+    return _pipeline.stats() if _pipeline is not None else None
+
+
+def _after_fork_in_child():
+    if _pipeline is not None:
+        _pipeline.after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,134 @@
+"""
+访问日志分析Django命令
+逐行读取 gunicorn / nginx 访问日志（支持 .gz 归档和标准输入），按URL名称汇总
+请求数、状态码分布、响应字节数和 p50/p95/p99 延迟
+
+使用方法:
+python manage.py accesslog                                   # 分析 LOG_DIR 下的 gunicorn_access.log（含滚动备份和归档）
+python manage.py accesslog /var/log/nginx/access.log*        # 分析 nginx 访问日志
+python manage.py accesslog --sort p99 --top 10               # 按p99延迟排序，只显示前10个路由
+python manage.py accesslog --format json --output report.json
+zcat access.log.*.gz | python manage.py accesslog -          # 从标准输入读取
+"""
+import gzip
+import json
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.core.accesslog import AccessLogReport
+from app.core.logfiles import log_family
+
+# gunicorn.conf.py 中配置的访问日志文件名
+GUNICORN_ACCESS_LOG = 'gunicorn_access.log'
+
+
+def _pad(text, width, align_right=False):
+    """按显示宽度（中文占两列）补齐空格"""
+    display = sum(2 if unicodedata.east_asian_width(char) in 'WF' else 1 for char in text)
+    padding = ' ' * max(0, width - display)
+    return padding + text if align_right else text + padding
+
+
+class Command(BaseCommand):
+    help = '分析访问日志，按路由统计请求数、状态码、字节数和延迟分位数'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            help='访问日志文件（.gz 自动解压，- 表示标准输入），默认为日志目录下的 gunicorn_access.log 及其备份和归档',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['text', 'json'],
+            default='text',
+            help='输出格式 (默认: text)',
+        )
+        parser.add_argument(
+            '--output',
+            help='把结果写入文件而不是标准输出',
+        )
+        parser.add_argument(
+            '--sort',
+            choices=['requests', 'bytes', 'p50', 'p95', 'p99'],
+            default='requests',
+            help='路由的排序方式 (默认: requests)',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=0,
+            help='只输出排序后的前N个路由 (默认: 全部)',
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self.default_paths()
+        if not paths:
+            raise CommandError('没有找到访问日志，请指定日志文件路径')
+
+        report = AccessLogReport()
+        started = time.perf_counter()
+        for path in paths:
+            if path == '-':
+                report.add_file(sys.stdin)
+                continue
+            path = Path(path)
+            if not path.exists():
+                raise CommandError(f'日志文件不存在: {path}')
+            opener = gzip.open if path.suffix == '.gz' else open
+            with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+                report.add_file(f)
+        elapsed = time.perf_counter() - started
+
+        if options['format'] == 'json':
+            output = json.dumps(report.as_dict(options['sort'], options['top']), ensure_ascii=False, indent=2)
+        else:
+            output = self.render_text(report, options['sort'], options['top'], elapsed)
+
+        if options['output']:
+            Path(options['output']).write_text(output + '\n', encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f'结果已写入 {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+    @staticmethod
+    def default_paths():
+        # 与 gunicorn.conf.py 使用同一个目录（LOG_DIR 环境变量）
+        log_dir = Path(getattr(settings, 'LOGS_DIR', Path(settings.BASE_DIR) / 'logs'))
+        return [str(path) for path in log_family(log_dir / GUNICORN_ACCESS_LOG)]
+
+    def render_text(self, report, sort, top, elapsed):
+        routes = report.sorted_routes(sort)
+        if top:
+            routes = routes[:top]
+
+        lines = [
+            f'=== 访问日志统计: {report.lines} 行, 无法识别 {report.skipped} 行, '
+            f'{len(report.routes)} 个路由, 耗时 {elapsed:.2f}s ===',
+            '',
+            ' '.join([_pad('路由', 32), _pad('请求数', 8, True), *(f'{code:>7}' for code in ('2xx', '3xx', '4xx', '5xx')),
+                      _pad('流量MB', 9, True), f'{"p50ms":>8} {"p95ms":>8} {"p99ms":>8}']),
+        ]
+        for name, stats in routes + [('合计', report.total)]:
+            lines.append(self.format_row(name, stats))
+        if not report.total.latency.count and report.total.requests:
+            lines.append('')
+            lines.append('日志中没有请求耗时字段（gunicorn 需在 access_log_format 末尾加 %(D)s）')
+        return '\n'.join(lines)
+
+    @staticmethod
+    def format_row(name, stats):
+        def milliseconds(fraction):
+            value = stats.latency.quantile(fraction)
+            return f'{value * 1000:8.1f}' if value is not None else f'{"-":>8}'
+
+        statuses = ' '.join(f'{stats.statuses.get(code, 0):>7}' for code in ('2xx', '3xx', '4xx', '5xx'))
+        return (
+            f'{_pad(name, 32)} {stats.requests:>8} {statuses} {stats.bytes / (1024 * 1024):>9.2f} '
+            f'{milliseconds(0.50)} {milliseconds(0.95)} {milliseconds(0.99)}'
+        )
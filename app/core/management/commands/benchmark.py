@@ -0,0 +1,429 @@
+"""
+性能基准测试Django命令
+用Django测试客户端在已填充数据的数据库（见 seed_scale 命令）上请求关键页面和接口，
+统计每个场景的延迟分位数、查询次数和内存分配，写入JSON结果并与基线比较，退化时以非零状态退出
+
+场景：
+    post_list（默认排序、各排序方式、搜索）、评论最多的文章详情页、文章/评论点赞、关注/取消关注、
+    稿件管理页、用户管理页。点赞和关注接口每轮成对请求（点赞+取消），数据库状态保持不变。
+
+统计方式：
+    运行期间屏蔽INFO及以下级别的日志，避免日志输出干扰计时。
+    先预热 --warmup 轮，再计时 --iterations 轮；内存分配单独用 tracemalloc 跑 --alloc-iterations 轮
+    （tracemalloc 会显著拖慢执行，不与计时混在一起）。
+    查询次数是确定的，超过基线即视为退化；延迟和内存分配超过基线的比例大于容差时视为退化。
+    任一请求返回非2xx状态码（登录跳转、权限错误、500等）时计时的并不是正常页面，
+    命令写出结果后以非零状态退出，不保存基线也不比较。
+
+响应压缩（--compression）：
+    对各GET场景未经处理的HTML分别测量空白精简、gzip、brotli 的CPU耗时和节省的字节数，
+    结果写入JSON的 compression 部分，仅供参考，不参与基线比较。
+
+使用方法:
+python manage.py benchmark                              # 运行全部场景，与 benchmarks/baseline.json 比较
+python manage.py benchmark --save-baseline              # 把本次结果保存为新的基线
+python manage.py benchmark --only post_list --iterations 50
+python manage.py benchmark --no-compare --output /tmp/result.json
+python manage.py benchmark --compression --only post       # 附带响应精简/压缩的CPU与字节对比
+"""
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from app.blog.models import Comment, Post, UserFollow
+from app.blog.views import get_post_url
+from app.core import compression
+from app.core.querybudget import QueryRecorder
+
+# 基准结果默认目录
+BENCHMARK_DIR = Path(settings.BASE_DIR) / 'benchmarks'
+
+# 延迟差值低于该值（毫秒）时不视为退化，避免极快的请求因计时抖动误报
+MIN_LATENCY_DELTA_MS = 2.0
+
+# 搜索场景使用的关键词（docs 中常见的词）
+SEARCH_TERM = '数据库'
+
+
+class Scenario:
+    """一个基准场景：以某个用户身份依次发送的一组请求"""
+
+    def __init__(self, name, user, requests):
+        self.name = name
+        self.user = user
+        # [(方法, 路径, 数据)]
+        self.requests = requests
+
+
+class Command(BaseCommand):
+    help = '在填充数据的数据库上运行性能基准测试，并与基线比较'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='每个场景计时的轮数 (默认: 20)',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=3,
+            help='每个场景计时前的预热轮数 (默认: 3)',
+        )
+        parser.add_argument(
+            '--alloc-iterations',
+            type=int,
+            default=3,
+            help='每个场景统计内存分配的轮数，0表示不统计 (默认: 3)',
+        )
+        parser.add_argument(
+            '--compression',
+            action='store_true',
+            help='同时测量HTML精简和gzip/brotli压缩的CPU耗时与节省的字节数',
+        )
+        parser.add_argument(
+            '--only',
+            action='append',
+            default=[],
+            help='只运行名称以此开头的场景（可重复指定）',
+        )
+        parser.add_argument(
+            '--output',
+            default=str(BENCHMARK_DIR / 'latest.json'),
+            help='结果JSON文件路径 (默认: benchmarks/latest.json)',
+        )
+        parser.add_argument(
+            '--baseline',
+            default=str(BENCHMARK_DIR / 'baseline.json'),
+            help='基线JSON文件路径 (默认: benchmarks/baseline.json)',
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='把本次结果写入基线文件',
+        )
+        parser.add_argument(
+            '--no-compare',
+            action='store_true',
+            help='不与基线比较',
+        )
+        parser.add_argument(
+            '--latency-tolerance',
+            type=float,
+            default=0.25,
+            help='p50/p95延迟允许超过基线的比例 (默认: 0.25)',
+        )
+        parser.add_argument(
+            '--alloc-tolerance',
+            type=float,
+            default=0.25,
+            help='内存分配峰值允许超过基线的比例 (默认: 0.25)',
+        )
+
+    def handle(self, *args, **options):
+        if not Post.objects.exists():
+            raise CommandError('数据库中没有文章，请先运行 python manage.py seed_scale')
+        if settings.DEBUG:
+            self.stdout.write(self.style.WARNING('DEBUG=True：Django会记录每条查询，结果偏慢，建议使用生产配置运行'))
+
+        scenarios = self.build_scenarios()
+        if options['only']:
+            scenarios = [s for s in scenarios if any(s.name.startswith(prefix) for prefix in options['only'])]
+        if not scenarios:
+            raise CommandError('没有匹配的场景')
+
+        results = {
+            'generated_at': timezone.now().isoformat(),
+            'environment': self.environment(),
+            'iterations': options['iterations'],
+            'scenarios': {},
+        }
+        client = Client(SERVER_NAME=_allowed_host())
+        logging.disable(logging.INFO)
+        try:
+            for scenario in scenarios:
+                stats = self.run_scenario(client, scenario, options)
+                results['scenarios'][scenario.name] = stats
+                self.print_stats(scenario.name, stats)
+            if options['compression']:
+                results['compression'] = self.run_compression(scenarios, options)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        self.write_json(Path(options['output']), results)
+        self.stdout.write(f'结果已写入 {options["output"]}')
+
+        errors = failed_requests(results)
+        if errors:
+            for line in errors:
+                self.stderr.write(self.style.ERROR(f'请求失败: {line}'))
+            raise CommandError(f'{len(errors)} 个场景返回了非2xx响应，结果不可用于比较')
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            self.write_json(baseline_path, results)
+            self.stdout.write(self.style.SUCCESS(f'基线已保存到 {baseline_path}'))
+            return
+        if options['no_compare']:
+            return
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f'基线文件不存在: {baseline_path}（使用 --save-baseline 创建）'))
+            return
+
+        baseline = json.loads(baseline_path.read_text(encoding='utf-8'))
+        regressions = compare_results(
+            baseline, results,
+            latency_tolerance=options['latency_tolerance'],
+            alloc_tolerance=options['alloc_tolerance'],
+        )
+        if regressions:
+            for line in regressions:
+                self.stderr.write(self.style.ERROR(f'退化: {line}'))
+            raise CommandError(f'{len(regressions)} 项指标相对基线退化')
+        self.stdout.write(self.style.SUCCESS('与基线相比没有退化'))
+
+    # ==================== 场景 ====================
+
+    def build_scenarios(self):
+        """从数据库中挑选有代表性的用户和数据，构造各场景的请求"""
+        active_users = User.objects.filter(is_active=True, is_superuser=False, profile__is_banned=False)
+        author = active_users.annotate(total=Count('post')).order_by('-total').first()
+        if author is None:
+            raise CommandError('没有可用的普通用户，请先运行 python manage.py seed_scale')
+        post = (
+            Post.objects.filter(visibility='public')
+            .annotate(total=Count('comments')).order_by('-total').select_related('author', 'category').first()
+        )
+        if post is None:
+            raise CommandError('没有公开文章，请先运行 python manage.py seed_scale')
+        comment = Comment.objects.filter(post=post).first()
+        follow_target = (
+            active_users.exclude(id=author.id)
+            .exclude(id__in=UserFollow.objects.filter(follower=author).values('following'))
+            .first()
+        )
+        admin = User.objects.filter(is_active=True, is_superuser=True).order_by('id').first()
+
+        post_list = reverse('blog:post_list')
+        scenarios = [Scenario('post_list', author, [('get', post_list, None)])]
+        for sort in ('created', 'updated', 'likes'):
+            scenarios.append(Scenario(f'post_list:sort={sort}', author, [('get', post_list, {'sort': sort})]))
+        scenarios.append(Scenario('post_list:search', author, [('get', post_list, {'search': SEARCH_TERM})]))
+        scenarios.append(Scenario('post_detail', author, [('get', get_post_url(post), None)]))
+
+        like_url = reverse('blog:post_like', kwargs={'post_id': post.id})
+        scenarios.append(Scenario('post_like', author, [('post', like_url, None), ('post', like_url, None)]))
+        if comment is not None:
+            comment_like_url = reverse('blog:comment_like', kwargs={'comment_id': comment.id})
+            scenarios.append(Scenario(
+                'comment_like', author, [('post', comment_like_url, None), ('post', comment_like_url, None)]
+            ))
+        if follow_target is not None:
+            scenarios.append(Scenario('follow_user', author, [
+                ('post', reverse('blog:follow_user', kwargs={'user_id': follow_target.id}), None),
+                ('post', reverse('blog:unfollow_user', kwargs={'user_id': follow_target.id}), None),
+            ]))
+
+        scenarios.append(Scenario(
+            'manuscript_management', author, [('get', reverse('accounts:manuscript_management'), None)]
+        ))
+        if admin is not None:
+            scenarios.append(Scenario('admin_users', admin, [('get', reverse('accounts:admin_users'), None)]))
+        else:
+            self.stdout.write(self.style.WARNING('没有超级管理员，跳过 admin_users 场景'))
+        return scenarios
+
+    def run_scenario(self, client, scenario, options):
+        client.force_login(scenario.user)
+        for _ in range(max(0, options['warmup'])):
+            self.send_all(client, scenario)
+
+        latencies, queries, status_codes = [], [], {}
+        for _ in range(max(1, options['iterations'])):
+            for method, path, data in scenario.requests:
+                with QueryRecorder() as recorder:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(path, data or {})
+                    latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(recorder.count)
+                status_codes[str(response.status_code)] = status_codes.get(str(response.status_code), 0) + 1
+
+        alloc_peaks, alloc_net = [], []
+        if options['alloc_iterations'] > 0:
+            tracemalloc.start()
+            try:
+                for _ in range(options['alloc_iterations']):
+                    for method, path, data in scenario.requests:
+                        before, _peak = tracemalloc.get_traced_memory()
+                        tracemalloc.reset_peak()
+                        getattr(client, method)(path, data or {})
+                        after, peak = tracemalloc.get_traced_memory()
+                        alloc_peaks.append((peak - before) / 1024)
+                        alloc_net.append((after - before) / 1024)
+            finally:
+                tracemalloc.stop()
+
+        client.logout()
+        stats = {
+            'requests': len(latencies),
+            'status_codes': status_codes,
+            'latency_ms': summarize(latencies),
+            'queries': {'min': min(queries), 'max': max(queries), 'mean': round(statistics.fmean(queries), 2)},
+        }
+        if alloc_peaks:
+            stats['alloc_peak_kb'] = summarize(alloc_peaks)
+            stats['alloc_net_kb'] = round(statistics.fmean(alloc_net), 1)
+        return stats
+
+    def run_compression(self, scenarios, options):
+        """对GET场景的原始HTML测量精简与压缩的耗时和体积"""
+        repeats = max(1, options['iterations'])
+        methods = [('minify', lambda body: compression.minify_html(body.decode()).encode())]
+        methods.append(('gzip', lambda body: compression.compress(body, 'gzip')))
+        methods.append(('minify+gzip', lambda body: compression.compress(
+            compression.minify_html(body.decode()).encode(), 'gzip')))
+        if compression.brotli_available():
+            methods.append(('minify+br', lambda body: compression.compress(
+                compression.minify_html(body.decode()).encode(), 'br')))
+
+        report = {}
+        self.stdout.write('\n=== 响应精简/压缩 ===')
+        # 新建客户端使中间件按关闭精简和压缩的配置重新加载，拿到原始响应
+        with override_settings(RESPONSE_MINIFY_HTML=False, RESPONSE_COMPRESSION=False):
+            client = Client(SERVER_NAME=_allowed_host())
+            for scenario in scenarios:
+                if len(scenario.requests) != 1 or scenario.requests[0][0] != 'get':
+                    continue
+                _method, path, data = scenario.requests[0]
+                client.force_login(scenario.user)
+                body = client.get(path, data or {}).content
+                entry = {'raw_bytes': len(body)}
+                for name, method in methods:
+                    started = time.process_time()
+                    for _ in range(repeats):
+                        output = method(body)
+                    cpu_ms = (time.process_time() - started) * 1000 / repeats
+                    saved = len(body) - len(output)
+                    entry[name] = {
+                        'bytes': len(output),
+                        'cpu_ms': round(cpu_ms, 3),
+                        # 每毫秒CPU节省的KB数
+                        'saved_kb_per_cpu_ms': round(saved / 1024 / cpu_ms, 1) if cpu_ms else None,
+                    }
+                report[scenario.name] = entry
+                self.stdout.write(f'{scenario.name:<28} 原始={len(body) / 1024:.1f}KB ' + ' '.join(
+                    f'{name}={entry[name]["bytes"] / 1024:.1f}KB/{entry[name]["cpu_ms"]:.2f}ms'
+                    for name, _ in methods
+                ))
+            client.logout()
+        return report
+
+    @staticmethod
+    def send_all(client, scenario):
+        for method, path, data in scenario.requests:
+            getattr(client, method)(path, data or {})
+
+    # ==================== 输出 ====================
+
+    def print_stats(self, name, stats):
+        latency = stats['latency_ms']
+        line = (
+            f'{name:<28} p50={latency["p50"]:8.2f}ms p95={latency["p95"]:8.2f}ms p99={latency["p99"]:8.2f}ms '
+            f'查询={stats["queries"]["max"]:<3}'
+        )
+        if 'alloc_peak_kb' in stats:
+            line += f' 分配峰值={stats["alloc_peak_kb"]["p50"]:.0f}KB'
+        codes = ','.join(f'{code}×{count}' for code, count in sorted(stats['status_codes'].items()))
+        self.stdout.write(f'{line} 状态码={codes}')
+
+    @staticmethod
+    def environment():
+        return {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+            'platform': sys.platform,
+            'rows': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+            },
+        }
+
+    @staticmethod
+    def write_json(path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def _allowed_host():
+    """测试客户端使用的Host：取 ALLOWED_HOSTS 中第一个具体的主机名"""
+    for host in settings.ALLOWED_HOSTS:
+        host = host.lstrip('.')
+        if host and host != '*':
+            return host
+    return 'localhost'
+
+
+def summarize(values):
+    """延迟等样本的分位数汇总"""
+    ordered = sorted(values)
+
+    def percentile(fraction):
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return round(ordered[index], 3)
+
+    return {
+        'p50': percentile(0.50),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+        'mean': round(statistics.fmean(ordered), 3),
+        'max': round(ordered[-1], 3),
+    }
+
+
+def failed_requests(results):
+    """返回有非2xx响应的场景说明列表"""
+    failures = []
+    for name, stats in results['scenarios'].items():
+        codes = {code: count for code, count in stats['status_codes'].items() if not code.startswith('2')}
+        if codes:
+            failures.append(f'{name} 状态码 ' + ','.join(f'{code}×{count}' for code, count in sorted(codes.items())))
+    return failures
+
+
+def compare_results(baseline, current, latency_tolerance=0.25, alloc_tolerance=0.25):
+    """返回相对基线退化的指标说明列表（非2xx响应同样视为退化）"""
+    regressions = failed_requests(current)
+    for name, stats in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        if stats['queries']['max'] > base['queries']['max']:
+            regressions.append(f'{name} 查询次数 {base["queries"]["max"]} -> {stats["queries"]["max"]}')
+        for key in ('p50', 'p95'):
+            old, new = base['latency_ms'][key], stats['latency_ms'][key]
+            if new > old * (1 + latency_tolerance) and new - old > MIN_LATENCY_DELTA_MS:
+                regressions.append(f'{name} 延迟{key} {old:.2f}ms -> {new:.2f}ms (+{(new / old - 1) * 100:.0f}%)')
+        if 'alloc_peak_kb' in stats and 'alloc_peak_kb' in base:
+            old, new = base['alloc_peak_kb']['p50'], stats['alloc_peak_kb']['p50']
+            if old and new > old * (1 + alloc_tolerance):
+                regressions.append(f'{name} 分配峰值 {old:.0f}KB -> {new:.0f}KB (+{(new / old - 1) * 100:.0f}%)')
+    return regressions
@@ -5,16 +5,24 @@
 使用方法:
 python manage.py logmanage --clean        # 清理旧日志
 python manage.py logmanage --archive      # 归档日志
+python manage.py logmanage --archive --workers 4 --compress-level 9  # 4个进程并行，最高压缩率
 python manage.py logmanage --status       # 查看日志状态
 """
 from django.core.management.base import BaseCommand
 from django.conf import settings
 import os
-import gzip
-import shutil
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from app.core.jsonlog import line_level
+from app.core.logfiles import INDEX_SUFFIX, count_lines, gzip_file, tail_lines
+
+# 由 LOGGING 配置写入的日志文件
+LOG_FILES = ['django.log', 'error.log', 'security.log', 'db.log']
+
 
 class Command(BaseCommand):
     help = '管理应用日志文件'
@@ -41,9 +49,24 @@ class Command(BaseCommand):
             default=30,
             help='清理多少天前的日志文件 (默认: 30)',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='归档时并行压缩的进程数 (默认: CPU核数)',
+        )
+        parser.add_argument(
+            '--compress-level',
+            type=int,
+            choices=range(1, 10),
+            default=6,
+            metavar='1-9',
+            help='gzip压缩级别，9压缩率最高但最慢 (默认: 6)',
+        )
 
     def handle(self, *args, **options):
-        log_dir = getattr(settings, 'LOG_DIR', Path(settings.BASE_DIR) / 'logs')
+        # 与 LOGGING 配置使用同一个目录（生产环境由 LOG_DIR 环境变量指定）
+        log_dir = Path(getattr(settings, 'LOGS_DIR', Path(settings.BASE_DIR) / 'logs'))
         
         if not log_dir.exists():
             self.stdout.write(
@@ -56,7 +79,7 @@ class Command(BaseCommand):
         elif options['clean']:
             self.clean_old_logs(log_dir, options['days'])
         elif options['archive']:
-            self.archive_logs(log_dir)
+            self.archive_logs(log_dir, options['workers'], options['compress_level'])
         else:
             self.stdout.write(
                 self.style.WARNING('请指定操作: --clean, --archive 或 --status')
@@ -68,10 +91,9 @@ class Command(BaseCommand):
             self.style.SUCCESS('=== 日志文件状态 ===')
         )
         
-        log_files = ['app.log', 'error.log', 'security.log', 'db.log']
         total_size = 0
         
-        for log_file in log_files:
+        for log_file in LOG_FILES:
             log_path = log_dir / log_file
             if log_path.exists():
                 file_size = log_path.stat().st_size
@@ -81,23 +103,26 @@ class Command(BaseCommand):
                 # 获取文件修改时间
                 mtime = datetime.fromtimestamp(log_path.stat().st_mtime)
                 
+                # 按块读取二进制数据统计行数，不把文件读入内存
+                line_count = count_lines(log_path)
+                
                 self.stdout.write(
-                    f"📁 {log_file}: {file_size_mb:.2f} MB "
+                    f"📁 {log_file}: {file_size_mb:.2f} MB, {line_count} 行 "
                     f"(修改时间: {mtime.strftime('%Y-%m-%d %H:%M:%S')})"
                 )
                 
                 # 统计最近的日志条目
                 try:
-                    with open(log_path, 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-                        recent_lines = lines[-100:] if len(lines) > 100 else lines
-                        error_count = sum(1 for line in recent_lines if 'ERROR' in line)
-                        warning_count = sum(1 for line in recent_lines if 'WARNING' in line)
-                        
-                        if error_count > 0 or warning_count > 0:
-                            self.stdout.write(
-                                f"   最近100条: {error_count} 错误, {warning_count} 警告"
-                            )
+                    recent_lines = tail_lines(log_path, 100)
+                    # 按行首级别（文本格式）或 level 字段（JSON格式）统计
+                    levels = [line_level(line) for line in recent_lines]
+                    error_count = sum(1 for level in levels if level in ('ERROR', 'CRITICAL'))
+                    warning_count = levels.count('WARNING')
+                    
+                    if error_count > 0 or warning_count > 0:
+                        self.stdout.write(
+                            f"   最近100条: {error_count} 错误, {warning_count} 警告"
+                        )
                 except Exception:
                     pass
             else:
@@ -109,7 +134,8 @@ class Command(BaseCommand):
         # 检查归档文件
         archive_files = list(log_dir.glob('*.log.*.gz'))
         if archive_files:
-            self.stdout.write(f"\n归档文件: {len(archive_files)} 个")
+            archive_size_mb = sum(path.stat().st_size for path in archive_files) / (1024 * 1024)
+            self.stdout.write(f"\n归档文件: {len(archive_files)} 个, {archive_size_mb:.2f} MB")
 
     def clean_old_logs(self, log_dir, days):
         """清理旧日志文件"""
@@ -126,6 +152,8 @@ class Command(BaseCommand):
                 file_time = datetime.fromtimestamp(archive_file.stat().st_mtime)
                 if file_time < cutoff_date:
                     archive_file.unlink()
+                    # log_viewer 搜索时生成的时间索引
+                    archive_file.with_name(archive_file.name + INDEX_SUFFIX).unlink(missing_ok=True)
                     cleaned_count += 1
                     self.stdout.write(f"已删除: {archive_file.name}")
             except Exception as e:
@@ -140,47 +168,122 @@ class Command(BaseCommand):
         else:
             self.stdout.write('没有找到需要清理的旧日志文件')
 
-    def archive_logs(self, log_dir):
-        """归档日志文件"""
+    def archive_logs(self, log_dir, workers=1, compresslevel=6):
+        """归档日志文件：7天未修改的日志和滚动备份，多个文件由进程池并行压缩"""
         archive_date = datetime.now() - timedelta(days=7)
-        archived_count = 0
         
         self.stdout.write('归档7天前的日志文件...')
         
-        log_files = ['app.log', 'error.log', 'security.log', 'db.log']
+        jobs = self.collect_archive_jobs(log_dir, archive_date)
+        if not jobs:
+            self.stdout.write('没有找到需要归档的日志文件')
+            return
         
-        for log_file in log_files:
-            log_path = log_dir / log_file
-            if not log_path.exists():
+        workers = max(1, min(workers, len(jobs)))
+        started = time.perf_counter()
+        total_in = total_out = 0
+        archived_count = 0
+        
+        for (source, archive_path, truncate), result in self.run_archive_jobs(jobs, workers, compresslevel):
+            if isinstance(result, Exception):
+                self.stdout.write(
+                    self.style.ERROR(f"归档失败 {source.name}: {result}")
+                )
                 continue
-                
+            
+            original_size, archive_size, seconds = result
             try:
-                file_time = datetime.fromtimestamp(log_path.stat().st_mtime)
-                if file_time < archive_date and log_path.stat().st_size > 0:
-                    # 创建归档文件名
-                    timestamp = file_time.strftime('%Y%m%d_%H%M%S')
-                    archive_name = f"{log_file}.{timestamp}.gz"
-                    archive_path = log_dir / archive_name
-                    
-                    # 压缩文件
-                    with open(log_path, 'rb') as f_in:
-                        with gzip.open(archive_path, 'wb') as f_out:
-                            shutil.copyfileobj(f_in, f_out)
-                    
-                    # 清空原文件
-                    log_path.write_text('')
-                    
-                    archived_count += 1
-                    self.stdout.write(f"已归档: {log_file} -> {archive_name}")
-                    
-            except Exception as e:
+                if truncate:
+                    # 当前日志文件：清空，日志处理器继续写入
+                    source.write_text('')
+                else:
+                    # 滚动备份：归档后删除（连同 log_viewer 生成的时间索引）
+                    source.unlink()
+                    source.with_name(source.name + INDEX_SUFFIX).unlink(missing_ok=True)
+            except OSError as e:
                 self.stdout.write(
-                    self.style.ERROR(f"归档失败 {log_file}: {e}")
+                    self.style.ERROR(f"归档后清理失败 {source.name}: {e}")
                 )
+            
+            total_in += original_size
+            total_out += archive_size
+            archived_count += 1
+            self.stdout.write(
+                f"已归档: {source.name} -> {archive_path.name} "
+                f"({self.format_throughput(original_size, archive_size, seconds)})"
+            )
         
+        elapsed = time.perf_counter() - started
         if archived_count > 0:
             self.stdout.write(
-                self.style.SUCCESS(f'已归档 {archived_count} 个日志文件')
+                self.style.SUCCESS(
+                    f'已归档 {archived_count} 个日志文件 ({workers} 个进程, 耗时 {elapsed:.2f}s, '
+                    f'{self.format_throughput(total_in, total_out, elapsed)})'
+                )
             )
-        else:
-            self.stdout.write('没有找到需要归档的日志文件')
+
+    def collect_archive_jobs(self, log_dir, archive_date):
+        """需要归档的文件：[(源文件, 归档文件, 是否清空而不是删除源文件)]"""
+        jobs = []
+        planned = set()
+        
+        for log_file in LOG_FILES:
+            backup_pattern = re.compile(rf'^{re.escape(log_file)}\.(\d+)$')
+            backups = []
+            for path in log_dir.glob(f'{log_file}.*'):
+                match = backup_pattern.match(path.name)
+                if match:
+                    backups.append((int(match.group(1)), path))
+            # 从旧到新：编号最大的滚动备份最旧，当前文件最新
+            candidates = [(path, False) for _number, path in sorted(backups, reverse=True)]
+            candidates.append((log_dir / log_file, True))
+            
+            for source, truncate in candidates:
+                if not source.exists():
+                    continue
+                stat = source.stat()
+                file_time = datetime.fromtimestamp(stat.st_mtime)
+                if file_time >= archive_date or stat.st_size == 0:
+                    continue
+                
+                # 归档文件名：{日志名}.{修改时间}.gz（log_viewer 按此格式查找归档并按时间排序），
+                # 同一秒内修改的文件依次顺延一秒，保持先后顺序
+                while True:
+                    timestamp = file_time.strftime('%Y%m%d_%H%M%S')
+                    archive_path = log_dir / f"{log_file}.{timestamp}.gz"
+                    if not archive_path.exists() and archive_path not in planned:
+                        break
+                    file_time += timedelta(seconds=1)
+                planned.add(archive_path)
+                jobs.append((source, archive_path, truncate))
+        
+        return jobs
+
+    def run_archive_jobs(self, jobs, workers, compresslevel):
+        """压缩全部文件，按完成顺序产生 (任务, 结果或异常)"""
+        if workers == 1:
+            for job in jobs:
+                try:
+                    yield job, gzip_file(job[0], job[1], compresslevel)
+                except Exception as e:
+                    yield job, e
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(gzip_file, source, archive_path, compresslevel): (source, archive_path, truncate)
+                for source, archive_path, truncate in jobs
+            }
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    yield futures[future], e
+
+    @staticmethod
+    def format_throughput(original_size, archive_size, seconds):
+        original_mb = original_size / (1024 * 1024)
+        ratio = original_size / archive_size if archive_size else 0
+        speed = original_mb / seconds if seconds > 0 else 0
+        return (f"{original_mb:.2f} MB -> {archive_size / (1024 * 1024):.2f} MB, "
+                f"压缩比 {ratio:.1f}, {speed:.1f} MB/s")
@@ -0,0 +1,187 @@
+"""
+运行时指标模块
+按解析后的URL名称（如 blog:post_list）记录请求耗时、数据库查询次数与耗时、
+缓存命中/未命中和响应大小，以及数据库连接池（app.core.backends.mysql_pool）的统计，
+以Prometheus文本格式在 /metrics 输出
+
+多进程汇总：
+    gunicorn 下各worker是独立进程，设置环境变量 PROMETHEUS_MULTIPROC_DIR 后
+    每个worker把指标写入该目录下的内存映射文件，/metrics 读取整个目录汇总，
+    无论请求落到哪个worker都能看到全部进程的数据（gunicorn.conf.py 会自动设置并清理该目录）。
+    未设置该变量时（如 runserver）只统计当前进程。
+"""
+import contextvars
+import os
+import time
+
+from django.db.backends.signals import connection_created
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+    CONTENT_TYPE_LATEST, generate_latest,
+)
+from prometheus_client import multiprocess
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = [
+    'RequestStats', 'begin_request', 'end_request', 'observe_request',
+    'record_cache_access', 'record_pool_event', 'set_pool_connections',
+    'render_metrics', 'CONTENT_TYPE_LATEST',
+]
+
+# 未匹配任何URL的请求（404等）统一归为一个标签，避免标签数量无限增长
+UNRESOLVED_VIEW = '<unresolved>'
+
+# 请求方法标签只取标准方法，客户端发送的其他方法统一归为 other
+KNOWN_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+OTHER_METHOD = 'other'
+
+REQUEST_LATENCY = Histogram(
+    'meowsite_http_request_duration_seconds',
+    '请求处理耗时（秒）',
+    ['view', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter(
+    'meowsite_http_requests_total',
+    '请求总数',
+    ['view', 'method', 'status'],
+)
+RESPONSE_SIZE = Histogram(
+    'meowsite_http_response_size_bytes',
+    '响应体大小（字节，不含流式响应）',
+    ['view'],
+    buckets=(512, 2048, 8192, 32768, 131072, 524288, 2097152),
+)
+DB_QUERIES = Histogram(
+    'meowsite_db_queries_per_request',
+    '每个请求执行的数据库查询次数',
+    ['view'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+DB_QUERY_TIME = Counter(
+    'meowsite_db_query_seconds_total',
+    '数据库查询累计耗时（秒）',
+    ['view'],
+)
+CACHE_HITS = Counter(
+    'meowsite_cache_hits_total',
+    '缓存命中次数',
+    ['view'],
+)
+CACHE_MISSES = Counter(
+    'meowsite_cache_misses_total',
+    '缓存未命中次数',
+    ['view'],
+)
+DB_POOL_EVENTS = Counter(
+    'meowsite_db_pool_events_total',
+    '数据库连接池事件次数（opens/reuses/waits/timeouts/discards）',
+    ['alias', 'event'],
+)
+# 多进程模式下只汇总存活worker的连接数
+DB_POOL_CONNECTIONS = Gauge(
+    'meowsite_db_pool_connections',
+    '数据库连接池当前的连接数（idle 空闲 / in_use 借出）',
+    ['alias', 'state'],
+    multiprocess_mode='livesum',
+)
+
+
+class RequestStats:
+    """单个请求内累计的查询与缓存统计"""
+
+    __slots__ = ('started', 'queries', 'query_seconds', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+# 当前请求的统计对象；contextvar 会随 sync_to_async 传递，异步视图中的查询同样计入
+_current_stats = contextvars.ContextVar('meowsite_request_stats', default=None)
+
+
+def begin_request():
+    """开始统计一个请求，返回其统计对象"""
+    stats = RequestStats()
+    _current_stats.set(stats)
+    return stats
+
+
+def end_request():
+    """结束当前请求的统计，之后的查询不再计入"""
+    _current_stats.set(None)
+
+
+def record_cache_access(hits=0, misses=0):
+    """由缓存后端（app.core.cache 的 TieredCache、MeteredCache）调用，记录当前请求的缓存命中情况"""
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def record_pool_event(alias, event):
+    """由数据库连接池调用，记录一次连接池事件"""
+    DB_POOL_EVENTS.labels(alias, event).inc()
+
+
+def set_pool_connections(alias, idle, in_use):
+    """由数据库连接池调用，更新本进程连接池的当前连接数"""
+    DB_POOL_CONNECTIONS.labels(alias, 'idle').set(idle)
+    DB_POOL_CONNECTIONS.labels(alias, 'in_use').set(in_use)
+
+
+def _count_query(execute, sql, params, many, context):
+    """数据库执行包装器：累计当前请求的查询次数和耗时"""
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - started
+
+
+def _install_query_counter(sender, connection, **kwargs):
+    """每个数据库连接建立时挂上计数包装器（持久连接重连时不重复挂载）"""
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+connection_created.connect(_install_query_counter, dispatch_uid='meowsite_metrics_query_counter')
+
+
+def observe_request(request, response, stats):
+    """把一个请求的统计写入各项指标"""
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match and match.view_name else UNRESOLVED_VIEW
+
+    method = request.method if request.method in KNOWN_METHODS else OTHER_METHOD
+
+    REQUEST_LATENCY.labels(view, method).observe(time.perf_counter() - stats.started)
+    REQUESTS.labels(view, method, str(response.status_code)).inc()
+    if not response.streaming:
+        RESPONSE_SIZE.labels(view).observe(len(response.content))
+    DB_QUERIES.labels(view).observe(stats.queries)
+    if stats.query_seconds:
+        DB_QUERY_TIME.labels(view).inc(stats.query_seconds)
+    if stats.cache_hits:
+        CACHE_HITS.labels(view).inc(stats.cache_hits)
+    if stats.cache_misses:
+        CACHE_MISSES.labels(view).inc(stats.cache_misses)
+
+
+def render_metrics():
+    """生成Prometheus文本格式的指标；多进程模式下汇总目录中所有进程的数据"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
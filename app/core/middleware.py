@@ -0,0 +1,272 @@
+# 标准库导入
+import random
+from pathlib import Path
+
+# 第三方库导入
+from asgiref.sync import iscoroutinefunction
+
+# Django 核心导入
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+# 本地应用导入
+from . import compression, jsonlog, metrics, profiling, querybudget, querylog
+from .db_router import PIN_COOKIE_NAME, replica_available
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """
+    运行时指标中间件
+    记录每个请求的耗时、数据库查询次数与耗时、缓存命中和响应大小，按URL名称汇总；
+    应放在 MIDDLEWARE 首位，使耗时覆盖其余中间件
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        request._metrics_stats = metrics.begin_request()
+
+    def process_response(self, request, response):
+        stats = getattr(request, '_metrics_stats', None)
+        if stats is not None:
+            metrics.end_request()
+            metrics.observe_request(request, response, stats)
+        return response
+
+
+class RequestContextMiddleware(MiddlewareMixin):
+    """
+    请求日志上下文中间件（LOG_FORMAT=json 时启用）
+    为每个请求生成请求ID（或沿用nginx传入的 X-Request-ID）并在响应头中返回，
+    请求内产生的日志记录据此带上请求ID、用户ID、视图名称、耗时和查询次数；
+    应放在 MetricsMiddleware 之后，查询次数取自其请求统计
+    """
+
+    def __init__(self, get_response):
+        if settings.LOG_FORMAT != 'json':
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        request.request_id = jsonlog.new_request_id(request.headers.get('X-Request-ID'))
+        jsonlog.begin_request(request.request_id, request, getattr(request, '_metrics_stats', None))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        jsonlog.set_view(match.view_name if match and match.view_name else view_func.__qualname__)
+
+    def process_response(self, request, response):
+        request_id = getattr(request, 'request_id', None)
+        if request_id is not None:
+            response.headers['X-Request-ID'] = request_id
+            jsonlog.end_request()
+        return response
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    响应精简与压缩中间件
+    HTML去掉模板缩进等多余空白，文本类响应按 Accept-Encoding 使用 brotli 或 gzip 压缩；
+    支持（同步和异步的）流式响应，已设置 Content-Encoding 的响应原样返回。
+    放在 MetricsMiddleware 之后，指标中的响应大小即实际传输的字节数
+    """
+
+    COMPRESSIBLE_TYPES = (
+        'text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+    )
+
+    def __init__(self, get_response):
+        self.minify = settings.RESPONSE_MINIFY_HTML
+        self.compress = settings.RESPONSE_COMPRESSION
+        if not self.minify and not self.compress:
+            raise MiddlewareNotUsed
+        self.allow_brotli = settings.RESPONSE_COMPRESSION_BROTLI
+        self.min_size = settings.RESPONSE_COMPRESSION_MIN_SIZE
+        super().__init__(get_response)
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(self.COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        encoding = None
+        if self.compress:
+            patch_vary_headers(response, ('Accept-Encoding',))
+            encoding = compression.choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.allow_brotli)
+        minify = self.minify and content_type == 'text/html'
+        if encoding is None and not minify:
+            return response
+
+        charset = response.charset
+        if response.streaming:
+            minifier = compression.HtmlMinifier() if minify else None
+            stream = compression.acompress_stream if response.is_async else compression.compress_stream
+            response.streaming_content = stream(response.streaming_content, encoding, minifier, charset)
+            # 压缩/精简后的长度要到输出完才知道
+            del response.headers['Content-Length']
+        else:
+            content = response.content
+            if minify:
+                content = compression.minify_html(content.decode(charset)).encode(charset)
+            if encoding is not None:
+                compressed = compression.compress(content, encoding)
+                # 压缩后反而更大时只保留精简结果
+                if len(compressed) < len(content):
+                    content = compressed
+                else:
+                    encoding = None
+            if len(content) == len(response.content) and encoding is None:
+                return response
+            response.content = content
+            response.headers['Content-Length'] = str(len(content))
+
+        # 内容改变后强ETag不再成立，改为弱ETag（同 Django GZipMiddleware）
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    """
+    请求性能分析中间件
+    超级用户的请求带 X-Profile 头或 _profile 查询参数时（以及按 PROFILING_SAMPLE_RATE 随机抽样的请求），
+    用 cProfile 或栈采样器分析该请求，结果写入 PROFILING_DIR，文件名在 X-Profile-File 响应头中返回
+    （抽样的请求只写日志，不向普通用户返回文件名）；
+    应放在 AuthenticationMiddleware 之后，只在请求带有分析标记时才读取用户。
+    异步视图不在分析器所在的线程中执行，跳过分析
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.default_mode = settings.PROFILING_MODE
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.directory = Path(settings.PROFILING_DIR)
+        self.keep = settings.PROFILING_MAX_FILES
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        mode = profiling.requested_mode(request, self.default_mode)
+        if mode is not None and request.user.is_superuser:
+            request._profile_session = profiling.start(mode)
+        elif self.sample_rate and random.randrange(self.sample_rate) == 0:
+            request._profile_session = profiling.start(self.default_mode, sampled=True)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        session = getattr(request, '_profile_session', None)
+        if session is None or not iscoroutinefunction(view_func):
+            return None
+        # ASGI下本中间件在同步线程中执行，异步视图在事件循环线程中执行，分析结果不包含视图本身
+        request._profile_session = None
+        session.cancel()
+        match = request.resolver_match
+        profiling.logger.info(
+            f'跳过性能分析: {match.view_name if match else request.path} 是异步视图，不在分析器所在的线程中执行'
+        )
+        return None
+
+    def process_response(self, request, response):
+        session = getattr(request, '_profile_session', None)
+        if session is None:
+            return response
+        request._profile_session = None
+
+        match = request.resolver_match
+        label = match.view_name if match and match.view_name else request.path
+        try:
+            name = session.finish(self.directory, label)
+        except Exception:
+            profiling.logger.warning('写出性能分析结果失败', exc_info=True)
+            return response
+        profiling.prune(self.directory, self.keep)
+        if not session.sampled:
+            response.headers[profiling.PROFILE_FILE_HEADER] = name
+        return response
+
+
+class QueryBudgetMiddleware(MiddlewareMixin):
+    """
+    开发环境查询预算中间件
+    超出视图预算时记录警告（或抛出异常），并报告重复执行的查询及调用栈
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        querybudget.track_templates()
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        recorder = querybudget.QueryRecorder(capture_stacks=settings.QUERY_BUDGET_STACKS)
+        recorder.__enter__()
+        request._query_recorder = recorder
+
+    def process_response(self, request, response):
+        recorder = getattr(request, '_query_recorder', None)
+        if recorder is None:
+            return response
+        recorder.__exit__(None, None, None)
+
+        match = request.resolver_match
+        if match is None:
+            return response
+        max_queries, template_queries = querybudget.get_budget(match.func)
+        violations = querybudget.check_budget(recorder, max_queries, template_queries)
+        duplicates = recorder.duplicates(settings.QUERY_BUDGET_DUPLICATE_THRESHOLD)
+        if not violations and not duplicates:
+            return response
+
+        message = f'{match.view_name} ({request.path}) ' + '；'.join(violations or ['存在重复查询'])
+        report = recorder.report(settings.QUERY_BUDGET_DUPLICATE_THRESHOLD)
+        if violations and settings.QUERY_BUDGET_RAISE:
+            raise querybudget.QueryBudgetExceeded(f'{message}\n{report}')
+        querybudget.logger.warning(f'查询预算: {message}\n{report}')
+        return response
+
+
+class QueryLogMiddleware(MiddlewareMixin):
+    """记录当前请求的视图名称，慢查询日志据此标注查询来自哪个视图"""
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        querylog.set_current_view(match.view_name if match and match.view_name else view_func.__qualname__)
+
+    def process_response(self, request, response):
+        querylog.set_current_view(None)
+        return response
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """
+    读写一致性中间件
+    用户发起写请求（非GET/HEAD/OPTIONS）后设置短期Cookie，
+    在 REPLICA_PIN_SECONDS 秒内该用户的只读视图固定读主库
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def process_response(self, request, response):
+        if request.method in self.SAFE_METHODS or not replica_available():
+            return response
+
+        response.set_cookie(
+            PIN_COOKIE_NAME,
+            '1',
+            max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10),
+            httponly=True,
+            samesite='Lax',
+            secure=settings.SESSION_COOKIE_SECURE,
+        )
+        return response
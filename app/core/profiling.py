@@ -0,0 +1,193 @@
+"""
+请求性能分析模块
+由 app.core.middleware.ProfilingMiddleware 在单个请求期间运行 cProfile 或栈采样器，
+结果写入日志目录下的 profiles 子目录
+
+触发方式：
+    超级用户的请求带 X-Profile 请求头或 _profile 查询参数（值为 1、cprofile 或 sample），
+    或按 PROFILING_SAMPLE_RATE 随机抽样（每N个请求一个）。未触发的请求只多一次字典查找（和一次随机数）。
+
+两种分析方式：
+    cprofile  记录全部函数调用，写出 .prof 文件（pstats 格式，可用 snakeviz 或 python -m pstats 查看），
+              开销较大，耗时会被放大
+    sample    后台线程每隔 SAMPLE_INTERVAL 秒采集一次请求线程的调用栈，写出 .folded 文件
+              （collapsed stack 格式，每行“帧;帧;帧 次数”，可用 flamegraph.pl 或 speedscope 生成火焰图），
+              开销小，耗时基本不变
+
+每个进程同一时间只分析一个请求（Python 3.12 起 cProfile 基于 sys.monitoring，不能同时运行多个），
+正在分析时触发的其他请求照常处理、不做分析。
+
+ASGI：
+    分析器绑定在开始分析的线程上。ASGI下同步中间件和同步视图在同一个线程中执行，照常分析；
+    异步视图在事件循环线程中执行，分析器只能看到中间件所在的线程，这类请求跳过分析并记录日志。
+"""
+import cProfile
+import logging
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+# 获取日志记录器
+logger = logging.getLogger('core')
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = [
+    'PROFILE_HEADER', 'PROFILE_QUERY_PARAM', 'PROFILE_FILE_HEADER', 'MODES',
+    'requested_mode', 'StackSampler', 'ProfileSession', 'start', 'prune',
+]
+
+# 触发分析的请求头与查询参数、返回文件名的响应头
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_PARAM = '_profile'
+PROFILE_FILE_HEADER = 'X-Profile-File'
+# 直接读取 META，未触发的请求不必构造 request.headers
+_HEADER_META_KEY = 'HTTP_' + PROFILE_HEADER.upper().replace('-', '_')
+
+MODES = ('cprofile', 'sample')
+
+# 栈采样间隔（秒）：采样线程需要取得GIL，实际间隔不小于解释器的线程切换间隔（默认5毫秒）
+SAMPLE_INTERVAL = 0.005
+
+# 每个进程同一时间只分析一个请求
+_busy = threading.Lock()
+
+_UNSAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def requested_mode(request, default_mode):
+    """请求头或查询参数指定的分析方式，未要求分析时返回None（不检查用户权限）"""
+    value = request.META.get(_HEADER_META_KEY) or request.GET.get(PROFILE_QUERY_PARAM)
+    if not value:
+        return None
+    value = value.strip().lower()
+    if value in MODES:
+        return value
+    if value in ('1', 'true', 'yes'):
+        return default_mode
+    return None
+
+
+class StackSampler:
+    """在后台线程中定时采集指定线程的调用栈，按完整调用栈计数"""
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            # 采样线程自身的栈不会出现在结果中：只采集请求线程
+            self.stacks[';'.join(reversed(frames))] += 1
+            self.samples += 1
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class ProfileSession:
+    """一次请求的分析"""
+
+    def __init__(self, mode, sampled=False):
+        self.mode = mode
+        # 随机抽样触发（而不是超级用户主动要求）
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        if mode == 'sample':
+            self._sampler = StackSampler()
+            self._sampler.start()
+            self._profiler = None
+        else:
+            self._sampler = None
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def cancel(self):
+        """停止分析，不写出结果"""
+        try:
+            if self._profiler is not None:
+                self._profiler.disable()
+            else:
+                self._sampler.stop()
+        finally:
+            _busy.release()
+
+    def finish(self, directory, label):
+        """停止分析并写出结果文件，返回文件名"""
+        try:
+            if self._profiler is not None:
+                self._profiler.disable()
+            else:
+                self._sampler.stop()
+            elapsed_ms = (time.perf_counter() - self.started) * 1000
+
+            directory = Path(directory)
+            directory.mkdir(parents=True, exist_ok=True)
+            suffix = '.prof' if self._profiler is not None else '.folded'
+            name = (f'{time.strftime("%Y%m%d_%H%M%S")}_{_UNSAFE_NAME.sub("_", label)[:80]}_'
+                    f'{os.getpid()}_{secrets.token_hex(3)}{suffix}')
+            if self._profiler is not None:
+                self._profiler.dump_stats(directory / name)
+            else:
+                self._sampler.dump(directory / name)
+        finally:
+            _busy.release()
+
+        logger.info(f'性能分析: {label} {elapsed_ms:.1f}ms ({self.mode}'
+                    f'{", 抽样" if self.sampled else ""}) -> {directory / name}')
+        return name
+
+
+def start(mode, sampled=False):
+    """开始分析当前线程的请求；本进程已有请求正在分析时返回None"""
+    if not _busy.acquire(blocking=False):
+        return None
+    try:
+        return ProfileSession(mode, sampled)
+    except Exception:
+        # 如其他分析工具已占用 sys.monitoring
+        _busy.release()
+        logger.warning('无法开始性能分析', exc_info=True)
+        return None
+
+
+def prune(directory, keep):
+    """只保留最新的 keep 个分析结果文件"""
+    try:
+        files = sorted(
+            (entry for entry in os.scandir(directory) if entry.name.endswith(('.prof', '.folded'))),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+    except OSError:
+        return
+    for entry in files[:max(0, len(files) - keep)]:
+        try:
+            os.unlink(entry.path)
+        except OSError:
+            pass
@@ -0,0 +1,251 @@
+"""
+查询预算模块
+为视图声明最多允许执行的数据库查询次数，在开发环境和测试中检查，防止N+1查询回归
+
+用法：
+    @query_budget(8, template_queries=2)   # 整个请求最多8条查询，任一模板渲染期间最多2条
+    def post_list(request): ...
+
+    开发环境（QUERY_BUDGET_ENABLED）由 app.core.middleware.QueryBudgetMiddleware 统计每个请求的查询，
+    超出预算时记录警告（QUERY_BUDGET_RAISE=True 时抛出 QueryBudgetExceeded），
+    并报告重复执行的SQL指纹及其调用栈。未声明预算的视图使用 QUERY_BUDGET_DEFAULT。
+
+    测试中使用 QueryBudgetTestMixin.assertQueryBudget / assertViewQueryBudget。
+
+统计范围：
+    预算覆盖整个请求（含会话、用户等中间件查询）。模板查询按渲染栈归属，
+    父模板的计数包含 extends/include 的子模板中执行的查询。
+"""
+import contextvars
+import logging
+import traceback
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.base import Template
+from django.urls import resolve
+
+from .querylog import fingerprint
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = [
+    'QueryBudgetExceeded', 'QueryRecorder', 'query_budget', 'get_budget', 'check_budget',
+    'track_templates', 'QueryBudgetTestMixin',
+]
+
+# 获取日志记录器
+logger = logging.getLogger('core')
+
+# 调用栈中只保留项目自身的代码帧
+_PROJECT_ROOT = str(Path(settings.BASE_DIR).resolve())
+
+# 当前生效的记录器（可嵌套，例如中间件与测试同时统计）与正在渲染的模板栈
+_active_recorders = contextvars.ContextVar('meowsite_query_recorders', default=())
+_template_stack = contextvars.ContextVar('meowsite_template_stack', default=())
+
+
+class QueryBudgetExceeded(Exception):
+    """查询次数超出预算"""
+
+
+# ==================== 查询记录 ====================
+
+class RecordedQuery:
+    """一条被记录的查询"""
+
+    __slots__ = ('sql', 'templates', 'stack')
+
+    def __init__(self, sql, templates, stack):
+        self.sql = sql
+        self.templates = templates
+        self.stack = stack
+
+
+class QueryRecorder:
+    """
+    记录一段代码执行的全部查询（上下文管理器）
+    capture_stacks=True 时为每条查询保存项目代码的调用栈，用于定位重复查询
+    """
+
+    def __init__(self, capture_stacks=False):
+        self.capture_stacks = capture_stacks
+        self.queries = []
+        self._token = None
+
+    def __enter__(self):
+        _install_on_open_connections()
+        self._token = _active_recorders.set(_active_recorders.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active_recorders.reset(self._token)
+        self._token = None
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def template_counts(self):
+        """各模板渲染期间执行的查询次数（含其子模板）"""
+        counts = {}
+        for query in self.queries:
+            for name in set(query.templates):
+                counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def duplicates(self, threshold=2):
+        """执行次数不少于 threshold 的SQL指纹：[(次数, 归一化SQL, 首次执行的调用栈)]"""
+        groups = {}
+        for query in self.queries:
+            digest, normalized = fingerprint(query.sql)
+            entry = groups.setdefault(digest, [0, normalized, query.stack])
+            entry[0] += 1
+        found = [tuple(entry) for entry in groups.values() if entry[0] >= threshold]
+        found.sort(key=lambda item: item[0], reverse=True)
+        return found
+
+    def report(self, threshold=2):
+        """生成包含重复查询和调用栈的文本报告"""
+        lines = [f'共执行 {self.count} 条查询']
+        template_counts = self.template_counts()
+        if template_counts:
+            lines.append('模板查询: ' + ', '.join(
+                f'{name}={count}' for name, count in sorted(template_counts.items(), key=lambda item: -item[1])
+            ))
+        for count, normalized, stack in self.duplicates(threshold):
+            lines.append(f'重复 {count} 次: {normalized}')
+            if stack:
+                lines.extend('    ' + line.rstrip() for line in traceback.format_list(stack))
+        return '\n'.join(lines)
+
+
+def _project_stack():
+    """当前调用栈中属于项目代码的帧（排除本模块和第三方库）"""
+    frames = traceback.extract_stack()[:-3]
+    return [
+        frame for frame in frames
+        if frame.filename.startswith(_PROJECT_ROOT)
+        and 'site-packages' not in frame.filename
+        and not frame.filename.endswith('querybudget.py')
+    ]
+
+
+def _record_query(execute, sql, params, many, context):
+    """数据库执行包装器：把查询交给当前生效的记录器"""
+    recorders = _active_recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stack = _project_stack() if any(recorder.capture_stacks for recorder in recorders) else None
+        query = RecordedQuery(sql, _template_stack.get(), stack)
+        for recorder in recorders:
+            recorder.queries.append(query)
+
+
+def _install_query_recorder(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _install_on_open_connections():
+    """给已经建立的连接补挂包装器（例如测试数据库在导入本模块前已连接）"""
+    for connection in connections.all(initialized_only=True):
+        _install_query_recorder(None, connection)
+
+
+connection_created.connect(_install_query_recorder, dispatch_uid='meowsite_query_budget_recorder')
+
+
+# ==================== 模板归属 ====================
+
+_template_tracking_installed = False
+
+
+def track_templates():
+    """包装模板渲染，记录查询发生时正在渲染的模板（只需调用一次）"""
+    global _template_tracking_installed
+    if _template_tracking_installed:
+        return
+    original_render = Template._render
+
+    def _render(self, context):
+        token = _template_stack.set(_template_stack.get() + (self.origin.template_name or self.name or '<string>',))
+        try:
+            return original_render(self, context)
+        finally:
+            _template_stack.reset(token)
+
+    Template._render = _render
+    _template_tracking_installed = True
+
+
+# ==================== 预算声明与检查 ====================
+
+def query_budget(max_queries, template_queries=None):
+    """
+    为视图声明查询预算
+    max_queries: 整个请求最多执行的查询数
+    template_queries: 任一模板渲染期间最多执行的查询数（None 表示不限制）
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        view_func.template_query_budget = template_queries
+        return view_func
+    return decorator
+
+
+def get_budget(view_func):
+    """读取视图的预算，未声明时使用 QUERY_BUDGET_DEFAULT"""
+    return (
+        getattr(view_func, 'query_budget', settings.QUERY_BUDGET_DEFAULT),
+        getattr(view_func, 'template_query_budget', None),
+    )
+
+
+def check_budget(recorder, max_queries, template_queries=None):
+    """返回超出预算的说明列表，未超出时为空"""
+    violations = []
+    if max_queries is not None and recorder.count > max_queries:
+        violations.append(f'查询 {recorder.count} 条，超出预算 {max_queries} 条')
+    if template_queries is not None:
+        for name, count in recorder.template_counts().items():
+            if count > template_queries:
+                violations.append(f'模板 {name} 渲染期间查询 {count} 条，超出预算 {template_queries} 条')
+    return violations
+
+
+# ==================== 测试辅助 ====================
+
+class QueryBudgetTestMixin:
+    """TestCase 混入类，提供查询预算断言"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        track_templates()
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, template_queries=None):
+        """断言代码块内的查询数不超过预算，失败时输出重复查询和调用栈"""
+        with QueryRecorder(capture_stacks=True) as recorder:
+            yield recorder
+        violations = check_budget(recorder, max_queries, template_queries)
+        if violations:
+            self.fail('；'.join(violations) + '\n' + recorder.report())
+
+    def assertViewQueryBudget(self, path, method='get', data=None, status_codes=(200, 302)):
+        """请求 path，并按其视图声明的预算断言查询数，返回响应"""
+        max_queries, template_queries = get_budget(resolve(urlsplit(path).path).func)
+        with self.assertQueryBudget(max_queries, template_queries):
+            response = getattr(self.client, method)(path, data or {})
+        self.assertIn(response.status_code, status_codes, f'{method.upper()} {path} 返回 {response.status_code}')
+        return response
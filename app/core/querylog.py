@@ -0,0 +1,307 @@
+"""
+慢查询日志模块
+挂接在 django.db.backends 日志记录器上的处理器：把SQL归一化为指纹（去掉字面量），
+按指纹汇总执行次数、p50/p95/最大耗时和调用视图，并把超过阈值的查询写入滚动的 db.log
+（写入的都是归一化后的SQL，查询参数不落盘）
+
+日志来源：
+    DEBUG 模式下Django自身会为每条查询输出 django.db.backends 日志（级别DEBUG），由处理器汇总；
+    非DEBUG模式（生产环境）Django不记录查询，由本模块的执行包装器计时，在请求线程中直接计入指纹汇总，
+    只有耗时不低于 SLOW_QUERY_THRESHOLD_MS 的查询才生成一条WARNING日志记录，
+    普通查询不产生日志记录，也不占用日志队列。
+    生产环境 django.db.backends 的日志级别为WARNING，调高到 ERROR 即可关闭采集。
+
+汇总输出：
+    每隔 summary_interval 秒以及进程退出时，把本进程窗口内耗时最多的指纹写入 db.log
+"""
+import contextvars
+import hashlib
+import logging
+import logging.handlers
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = [
+    'fingerprint', 'FingerprintStats', 'SlowQueryHandler',
+    'query_stats', 'current_view', 'set_current_view',
+]
+
+logger = logging.getLogger('django.db.backends')
+
+# 当前请求的视图名称，由 QueryLogMiddleware 设置，用于标注查询的调用方
+current_view = contextvars.ContextVar('meowsite_current_view', default=None)
+
+# 非请求上下文（管理命令、定时任务等）中的查询
+NO_VIEW = '<none>'
+
+# ==================== SQL指纹 ====================
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w."`])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*\?\s*,?)+\)', re.IGNORECASE)
+_VALUES_LIST = re.compile(r'\bVALUES\s*(?:\((?:\s*\?\s*,?)+\)\s*,?\s*)+', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    归一化SQL：字符串和数字字面量、参数占位符替换为 ?，IN列表与批量VALUES折叠，
+    空白合并。返回 (指纹哈希, 归一化后的SQL)
+    """
+    normalized = _STRING_LITERAL.sub('?', sql)
+    normalized = _NUMBER_LITERAL.sub('?', normalized)
+    normalized = _PLACEHOLDER.sub('?', normalized)
+    normalized = _IN_LIST.sub('IN (...)', normalized)
+    normalized = _VALUES_LIST.sub('VALUES (...) ', normalized)
+    normalized = _WHITESPACE.sub(' ', normalized).strip()
+    digest = hashlib.md5(normalized.encode('utf-8')).hexdigest()[:12]
+    return digest, normalized
+
+
+# ==================== 指纹汇总 ====================
+
+class FingerprintStats:
+    """
+    按指纹汇总查询耗时（线程安全）
+    每个指纹最多保留 max_samples 个耗时样本（水塘抽样），用于估算分位数；
+    指纹数量超过 max_fingerprints 后新的指纹归入 <other>，内存占用有上限
+    """
+
+    OTHER = '<other>'
+
+    def __init__(self, max_fingerprints=500, max_samples=1000):
+        self.max_fingerprints = max_fingerprints
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def record(self, digest, normalized, duration, view):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    digest, normalized = self.OTHER, self.OTHER
+                    entry = self._entries.get(digest)
+                if entry is None:
+                    entry = self._entries[digest] = {
+                        'sql': normalized, 'count': 0, 'total': 0.0,
+                        'max': 0.0, 'samples': [], 'views': {},
+                    }
+            entry['count'] += 1
+            entry['total'] += duration
+            entry['max'] = max(entry['max'], duration)
+            samples = entry['samples']
+            if len(samples) < self.max_samples:
+                samples.append(duration)
+            else:
+                slot = random.randrange(entry['count'])
+                if slot < self.max_samples:
+                    samples[slot] = duration
+            entry['views'][view] = entry['views'].get(view, 0) + 1
+
+    def snapshot(self, reset=False):
+        """返回按总耗时降序排列的汇总列表，reset=True 时清空已汇总的数据"""
+        with self._lock:
+            entries = self._entries
+            if reset:
+                self._entries = {}
+            else:
+                entries = {key: dict(value, samples=list(value['samples']), views=dict(value['views']))
+                           for key, value in entries.items()}
+
+        summary = []
+        for digest, entry in entries.items():
+            samples = sorted(entry['samples'])
+            summary.append({
+                'fingerprint': digest,
+                'sql': entry['sql'],
+                'count': entry['count'],
+                'total': entry['total'],
+                'p50': _percentile(samples, 0.50),
+                'p95': _percentile(samples, 0.95),
+                'max': entry['max'],
+                'views': sorted(entry['views'].items(), key=lambda item: item[1], reverse=True),
+            })
+        summary.sort(key=lambda item: item['total'], reverse=True)
+        return summary
+
+
+def _percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+# 进程内的全局汇总
+query_stats = FingerprintStats()
+
+
+# ==================== 日志处理器 ====================
+
+class SlowQueryHandler(logging.handlers.RotatingFileHandler):
+    """
+    django.db.backends 日志处理器
+    所有带耗时的查询记录都计入指纹汇总；耗时不低于 threshold_ms 的查询以WARNING级别写入文件，
+    并定期写入汇总（summary_top 个总耗时最多的指纹）
+    """
+
+    def __init__(self, filename, threshold_ms=200, summary_interval=300, summary_top=20, **kwargs):
+        kwargs.setdefault('encoding', 'utf-8')
+        super().__init__(filename, **kwargs)
+        self.threshold = threshold_ms / 1000
+        self.summary_interval = summary_interval
+        self.summary_top = summary_top
+        self._last_summary = time.monotonic()
+
+    def emit(self, record):
+        if getattr(record, 'summary_due', False):
+            # 执行包装器按 summary_interval 发出的汇总请求
+            self.write_summary()
+            return
+
+        duration = getattr(record, 'duration', None)
+        sql = getattr(record, 'sql', None)
+        if duration is None or not sql:
+            return
+
+        try:
+            view = getattr(record, 'view', None) or current_view.get() or NO_VIEW
+            if getattr(record, 'fingerprint', None):
+                # 执行包装器已计入汇总，SQL中的参数为占位符
+                digest, normalized = _cached_fingerprint(sql)
+            else:
+                # DEBUG模式下Django记录的是代入参数后的SQL
+                digest, normalized = fingerprint(sql)
+                query_stats.record(digest, normalized, duration, view)
+
+            if duration >= self.threshold:
+                # 只写归一化后的SQL，参数（可能含密码哈希、邮箱等）不进入日志文件
+                self._write(
+                    record,
+                    f'慢查询 {duration * 1000:.1f}ms 视图={view} 数据库={getattr(record, "alias", "default")} '
+                    f'指纹={digest} SQL: {normalized}',
+                )
+
+            if self.summary_interval and time.monotonic() - self._last_summary >= self.summary_interval:
+                self.write_summary()
+        except Exception:
+            self.handleError(record)
+
+    def _write(self, source, message, level=logging.WARNING):
+        """以指定级别写入一条新记录，保留原记录的时间、进程等信息（不带原始SQL和参数）"""
+        record = logging.makeLogRecord(
+            {key: value for key, value in source.__dict__.items() if key not in ('sql', 'params')}
+        )
+        record.msg = message
+        record.args = None
+        record.levelno = level
+        record.levelname = logging.getLevelName(level)
+        super().emit(record)
+
+    def write_summary(self):
+        """把当前窗口的指纹汇总写入文件并开始新的窗口"""
+        with self.lock:
+            self._last_summary = time.monotonic()
+            summary = query_stats.snapshot(reset=True)
+            if summary:
+                self._write_summary(summary)
+
+    def _write_summary(self, summary):
+        anchor = logging.makeLogRecord({'name': logger.name, 'module': 'querylog'})
+        self._write(anchor, f'查询指纹汇总: {len(summary)} 个指纹，按总耗时列出前 {self.summary_top} 个', logging.INFO)
+        for item in summary[:self.summary_top]:
+            views = ','.join(f'{name}({count})' for name, count in item['views'][:3])
+            self._write(
+                anchor,
+                f'指纹={item["fingerprint"]} 次数={item["count"]} 总计={item["total"] * 1000:.1f}ms '
+                f'p50={item["p50"] * 1000:.1f}ms p95={item["p95"] * 1000:.1f}ms max={item["max"] * 1000:.1f}ms '
+                f'视图={views} SQL: {item["sql"]}',
+                logging.INFO,
+            )
+
+    def close(self):
+        # 进程退出（logging.shutdown）时写出最后一个窗口的汇总
+        try:
+            self.write_summary()
+        finally:
+            super().close()
+
+
+def set_current_view(name):
+    """设置当前请求的视图名称，返回用于恢复的token"""
+    return current_view.set(name)
+
+
+# ==================== 非DEBUG模式的查询计时 ====================
+
+# 同一条SQL（参数为占位符）反复执行，指纹按SQL文本缓存
+_cached_fingerprint = lru_cache(maxsize=2048)(fingerprint)
+
+# 下一次请求写出汇总的时间（time.monotonic()）
+_next_summary = None
+
+
+def _summary_due(now):
+    """是否到了写出汇总的时间（汇总由日志处理器在写入线程中完成）"""
+    global _next_summary
+    interval = getattr(settings, 'SLOW_QUERY_SUMMARY_INTERVAL', 300)
+    if not interval:
+        return False
+    if _next_summary is None:
+        _next_summary = now + interval
+        return False
+    if now < _next_summary:
+        return False
+    _next_summary = now + interval
+    return True
+
+
+def _log_query(execute, sql, params, many, context):
+    """
+    数据库执行包装器：Django未记录查询（非DEBUG）时计时并直接计入指纹汇总，
+    只有慢查询才输出 django.db.backends 日志记录（WARNING）
+    """
+    connection = context['connection']
+    if connection.queries_logged and logger.isEnabledFor(logging.DEBUG):
+        # Django自身会输出每条查询的DEBUG日志，由 SlowQueryHandler 汇总
+        return execute(sql, params, many, context)
+    if not logger.isEnabledFor(logging.WARNING):
+        return execute(sql, params, many, context)
+
+    started = time.monotonic()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        finished = time.monotonic()
+        duration = finished - started
+        view = current_view.get() or NO_VIEW
+        digest, normalized = _cached_fingerprint(sql)
+        query_stats.record(digest, normalized, duration, view)
+
+        if duration * 1000 >= getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 200):
+            logger.warning(
+                '(%.3f) %s; args=%s; alias=%s',
+                duration, sql, params, connection.alias,
+                extra={'duration': duration, 'sql': sql, 'params': params, 'alias': connection.alias,
+                       'view': view, 'fingerprint': digest},
+            )
+        if _summary_due(finished):
+            logger.warning('查询指纹汇总', extra={'summary_due': True})
+
+
+def _install_query_logger(sender, connection, **kwargs):
+    """每个数据库连接建立时挂上计时包装器（持久连接重连时不重复挂载）"""
+    if _log_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_log_query)
+
+
+connection_created.connect(_install_query_logger, dispatch_uid='meowsite_querylog_timer')
@@ -0,0 +1,99 @@
+"""
+静态文件存储模块
+在 ManifestStaticFilesStorage（文件名带内容哈希 + staticfiles.json 清单）的基础上，
+collectstatic 时为CSS、JS、SVG等文本文件生成预压缩的 .gz（以及可选的 .br）文件，
+nginx 通过 gzip_static / brotli_static 直接发送，不必每次请求都压缩
+
+增量处理：
+    带哈希的文件名由内容决定，文件名不变即内容不变。已存在的带哈希文件不会重新写入，
+    已有压缩副本的文件不会重新压缩，重复部署时只处理真正改动过的文件。
+
+配置：
+    STATIC_COMPRESS_BROTLI    是否生成 .br（默认关闭，nginx 打开 brotli_static 后再启用；需安装 brotli 包，未安装时自动跳过）
+    STATIC_COMPRESS_MIN_SIZE  小于该字节数的文件不压缩
+"""
+import gzip
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 获取日志记录器
+logger = logging.getLogger('core')
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = ['CompressedManifestStaticFilesStorage', 'COMPRESSIBLE_EXTENSIONS']
+
+# 值得压缩的文本类型（图片、字体等已压缩格式不处理）
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico',
+}
+
+# 压缩后至少要缩小到原大小的这个比例才保留压缩副本
+MIN_COMPRESSION_RATIO = 0.95
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """带内容哈希和清单的静态文件存储，并为文本文件生成 .gz / .br 预压缩副本"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.brotli_enabled = getattr(settings, 'STATIC_COMPRESS_BROTLI', False) and brotli is not None
+        self.min_size = getattr(settings, 'STATIC_COMPRESS_MIN_SIZE', 256)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        # 多轮处理的CSS会产生中间文件名，只压缩清单中的最终文件名
+        started = time.perf_counter()
+        created = skipped = 0
+        for hashed_name in set(self.hashed_files.values()):
+            new, existing = self.compress_file(hashed_name)
+            created += new
+            skipped += existing
+        logger.info(
+            f'静态文件预压缩: 新生成 {created} 个, 已存在跳过 {skipped} 个, '
+            f'耗时 {(time.perf_counter() - started) * 1000:.0f}ms'
+        )
+
+    def compressors(self):
+        """[(后缀, 压缩函数)]；gzip 固定 mtime=0，相同内容得到相同的压缩结果"""
+        result = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+        if self.brotli_enabled:
+            result.append(('.br', lambda data: brotli.compress(data, quality=11)))
+        return result
+
+    def compress_file(self, name):
+        """
+        为一个带哈希的文件生成压缩副本，返回 (新生成数, 已存在跳过数)。
+        非文本类型、过小或压缩收益不足的文件不生成副本
+        """
+        if not any(name.endswith(extension) for extension in COMPRESSIBLE_EXTENSIONS):
+            return 0, 0
+        compressors = self.compressors()
+        pending = [(suffix, compress) for suffix, compress in compressors if not self.exists(name + suffix)]
+        skipped = len(compressors) - len(pending)
+        if not pending:
+            return 0, skipped
+
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < self.min_size:
+            return 0, skipped
+        created = 0
+        for suffix, compress in pending:
+            compressed = compress(data)
+            if len(compressed) >= len(data) * MIN_COMPRESSION_RATIO:
+                continue
+            self._save(name + suffix, ContentFile(compressed))
+            created += 1
+        return created, skipped
@@ -1,3 +1,993 @@
-from django.test import TestCase
+"""
+核心模块测试
+日志文件：跨归档、滚动备份和当前文件的时间范围搜索（与逐行扫描的结果对比）、滚动后重建索引、
+跟随日志时发现滚动与截断，tail_lines 在任意块大小下与 readlines 结果一致（多字节字符跨块、CRLF、无结尾换行、空文件）
+日志归档：count_lines 计入无换行结尾的最后一行、gzip_file 中断时不留下归档和临时文件、
+同一秒修改的归档文件名依次顺延
+访问日志：延迟分位数草图的误差上界、gunicorn（微秒）与 nginx（秒）耗时字段的解析
+性能分析：异步视图跳过分析
+HTML精简：只折叠标签之间的空白，流式输入在任意位置分块时结果相同
+两级缓存：版本戳分组失效、整数计数器不进入L1、L1不超过L2剩余的过期时间、get_many 命中统计、排除前缀直接走L2
+主从路由：GET/HEAD 读副本、写操作后的 Cookie 固定读主库、写入始终走主库
+日志队列：有界队列丢弃计数、stop() 写完剩余记录、fork后换用新队列、stats()
+慢查询日志：SQL指纹归一化、水塘抽样的分位数、写入文件的SQL不含参数
+基准比较：查询次数、延迟（容差与最小差值）、内存分配的退化判断和非2xx响应
+静态文件：重复执行 collectstatic 时跳过已有的压缩副本
+运行时指标：MeteredCache 统计命中/未命中，非标准请求方法归为 other，连接池统计（需要 mysqlclient）
+"""
+import contextvars
+import gzip
+import logging
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import compression, logqueue, metrics, profiling, querylog, storage
+from .accesslog import LatencySketch, parse_line
+from .cache import MeteredCache, TieredCache
+from .db_router import PIN_COOKIE_NAME, PRIMARY_ALIAS, REPLICA_ALIAS, read_from_replica
+from .logfiles import (
+    LEVEL_RANKS, LogFollower, LogQuery, count_lines, gzip_file, load_index, log_family, parse_header,
+    tail_lines,
+)
+from .management.commands import logmanage
+from .management.commands.benchmark import compare_results
+from .middleware import ProfilingMiddleware
+
+try:
+    from .backends.mysql_pool.base import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
+
+def log_line(message, level='INFO', when='2026-10-20 01:00:00,000'):
+    return f'{level} {when} views 1 2 {message}\n'
+
+
+def write_records(path, start, count, seed):
+    """写入 count 条记录（时间从 start 起每秒一条），部分ERROR记录带堆栈行，返回写入的最后时间"""
+    generator = random.Random(seed)
+    levels = ['DEBUG', 'INFO', 'INFO', 'INFO', 'WARNING', 'ERROR']
+    when = start
+    with open(path, 'w', encoding='utf-8') as f:
+        for number in range(count):
+            level = generator.choice(levels)
+            f.write(log_line(f'request {seed}-{number} user={generator.randrange(50)}', level,
+                             when.strftime('%Y-%m-%d %H:%M:%S,000')))
+            if level == 'ERROR':
+                f.write('Traceback (most recent call last):\n  File "views.py", line 1\nValueError: boom\n')
+            when += timedelta(seconds=1)
+    return when
+
+
+def brute_force(paths, since, until, level, pattern):
+    """逐行读取全部文件，按同样的条件筛选记录"""
+    records = []
+    for path in paths:
+        opener = gzip.open if path.suffix == '.gz' else open
+        with opener(path, 'rb') as f:
+            for line in f:
+                timestamp, line_level = parse_header(line)
+                if timestamp is None:
+                    if records:
+                        records[-1][3].append(line)
+                    continue
+                records.append((path, timestamp, line_level, [line]))
+    found = []
+    for path, timestamp, record_level, lines in records:
+        text = b''.join(lines).decode()
+        if since <= timestamp <= until and LEVEL_RANKS[record_level] >= LEVEL_RANKS[level] \
+                and pattern in text:
+            found.append((path, timestamp, record_level, text))
+    return found
+
+
+class LogSearchTests(SimpleTestCase):
+    """LogQuery 跨越 .gz 归档、.N 滚动备份和当前文件搜索"""
+
+    # 采样间隔取得很小，使索引中有足够多的采样点
+    INTERVAL = 2048
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.live = Path(self.tmp.name) / 'django.log'
+        start = datetime(2026, 10, 1, 8, 0, 0)
+        # 最旧的记录在归档中，其次是滚动备份，最新的在当前文件中
+        archive_source = self.live.with_name('django.log.3')
+        start = write_records(archive_source, start, 1500, seed=1)
+        with open(archive_source, 'rb') as source, \
+                gzip.open(self.live.with_name('django.log.20261001_080000.gz'), 'wb') as target:
+            shutil.copyfileobj(source, target)
+        archive_source.unlink()
+        start = write_records(self.live.with_name('django.log.2'), start, 1500, seed=2)
+        start = write_records(self.live.with_name('django.log.1'), start, 1500, seed=3)
+        write_records(self.live, start, 1500, seed=4)
+        self.paths = log_family(self.live)
+
+    def search(self, since, until, level='DEBUG', pattern='request'):
+        for path in self.paths:
+            load_index(path, interval=self.INTERVAL)
+        query = LogQuery(since=since, until=until, level=level, pattern=pattern)
+        return query, list(query.search(self.paths))
+
+    def test_family_order(self):
+        self.assertEqual(
+            [path.name for path in self.paths],
+            ['django.log.20261001_080000.gz', 'django.log.2', 'django.log.1', 'django.log'],
+        )
+
+    def test_ranges_match_brute_force(self):
+        ranges = [
+            # 只在归档中、跨越归档和备份、跨越全部文件、只在当前文件中
+            ('2026-10-01 08:05:00', '2026-10-01 08:10:00'),
+            ('2026-10-01 08:20:00', '2026-10-01 08:30:00'),
+            ('2026-10-01 08:10:00', '2026-10-01 09:35:00'),
+            ('2026-10-01 09:30:00', '2026-10-01 09:40:00'),
+            # 不包含任何记录
+            ('2026-09-30 00:00:00', '2026-09-30 23:59:59'),
+        ]
+        for since, until in ranges:
+            for level, pattern in (('DEBUG', 'request'), ('ERROR', 'ValueError'), ('INFO', 'user=7')):
+                with self.subTest(since=since, until=until, level=level, pattern=pattern):
+                    _query, found = self.search(since, until, level, pattern)
+                    expected = brute_force(self.paths, since, until, level, pattern)
+                    self.assertEqual(found, expected)
+                    self.assertEqual(bool(expected), since >= '2026-10-01')
+
+    def test_index_skips_files_and_bytes(self):
+        query, found = self.search('2026-10-01 09:35:00', '2026-10-01 09:36:00')
+        self.assertEqual(len(found), 61)
+        # 归档和两个备份整体跳过，当前文件从采样点开始读取
+        self.assertEqual(query.files_skipped, 3)
+        self.assertLess(query.bytes_scanned, self.live.stat().st_size / 2)
+
+    def test_index_rebuilt_after_rotation(self):
+        index = load_index(self.live, interval=self.INTERVAL)
+        self.assertEqual(index['first'], '2026-10-01 09:15:00')
+        # 滚动：当前文件改名，旧索引文件仍留在原来的文件名下；新文件比旧文件更大
+        os.replace(self.live, self.live.with_name('django.log.0'))
+        write_records(self.live, datetime(2026, 10, 2, 0, 0, 0), 3000, seed=5)
+        index = load_index(self.live, interval=self.INTERVAL)
+        self.assertEqual(index['first'], '2026-10-02 00:00:00')
+        self.assertEqual(index['last'], '2026-10-02 00:49:59')
+        self.assertEqual(index['size'], self.live.stat().st_size)
+        _query, found = self.search('2026-10-02 00:10:00', '2026-10-02 00:10:59')
+        self.assertEqual(len(found), 60)
+
+
+class LogFollowerTests(SimpleTestCase):
+    """LogFollower 跨越滚动与截断读取新增记录"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / 'django.log'
+        self.path.write_text(log_line('existing'), encoding='utf-8')
+        self.follower = LogFollower(self.path)
+        self.addCleanup(self.follower.close)
+        # 第一次调用打开文件并跳到末尾
+        self.assertEqual(self.poll(), [])
+
+    def write(self, *messages, mode='a'):
+        with open(self.path, mode, encoding='utf-8') as f:
+            f.writelines(log_line(message) for message in messages)
+
+    def poll(self):
+        """两次调用：第二次没有新数据时交出最后一条记录"""
+        records = self.follower.poll() + self.follower.poll()
+        return [b''.join(lines).decode().split(' ', 6)[-1].strip() for _time, _level, lines in records]
+
+    def test_appended_records(self):
+        self.write('first', 'second')
+        self.assertEqual(self.poll(), ['first', 'second'])
+
+    def test_rotation(self):
+        self.write('before rotation')
+        os.replace(self.path, self.path.with_name('django.log.1'))
+        self.write('after rotation')
+        self.assertEqual(self.poll(), ['before rotation', 'after rotation'])
+
+    def test_truncation(self):
+        self.write('a long message that is longer than what follows')
+        self.assertEqual(self.poll(), ['a long message that is longer than what follows'])
+        self.write('short', mode='w')
+        self.assertEqual(self.poll(), ['short'])
+
+    def test_truncation_then_growth_past_previous_position(self):
+        """截断后写入的内容超过了原来的读取位置，大小比较发现不了"""
+        self.write('old record')
+        self.assertEqual(self.poll(), ['old record'])
+        self.write(*(f'new record {number}' for number in range(20)), mode='w')
+        self.assertEqual(self.poll(), [f'new record {number}' for number in range(20)])
+
+
+class TailLinesTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name, 'tail.log')
+
+    def assert_matches_readlines(self, data):
+        self.path.write_bytes(data)
+        with open(self.path, encoding='utf-8') as f:
+            expected = f.readlines()
+        for block_size in range(1, 24):
+            for lines in range(len(expected) + 2):
+                with self.subTest(block_size=block_size, lines=lines):
+                    self.assertEqual(
+                        tail_lines(self.path, lines, block_size=block_size),
+                        expected[-lines:] if lines else [],
+                    )
+
+    def test_multibyte_characters_across_blocks(self):
+        # 3字节的中文和4字节的emoji，所有块大小下都会有块边界落在字符中间
+        self.assert_matches_readlines('日志一\n喵🐱喵\n\n第四行：完成✓\n'.encode('utf-8'))
+
+    def test_crlf_line_endings(self):
+        self.assert_matches_readlines('first\r\n第二\r\n\r\nmixed\nlast\r\n'.encode('utf-8'))
+
+    def test_last_line_without_newline(self):
+        self.assert_matches_readlines('one\ntwo\n写入中'.encode('utf-8'))
+        self.assert_matches_readlines('one\r\n写入中'.encode('utf-8'))
+        self.assert_matches_readlines(b'single')
+
+    def test_empty_file(self):
+        self.path.write_bytes(b'')
+        self.assertEqual(tail_lines(self.path, 10), [])
+        self.assertEqual(tail_lines(self.path, 0), [])
+        self.path.write_bytes(b'\n')
+        self.assertEqual(tail_lines(self.path, 10, block_size=1), ['\n'])
+
+
+class LogArchiveTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = Path(directory.name)
+
+    def write(self, name, data, mtime=None):
+        path = self.dir / name
+        path.write_bytes(data)
+        if mtime is not None:
+            os.utime(path, (mtime.timestamp(), mtime.timestamp()))
+        return path
+
+    def test_count_lines(self):
+        for data, expected in ((b'', 0), (b'\n', 1), (b'a\nb\n', 2), (b'a\nb', 2), (b'a\r\n\r\nlast', 3)):
+            path = self.write('count.log', data)
+            for block_size in (1, 2, 3, 1024):
+                with self.subTest(data=data, block_size=block_size):
+                    self.assertEqual(count_lines(path, block_size=block_size), expected)
+
+    def test_gzip_file(self):
+        data = ''.join(log_line(f'记录 {number}') for number in range(500)).encode('utf-8')
+        source = self.write('django.log', data)
+        original, compressed, _seconds = gzip_file(source, self.dir / 'django.log.gz', block_size=1000)
+        self.assertEqual(original, len(data))
+        self.assertEqual(compressed, (self.dir / 'django.log.gz').stat().st_size)
+        self.assertEqual(gzip.decompress((self.dir / 'django.log.gz').read_bytes()), data)
+
+    def test_interrupted_gzip_leaves_nothing(self):
+        source = self.write('django.log', b'line\n' * 1000)
+        destination = self.dir / 'django.log.20261019_000000.gz'
+        for target, error in (('shutil.copyfileobj', KeyboardInterrupt), ('os.replace', OSError)):
+            with self.subTest(target=target), mock.patch(f'app.core.logfiles.{target}', side_effect=error):
+                with self.assertRaises(error):
+                    gzip_file(source, destination)
+                # 不留下不完整的归档，临时文件已删除
+                self.assertEqual(sorted(path.name for path in self.dir.iterdir()), ['django.log'])
+
+    def test_archive_names_move_forward_on_collision(self):
+        archive_date = datetime(2026, 10, 19)
+        same_second = datetime(2026, 10, 18, 23, 59, 58)
+        self.write('django.log', b'current\n', same_second)
+        self.write('django.log.1', b'newer backup\n', same_second)
+        self.write('django.log.2', b'older backup\n', same_second)
+        # 上次归档已占用该时间
+        self.write('django.log.20261018_235958.gz', b'')
+        # 已到归档日期或为空的文件不归档
+        self.write('error.log', b'today\n', archive_date + timedelta(hours=1))
+        self.write('db.log', b'', same_second)
+
+        jobs = logmanage.Command().collect_archive_jobs(self.dir, archive_date)
+        self.assertEqual(
+            [(source.name, archive.name, truncate) for source, archive, truncate in jobs],
+            [
+                ('django.log.2', 'django.log.20261018_235959.gz', False),
+                ('django.log.1', 'django.log.20261019_000000.gz', False),
+                ('django.log', 'django.log.20261019_000001.gz', True),
+            ],
+        )
+
+
+class ProfilingMiddlewareTests(SimpleTestCase):
+    """超级用户要求分析时，同步视图写出结果文件，异步视图跳过分析"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        with override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0, PROFILING_DIR=self.tmp.name):
+            self.middleware = ProfilingMiddleware(lambda request: HttpResponse())
+
+    def profiled_request(self):
+        request = RequestFactory().get('/', HTTP_X_PROFILE='sample')
+        request.user = SimpleNamespace(is_superuser=True)
+        self.middleware.process_request(request)
+        self.assertIsNotNone(request._profile_session)
+        return request
+
+    def test_sync_view_is_profiled(self):
+        def view(request):
+            return HttpResponse()
+
+        request = self.profiled_request()
+        self.middleware.process_view(request, view, (), {})
+        response = self.middleware.process_response(request, view(request))
+        name = response.headers[profiling.PROFILE_FILE_HEADER]
+        self.assertTrue((Path(self.tmp.name) / name).exists())
+        self.assertFalse(profiling._busy.locked())
+
+    def test_async_view_is_skipped(self):
+        async def view(request):
+            return HttpResponse()
+
+        request = self.profiled_request()
+        with self.assertLogs('core', 'INFO') as logs:
+            self.middleware.process_view(request, view, (), {})
+        self.assertIn('异步视图', logs.output[0])
+        self.assertIsNone(request._profile_session)
+        self.assertFalse(profiling._busy.locked())
+        response = self.middleware.process_response(request, HttpResponse())
+        self.assertNotIn(profiling.PROFILE_FILE_HEADER, response.headers)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+class LatencySketchTests(SimpleTestCase):
+    """分位数估计值与真实分位数的相对误差不超过 accuracy"""
+
+    FRACTIONS = (0.0, 0.01, 0.25, 0.5, 0.9, 0.95, 0.99, 0.999, 1.0)
+
+    def assertWithinBound(self, sketch, values, accuracy):
+        values = sorted(values)
+        for fraction in self.FRACTIONS:
+            expected = values[math.floor(fraction * (len(values) - 1))]
+            estimate = sketch.quantile(fraction)
+            self.assertLessEqual(abs(estimate - expected) / expected, accuracy + 1e-9,
+                                 f'p{fraction * 100:g}: {estimate} vs {expected}')
+
+    def test_error_bound(self):
+        generator = random.Random(42)
+        for accuracy in (0.01, 0.05):
+            with self.subTest(accuracy=accuracy):
+                # 对数正态分布：大部分在数十毫秒，长尾到数秒
+                values = [generator.lognormvariate(-3, 1.2) for _ in range(20000)]
+                sketch = LatencySketch(accuracy)
+                for value in values:
+                    sketch.add(value)
+                self.assertWithinBound(sketch, values, accuracy)
+                self.assertLess(len(sketch.buckets), 2000)
+
+    def test_merge(self):
+        generator = random.Random(7)
+        parts = [[generator.expovariate(20) for _ in range(3000)] for _ in range(4)]
+        merged = LatencySketch()
+        for part in parts:
+            sketch = LatencySketch()
+            for value in part:
+                sketch.add(value)
+            merged.merge(sketch)
+        values = [value for part in parts for value in part]
+        self.assertEqual(merged.count, len(values))
+        self.assertEqual(merged.max, max(values))
+        self.assertWithinBound(merged, values, 0.01)
+
+    def test_empty(self):
+        self.assertIsNone(LatencySketch().quantile(0.5))
+
+
+class AccessLogParseTests(SimpleTestCase):
+    """gunicorn %(D)s 为整数微秒，nginx $request_time 为带小数的秒"""
+
+    PREFIX = '203.0.113.7 - - [20/Oct/2026:01:00:00 +0800] "GET /blog/?page=2 HTTP/1.1" 200 5120'
+
+    def test_gunicorn_microseconds(self):
+        line = f'{self.PREFIX} "-" "Mozilla/5.0" 123456'
+        self.assertEqual(parse_line(line), ('GET', '/blog/', 200, 5120, 0.123456))
+
+    def test_nginx_seconds(self):
+        line = f'{self.PREFIX} "-" "Mozilla/5.0" 0.123'
+        self.assertEqual(parse_line(line), ('GET', '/blog/', 200, 5120, 0.123))
+
+    def test_whole_seconds_from_nginx_keep_decimal_point(self):
+        # nginx 总是输出三位小数，1秒写作 1.000，不会被当作1微秒
+        line = f'{self.PREFIX} "-" "Mozilla/5.0" 1.000'
+        self.assertEqual(parse_line(line)[4], 1.0)
+
+    def test_without_latency(self):
+        line = f'{self.PREFIX} "-" "Mozilla/5.0"'
+        self.assertEqual(parse_line(line), ('GET', '/blog/', 200, 5120, None))
+
+    def test_unrecognized(self):
+        self.assertIsNone(parse_line('not an access log line'))
+
+
+class HtmlMinifierTests(SimpleTestCase):
+    """HTML空白精简不改变文本、属性值和原样区域"""
+
+    PAGE = (
+        '<!DOCTYPE html>\n<html>\n  <head>\n    <title>猫咪  博客</title>\n'
+        '    <style>\n      p  { color: red; }\n    </style>\n  </head>\n  <body>\n'
+        '    <!-- 导航 -->\n    <ul>\n      <li title="a   b">第一   项</li>\n\n      <li>二</li>\n    </ul>\n'
+        '    <!--[if IE]><p>旧浏览器</p><![endif]-->\n'
+        '    <div class="comment-content" data-preserve-whitespace>\n      <p>first line<br>\n\n'
+        '    indented   code</p>\n      <div>\n  嵌套\n      </div>\n    </div>\n'
+        '    <pre>\n  code\n\n    more</pre>\n    <textarea>  x\n</textarea>\n'
+        '    <p>  文本  前后的空白 </p>  <span>a</span> <span>b</span>\n'
+        '    <script>\n      if (a <  b) {}\n    </script>\n  </body>\n</html>\n'
+    )
+
+    def test_only_whitespace_between_tags_is_collapsed(self):
+        self.assertEqual(
+            compression.minify_html('<ul>\n    <li>a  b</li>\n\n    <li title="x   y">c</li>\n</ul> <p>t</p>'),
+            '<ul>\n<li>a  b</li>\n<li title="x   y">c</li>\n</ul> <p>t</p>',
+        )
+
+    def test_text_content_is_unchanged(self):
+        html = '<div class="comment-content">first line\n\n\n    indented   code\n</div>'
+        self.assertEqual(compression.minify_html(html), html)
+
+    def test_page(self):
+        # 只有标签之间的缩进被折叠；文本、属性值、条件注释和原样区域逐字保留
+        self.assertEqual(compression.minify_html(self.PAGE), (
+            '<!DOCTYPE html>\n<html>\n<head>\n<title>猫咪  博客</title>\n'
+            '<style>\n      p  { color: red; }\n    </style>\n</head>\n<body>\n'
+            '<ul>\n<li title="a   b">第一   项</li>\n<li>二</li>\n</ul>\n'
+            '<!--[if IE]><p>旧浏览器</p><![endif]-->\n'
+            '<div class="comment-content" data-preserve-whitespace>\n      <p>first line<br>\n\n'
+            '    indented   code</p>\n      <div>\n  嵌套\n      </div>\n    </div>\n'
+            '<pre>\n  code\n\n    more</pre>\n<textarea>  x\n</textarea>\n'
+            '<p>  文本  前后的空白 </p> <span>a</span> <span>b</span>\n'
+            '<script>\n      if (a <  b) {}\n    </script>\n</body>\n</html>\n'
+        ))
+
+    def test_chunk_boundaries(self):
+        """流式输入在任意位置（包括标签、注释、原样区域的开始和结束标签中间）分块，结果与整体精简相同"""
+        expected = compression.minify_html(self.PAGE)
+        for chunk_size in range(1, 40):
+            with self.subTest(chunk_size=chunk_size):
+                minifier = compression.HtmlMinifier()
+                parts = [minifier.feed(self.PAGE[start:start + chunk_size])
+                         for start in range(0, len(self.PAGE), chunk_size)]
+                self.assertEqual(''.join(parts) + minifier.flush(), expected)
+
+    def test_compress_stream(self):
+        chunks = [self.PAGE[start:start + 50].encode() for start in range(0, len(self.PAGE), 50)]
+        stream = compression.compress_stream(iter(chunks), 'gzip', compression.HtmlMinifier())
+        self.assertEqual(gzip.decompress(b''.join(stream)).decode(), compression.minify_html(self.PAGE))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'tiered-l2': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tiered-l2'},
+})
+class TieredCacheTests(SimpleTestCase):
+    """两个 TieredCache 实例共用一个L2，模拟两个worker进程"""
+
+    def setUp(self):
+        self.l2 = caches['tiered-l2']
+        self.l2.clear()
+        self.addCleanup(self.l2.clear)
+        self.addCleanup(metrics.end_request)
+
+    def make_cache(self, **options):
+        options = {'STAMP_CHECK_INTERVAL': 0, 'STAMP_BUCKETS': 8, 'L1_EXCLUDE_PREFIXES': ['login_throttle:'], **options}
+        return TieredCache('tiered-l2', {'OPTIONS': options})
+
+    def key_in_other_bucket(self, cache, key):
+        bucket = cache._bucket(cache.make_key(key))
+        return next(other for other in (f'other-{i}' for i in range(100))
+                    if cache._bucket(cache.make_key(other)) != bucket)
+
+    def test_write_invalidates_other_l1_by_bucket(self):
+        writer, reader = self.make_cache(), self.make_cache()
+        other = self.key_in_other_bucket(writer, 'key')
+        writer.set_many({'key': 'v1', other: 'kept'})
+        self.assertEqual(len(self.l2.get_many(writer._stamp_keys)), 2)
+        self.assertEqual((reader.get('key'), reader.get(other)), ('v1', 'kept'))
+
+        writer.set('key', 'v2')
+        hits = reader.l1_hits
+        self.assertEqual(reader.get('key'), 'v2')
+        # 只丢弃被写入的分组，其他分组的L1条目仍然命中
+        self.assertEqual(reader.get(other), 'kept')
+        self.assertEqual(reader.l1_hits, hits + 1)
+
+        writer.delete('key')
+        self.assertIsNone(reader.get('key'))
+
+    def test_stale_l1_until_stamp_check(self):
+        writer, reader = self.make_cache(), self.make_cache(STAMP_CHECK_INTERVAL=3600)
+        writer.set('key', 'v1')
+        self.assertEqual(reader.get('key'), 'v1')
+        writer.set('key', 'v2')
+        # 检查间隔内读取L1中的旧值，这是跨进程失效延迟的上限
+        self.assertEqual(reader.get('key'), 'v1')
+        reader._stamp_checked_at = 0.0
+        self.assertEqual(reader.get('key'), 'v2')
+
+    def test_integer_counters_skip_l1(self):
+        writer, reader = self.make_cache(), self.make_cache()
+        writer.set('count', 5)
+        self.assertEqual(self.l2.get('count'), 5)
+        self.assertEqual(reader.get('count'), 5)
+        self.assertEqual(writer.incr('count'), 6)
+        self.assertEqual(reader.decr('count', 2), 4)
+        self.assertEqual((writer.get('count'), reader.get('count')), (4, 4))
+        self.assertEqual((len(writer._l1), len(reader._l1)), (0, 0))
+        # 布尔值不是计数器，正常进入L1
+        writer.set('flag', True)
+        self.assertIs(reader.get('flag'), True)
+        self.assertEqual(len(reader._l1), 1)
+
+    def test_l1_expires_with_l2_entry(self):
+        writer, reader = self.make_cache(), self.make_cache()
+        writer.set('key', 'value', timeout=0.3)
+        stored = self.l2.get('key')
+        self.assertEqual(stored[2], 'value')
+        self.assertAlmostEqual(stored[1], time.time() + 0.3, delta=0.1)
+
+        time.sleep(0.15)
+        # 读入L1时只保留L2中剩余的时间，而不是完整的超时或 L1_TIMEOUT
+        self.assertEqual(reader.get('key'), 'value')
+        time.sleep(0.2)
+        self.assertIsNone(reader.get('key'))
+        self.assertIsNone(writer.get('key'))
+
+    def test_get_many_counts(self):
+        writer, reader = self.make_cache(), self.make_cache()
+        writer.set_many({'a': 1.5, 'b': 'text', 'login_throttle:x': 'raw'})
+        stats = metrics.begin_request()
+        keys = ['a', 'b', 'login_throttle:x', 'missing']
+        expected = {'a': 1.5, 'b': 'text', 'login_throttle:x': 'raw'}
+
+        self.assertEqual(reader.get_many(keys), expected)
+        self.assertEqual((reader.l1_hits, reader.l1_misses), (0, 3))
+        self.assertEqual(reader.get_many(keys), expected)
+        self.assertEqual((reader.l1_hits, reader.l1_misses), (2, 4))
+        self.assertEqual((stats.cache_hits, stats.cache_misses), (6, 2))
+
+    def test_excluded_prefix_bypasses_l1(self):
+        writer, reader = self.make_cache(), self.make_cache(STAMP_CHECK_INTERVAL=3600)
+        writer.set('login_throttle:ip', 'first')
+        self.assertEqual(reader.get('login_throttle:ip'), 'first')
+        # 直接保存原值，不附带过期时间，也不递增版本戳
+        self.assertEqual(self.l2.get('login_throttle:ip'), 'first')
+        self.assertEqual(self.l2.get_many(writer._stamp_keys), {})
+
+        writer.set('login_throttle:ip', 'second')
+        self.assertEqual(reader.get('login_throttle:ip'), 'second')
+        self.assertEqual((len(writer._l1), len(reader._l1)), (0, 0))
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    replica 别名与 default 连接同一个SQLite内存数据库（没有复制延迟的副本），
+    按别名分别记录查询来判断读写走了哪个库
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # 测试数据库创建之后才知道 default 的内存数据库名，副本别名在这里加入并直接建立连接
+        replica = dict(connections[PRIMARY_ALIAS].settings_dict)
+        cls.enterClassContext(mock.patch.dict(settings.DATABASES, {REPLICA_ALIAS: replica}))
+        cls.enterClassContext(mock.patch.dict(connections.settings, {REPLICA_ALIAS: replica}))
+        cls.addClassCleanup(cls.drop_replica_connection)
+        connections[REPLICA_ALIAS].connect()
+
+    @classmethod
+    def drop_replica_connection(cls):
+        if hasattr(connections._connections, REPLICA_ALIAS):
+            del connections[REPLICA_ALIAS]
+
+    def capture(self, func, *args, **kwargs):
+        """执行 func，返回 (结果, 主库查询, 副本查询)"""
+        with CaptureQueriesContext(connections[PRIMARY_ALIAS]) as primary, \
+                CaptureQueriesContext(connections[REPLICA_ALIAS]) as replica:
+            result = func(*args, **kwargs)
+        return result, [q['sql'] for q in primary.captured_queries], [q['sql'] for q in replica.captured_queries]
+
+    def test_safe_methods_read_replica(self):
+        url = reverse('blog:post_list')
+        for method in (self.client.get, self.client.head):
+            response, primary, replica = self.capture(method, url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(primary, [])
+            self.assertTrue(replica)
+
+        # 其他请求方法即使经过装饰器也读主库
+        view = read_from_replica(lambda request: User.objects.count())
+        _, primary, replica = self.capture(view, RequestFactory().post('/'))
+        self.assertEqual((len(primary), replica), (1, []))
+
+    def test_pin_cookie_after_write(self):
+        response = self.client.post(reverse('accounts:login'), {'username': 'nobody', 'password': 'x'})
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
+        self.assertEqual(response.cookies[PIN_COOKIE_NAME]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+        response, primary, replica = self.capture(self.client.get, reverse('blog:post_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(primary)
+        self.assertEqual(replica, [])
+
+        # 读请求不设置 Cookie
+        self.client.cookies.pop(PIN_COOKIE_NAME)
+        response, primary, replica = self.capture(self.client.get, reverse('blog:post_list'))
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+        self.assertTrue(replica)
+
+    def test_writes_go_to_primary(self):
+        @read_from_replica
+        def view(request):
+            user = User.objects.create(username='replica-writer')
+            user.first_name = 'changed'
+            user.save(update_fields=['first_name'])
+            # 会话数据写入后立即读取，始终走主库
+            Session.objects.filter(session_key='missing').exists()
+            return User.objects.filter(username='replica-writer').exists()
+
+        exists, primary, replica = self.capture(view, RequestFactory().get('/'))
+        self.assertTrue(exists)
+        self.assertTrue(any(sql.startswith('INSERT') for sql in primary))
+        self.assertTrue(any(sql.startswith('UPDATE') for sql in primary))
+        self.assertTrue(any('django_session' in sql for sql in primary))
+        self.assertEqual(len(replica), 1)
+        self.assertIn('auth_user', replica[0])
+
+
+class CollectingHandler(logging.Handler):
+    """记录处理过的消息及处理时所在的线程"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+        self.threads.add(threading.current_thread().name)
+
+
+class LogQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.collector = CollectingHandler()
+        self.logger = logging.getLogger('logqueue-test')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(self.collector)
+        self.addCleanup(self.logger.removeHandler, self.collector)
+        self.addCleanup(logqueue.stop)
+
+    def proxy(self, pipeline):
+        """把测试日志记录器的处理器换成队列代理"""
+        proxy = logqueue.QueueProxyHandler(pipeline, [self.collector])
+        self.logger.removeHandler(self.collector)
+        self.logger.addHandler(proxy)
+        self.addCleanup(self.logger.removeHandler, proxy)
+        return proxy
+
+    def test_full_queue_drops_and_counts(self):
+        pipeline = logqueue.LogPipeline(maxsize=2)
+        self.proxy(pipeline)
+        for number in range(5):
+            self.logger.info('message %d', number)
+        self.assertEqual(pipeline.stats(), {'running': False, 'queued': 2, 'maxsize': 2, 'dropped': 3})
+
+        with self.assertLogs('core', 'WARNING') as logs:
+            pipeline.report_dropped()
+        self.assertIn('丢弃了 3 条日志', logs.output[0])
+        # 已报告的数量不再重复报告
+        with self.assertNoLogs('core', 'WARNING'):
+            pipeline.report_dropped()
+
+    def test_stop_flushes_queue_in_listener(self):
+        pipeline = logqueue.LogPipeline(maxsize=100)
+        self.proxy(pipeline)
+        request_id = contextvars.ContextVar('request_id')
+        handled_in = []
+        self.collector.addFilter(lambda record: handled_in.append(request_id.get(None)) or True)
+
+        values = ['before']
+        for number in range(50):
+            request_id.set(number)
+            # 消息在入队时求值，之后修改参数不影响写出的内容
+            self.logger.info('message %d %s', number, values)
+        values[0] = 'after'
+
+        pipeline.start()
+        pipeline.stop()
+        self.assertFalse(pipeline.running)
+        self.assertEqual(self.collector.messages, [f"message {n} ['before']" for n in range(50)])
+        self.assertEqual(self.collector.threads, {'log-queue-listener'})
+        # 处理器在记录入队时的上下文中运行
+        self.assertEqual(handled_in, list(range(50)))
+
+    def test_after_fork_uses_new_queue(self):
+        pipeline = logqueue.LogPipeline(maxsize=1)
+        pipeline.start()
+        old_queue, old_thread = pipeline._queue, pipeline._thread
+        self.addCleanup(old_thread.join, 5)
+        self.addCleanup(old_queue.put, logqueue._STOP)
+        pipeline.dropped = 7
+
+        pipeline.after_fork()
+        self.assertIsNot(pipeline._queue, old_queue)
+        self.assertIsNot(pipeline._thread, old_thread)
+        self.assertEqual(pipeline.stats(), {'running': True, 'queued': 0, 'maxsize': 1, 'dropped': 0})
+        pipeline.stop()
+
+        # 未启动的队列fork后仍不启动
+        idle = logqueue.LogPipeline(maxsize=1)
+        idle.after_fork()
+        self.assertFalse(idle.running)
+
+    def test_install_and_stop_restore_handlers(self):
+        self.assertIsNone(logqueue.stats())
+        pipeline = logqueue.install(maxsize=10)
+        self.assertIs(logqueue.install(), pipeline)
+        self.assertEqual(len(self.logger.handlers), 1)
+        self.assertIsInstance(self.logger.handlers[0], logqueue.QueueProxyHandler)
+        self.assertTrue(logqueue.stats()['running'])
+
+        self.logger.warning('queued')
+        logqueue.stop()
+        self.assertEqual(self.collector.messages, ['queued'])
+        self.assertEqual(self.logger.handlers, [self.collector])
+        self.assertIsNone(logqueue.stats())
+
+
+class QueryLogTests(SimpleTestCase):
+    def setUp(self):
+        querylog.query_stats.snapshot(reset=True)
+        self.addCleanup(querylog.query_stats.snapshot, reset=True)
+
+    def test_fingerprint_normalization(self):
+        digest, normalized = querylog.fingerprint(
+            "SELECT  \"t1\".\"col2\" FROM t1\n WHERE name = 'O''Brien' AND score > -1.5e3 "
+            "AND id IN (1, 2, 3) AND v = %s LIMIT 21"
+        )
+        self.assertEqual(
+            normalized,
+            'SELECT "t1"."col2" FROM t1 WHERE name = ? AND score > ? AND id IN (...) AND v = ? LIMIT ?',
+        )
+        same = [
+            "SELECT \"t1\".\"col2\" FROM t1 WHERE name = 'x' AND score > 7 AND id IN (%s) AND v = ? LIMIT 1",
+            "select \"t1\".\"col2\" from t1 where name = 'y' and score > 0 and id in (?, ?) and v = 3 limit 5",
+        ]
+        self.assertEqual(querylog.fingerprint(same[0])[0], digest)
+        # 大小写不同的SQL文本不视为同一指纹
+        self.assertNotEqual(querylog.fingerprint(same[1])[0], digest)
+        self.assertEqual(
+            querylog.fingerprint('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)')[1],
+            'INSERT INTO t (a, b) VALUES (...)',
+        )
+
+    def test_reservoir_bounds_samples(self):
+        random.seed(7)
+        stats = querylog.FingerprintStats(max_fingerprints=2, max_samples=200)
+        durations = [number / 10000 for number in range(10000)]
+        random.shuffle(durations)
+        for duration in durations:
+            stats.record('slow', 'SELECT ?', duration, 'blog:post_list' if duration < 0.25 else 'blog:post_detail')
+        stats.record('fast', 'SELECT 1', 0.001, querylog.NO_VIEW)
+        # 超过指纹数量上限后归入 <other>
+        stats.record('third', 'SELECT 2', 0.002, querylog.NO_VIEW)
+        stats.record('fourth', 'SELECT 3', 0.003, querylog.NO_VIEW)
+
+        summary = {item['fingerprint']: item for item in stats.snapshot()}
+        self.assertEqual(set(summary), {'slow', 'fast', querylog.FingerprintStats.OTHER})
+        slow = summary['slow']
+        self.assertEqual(len(stats._entries['slow']['samples']), 200)
+        self.assertEqual((slow['count'], slow['max']), (10000, 0.9999))
+        self.assertAlmostEqual(slow['total'], sum(durations))
+        # 200个样本估算的分位数与真实值相差不大
+        self.assertAlmostEqual(slow['p50'], 0.5, delta=0.1)
+        self.assertAlmostEqual(slow['p95'], 0.95, delta=0.05)
+        self.assertEqual(slow['views'], [('blog:post_detail', 7500), ('blog:post_list', 2500)])
+        self.assertEqual(summary[querylog.FingerprintStats.OTHER]['count'], 2)
+
+        self.assertEqual(stats.snapshot(reset=True)[0]['fingerprint'], 'slow')
+        self.assertEqual(stats.snapshot(), [])
+
+    def test_slow_query_file_has_no_params(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name, 'db.log')
+        handler = querylog.SlowQueryHandler(path, threshold_ms=100, summary_interval=0)
+        self.addCleanup(handler.close)
+        db_logger = logging.getLogger('django.db.backends')
+
+        def emit(duration, sql, params, **extra):
+            # 与Django及执行包装器输出的日志记录相同
+            handler.handle(db_logger.makeRecord(
+                db_logger.name, logging.DEBUG, __file__, 0, '(%.3f) %s; args=%s; alias=%s',
+                (duration, sql, params, 'default'), None,
+                extra={'duration': duration, 'sql': sql, 'params': params, 'alias': 'default', **extra},
+            ))
+
+        # DEBUG模式：Django记录的SQL已代入参数
+        emit(0.5, "SELECT * FROM auth_user WHERE email = 'secret@example.com'", ['secret@example.com'])
+        emit(0.01, "SELECT * FROM auth_user WHERE email = 'fast@example.com'", ['fast@example.com'])
+        # 非DEBUG模式：执行包装器已计入汇总，SQL为占位符
+        sql = 'UPDATE auth_user SET password = %s WHERE id = %s'
+        emit(0.3, sql, ['pbkdf2_sha256$hash', 42], fingerprint=querylog.fingerprint(sql)[0])
+        handler.write_summary()
+
+        content = path.read_text(encoding='utf-8')
+        for secret in ('secret@example.com', 'fast@example.com', 'pbkdf2_sha256', '42'):
+            self.assertNotIn(secret, content)
+        slow_lines = [line for line in content.splitlines() if '慢查询' in line]
+        self.assertEqual(len(slow_lines), 2)
+        self.assertTrue(slow_lines[0].endswith('SQL: SELECT * FROM auth_user WHERE email = ?'))
+        self.assertTrue(slow_lines[1].endswith('SQL: UPDATE auth_user SET password = ? WHERE id = ?'))
+        # DEBUG模式的记录都计入汇总，快查询不写慢查询日志
+        self.assertIn('次数=2', content)
+
+
+def bench_stats(queries=5, p50=10.0, p95=20.0, alloc=100.0, status_codes=None):
+    return {
+        'status_codes': status_codes or {'200': 20},
+        'queries': {'min': queries, 'max': queries, 'mean': queries},
+        'latency_ms': {'p50': p50, 'p95': p95},
+        'alloc_peak_kb': {'p50': alloc},
+    }
+
+
+class CompareResultsTests(SimpleTestCase):
+    def compare(self, **scenarios):
+        baseline = {'scenarios': {'page': bench_stats(), 'fast': bench_stats(p50=1.0, p95=2.0)}}
+        return compare_results(baseline, {'scenarios': scenarios}, latency_tolerance=0.25, alloc_tolerance=0.25)
+
+    def test_within_tolerance(self):
+        self.assertEqual(self.compare(page=bench_stats(queries=4, p50=12.4, p95=24.9, alloc=124)), [])
+        # 不在基线中的场景不比较
+        self.assertEqual(self.compare(new=bench_stats(queries=50)), [])
+
+    def test_regressions(self):
+        regressions = self.compare(page=bench_stats(queries=6, p50=13.0, p95=20.0, alloc=130))
+        self.assertEqual(len(regressions), 3)
+        self.assertIn('page 查询次数 5 -> 6', regressions)
+        self.assertTrue(regressions[1].startswith('page 延迟p50 10.00ms -> 13.00ms'))
+        self.assertTrue(regressions[2].startswith('page 分配峰值 100KB -> 130KB'))
+
+    def test_small_latency_delta_ignored(self):
+        # 比例超过容差但差值不足 MIN_LATENCY_DELTA_MS
+        self.assertEqual(self.compare(fast=bench_stats(p50=2.5, p95=3.9)), [])
+        self.assertEqual(len(self.compare(fast=bench_stats(p50=3.5, p95=2.0))), 1)
+
+    def test_non_2xx_responses(self):
+        regressions = self.compare(page=bench_stats(status_codes={'200': 10, '302': 8, '500': 2}))
+        self.assertEqual(regressions, ['page 状态码 302×8,500×2'])
+
+
+class CompressedStaticStorageTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.source = Path(directory.name, 'source')
+        self.root = Path(directory.name, 'root')
+        (self.source / 'css').mkdir(parents=True)
+        (self.source / 'css' / 'site.css').write_text('body { color: #333; }\n' * 50, encoding='utf-8')
+        (self.source / 'css' / 'tiny.css').write_text('a{}', encoding='utf-8')
+        (self.source / 'logo.png').write_bytes(b'\x89PNG' + bytes(1000))
+        settings_override = override_settings(
+            STATIC_ROOT=self.root,
+            STATICFILES_DIRS=[self.source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STORAGES={**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'app.core.storage.CompressedManifestStaticFilesStorage',
+            }},
+            STATIC_COMPRESS_BROTLI=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def collectstatic(self):
+        with self.assertLogs('core', 'INFO') as logs, \
+                mock.patch.object(storage.gzip, 'compress', wraps=gzip.compress) as compress:
+            call_command('collectstatic', interactive=False, verbosity=0)
+        summary = next(line for line in logs.output if '静态文件预压缩' in line)
+        return summary, compress.call_count
+
+    def test_second_run_skips_compressed_files(self):
+        summary, compressed = self.collectstatic()
+        self.assertIn('新生成 1 个, 已存在跳过 0 个', summary)
+        self.assertEqual(compressed, 1)
+        gz_files = list(self.root.glob('css/site.*.css.gz'))
+        self.assertEqual(len(gz_files), 1)
+        # 过小和非文本文件不生成副本
+        self.assertEqual(sorted(path.name for path in self.root.rglob('*.gz')), [gz_files[0].name])
+        self.assertEqual(gzip.decompress(gz_files[0].read_bytes()), (self.source / 'css' / 'site.css').read_bytes())
+        written = gz_files[0].stat().st_mtime_ns
+
+        summary, compressed = self.collectstatic()
+        self.assertIn('新生成 0 个, 已存在跳过 1 个', summary)
+        self.assertEqual(compressed, 0)
+        self.assertEqual(gz_files[0].stat().st_mtime_ns, written)
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = MeteredCache('local', {})
+        self.cache.backend.clear()
+        self.addCleanup(self.cache.backend.clear)
+        self.addCleanup(metrics.end_request)
+
+    def sample(self, name, **labels):
+        return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_metered_cache_records_hits_and_misses(self):
+        stats = metrics.begin_request()
+        self.cache.set('a', 1)
+        self.cache.set('b', None)
+        self.assertEqual(self.cache.get('a'), 1)
+        # 缓存的 None 仍是命中
+        self.assertIsNone(self.cache.get('b', 'default'))
+        self.assertEqual(self.cache.get('missing', 'default'), 'default')
+        self.assertEqual(self.cache.get_many(['a', 'missing', 'other']), {'a': 1})
+        self.assertEqual((stats.cache_hits, stats.cache_misses), (3, 3))
+        # 写入经由被包装的缓存
+        self.assertEqual(self.cache.backend.get('a'), 1)
+        self.assertEqual(self.cache.incr('a'), 2)
+
+    def test_unknown_method_label(self):
+        view = 'metrics-test'
+        request = RequestFactory().generic('PROPFIND', '/')
+        request.resolver_match = SimpleNamespace(view_name=view)
+        before = self.sample('meowsite_http_requests_total', view=view, method='other', status='200')
+        metrics.observe_request(request, HttpResponse('ok'), metrics.begin_request())
+        after = self.sample('meowsite_http_requests_total', view=view, method='other', status='200')
+        self.assertEqual(after - before, 1)
+        self.assertEqual(self.sample('meowsite_http_requests_total', view=view, method='PROPFIND', status='200'), 0)
+
+    @skipIf(ConnectionPool is None, 'mysqlclient 未安装')
+    def test_pool_stats_exported(self):
+        alias = 'metrics-test'
+        pool = ConnectionPool(alias, {'MAX_SIZE': 1, 'TIMEOUT': 0.01, 'MAX_LIFETIME': 0, 'PING_INTERVAL': 3600})
+        events = {event: self.sample('meowsite_db_pool_events_total', alias=alias, event=event)
+                  for event in ('opens', 'reuses', 'waits', 'timeouts')}
+
+        raw, reused = pool.acquire(lambda: SimpleNamespace(close=lambda: None))
+        self.assertFalse(reused)
+        self.assertEqual(self.sample('meowsite_db_pool_connections', alias=alias, state='in_use'), 1)
+        with self.assertRaises(Exception):
+            pool.acquire(lambda: self.fail('连接池已满时不应新建连接'))
+        pool.release(raw)
+        self.assertEqual(pool.acquire(lambda: self.fail('应复用空闲连接')), (raw, True))
+        pool.release(raw)
+
+        for event, expected in (('opens', 1), ('reuses', 1), ('waits', 1), ('timeouts', 1)):
+            value = self.sample('meowsite_db_pool_events_total', alias=alias, event=event)
+            self.assertEqual(value - events[event], expected, event)
+        self.assertEqual(self.sample('meowsite_db_pool_connections', alias=alias, state='idle'), 1)
+        self.assertEqual(self.sample('meowsite_db_pool_connections', alias=alias, state='in_use'), 0)
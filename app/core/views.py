@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, Http404
 from django.shortcuts import render
 
+from . import metrics as runtime_metrics
+
 def homepage(request):
     return render(request, 'core/homepage.html')
 
@@ -17,4 +23,24 @@ def privacy_policy(request):
 
 def disclaimer(request):
     """免责声明页面"""
-    return render(request, 'core/disclaimer.html')
\ No newline at end of file
+    return render(request, 'core/disclaimer.html')
+
+
+def metrics(request):
+    """
+    Prometheus指标接口
+    配置了 METRICS_TOKEN 时凭 Authorization: Bearer <token> 访问，否则仅限超级管理员
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+
+    token = settings.METRICS_TOKEN
+    if token:
+        provided = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        allowed = hmac.compare_digest(provided.encode(), token.encode())
+    else:
+        allowed = request.user.is_authenticated and request.user.is_superuser
+    if not allowed:
+        return HttpResponseForbidden()
+
+    return HttpResponse(runtime_metrics.render_metrics(), content_type=runtime_metrics.CONTENT_TYPE_LATEST)
@@ -1,6 +1,31 @@
 # Gunicorn 配置文件
+import gc
 import multiprocessing
 import os
+import sys
+import tempfile
+
+# 主进程在preload加载应用期间暂停GC，避免GC遍历对象导致fork后的内存页被写入而失去共享
+PRELOAD_GC_FREEZE = os.getenv('GUNICORN_GC_FREEZE', 'True').lower() == 'true'
+if PRELOAD_GC_FREEZE:
+    gc.disable()
+
+# 确保可以导入项目模块（meowsite.server_hooks 等）
+project_root = os.path.dirname(os.path.abspath(__file__))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from meowsite.server_hooks import MemoryWatchdog, reset_metrics_dir
+
+# 多进程指标目录：各worker把指标写入该目录，/metrics 汇总所有worker
+# 必须在加载应用（preload）之前设置，启动时清空上一次运行留下的数据
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+if METRICS_ENABLED:
+    os.environ.setdefault(
+        'PROMETHEUS_MULTIPROC_DIR',
+        os.path.join(tempfile.gettempdir(), 'meowsite_metrics'),
+    )
+    reset_metrics_dir(os.environ['PROMETHEUS_MULTIPROC_DIR'])
 
 # 设置Django设置模块
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "meowsite.settings_production")
@@ -10,14 +35,39 @@ bind = "0.0.0.0:8000"
 backlog = 2048
 
 # Worker 进程
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# GUNICORN_WORKER_CLASS 可选：
+#   sync    - 每个进程同时处理一个请求（默认）
+#   gthread - 每个进程内多个线程，进程数少、内存占用低（线程数由 GUNICORN_THREADS 控制）
+#   uvicorn - ASGI worker（需安装uvicorn，并以 meowsite.asgi:application 启动）
+WORKER_MODE = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+if WORKER_MODE == 'uvicorn':
+    worker_class = "uvicorn.workers.UvicornWorker"
+    # 进程数与sync模式相同：除互动接口外的视图都是同步视图，在ASGI下由每个进程的
+    # 单个线程（thread_sensitive）依次执行，减少进程数会降低这些页面的并发能力
+    wsgi_app = "meowsite.asgi:application"
+    # 预加载应用前设置：ASGI下不使用持久连接（或启用 DB_POOL），见 settings_production.py
+    os.environ.setdefault("ASGI_SERVER", "true")
+elif WORKER_MODE == 'gthread':
+    worker_class = "gthread"
+    # 请求大部分时间在等待数据库，每个进程用多个线程即可充分利用CPU
+    workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() + 1))
+    threads = int(os.getenv('GUNICORN_THREADS', '4'))
+else:
+    worker_class = "sync"
 worker_connections = 1000
 timeout = 120
 keepalive = 2
 
 # 重启
-max_requests = 1000
+# 默认由内存看门狗按RSS回收worker（GUNICORN_MAX_RSS_MB，0 表示关闭），
+# 关闭看门狗时回退到按请求数回收
+WORKER_MAX_RSS_MB = int(os.getenv('GUNICORN_MAX_RSS_MB', '512'))
+WORKER_RSS_CHECK_INTERVAL = int(os.getenv('GUNICORN_RSS_CHECK_INTERVAL', '10'))
+if WORKER_MAX_RSS_MB > 0:
+    max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+else:
+    max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
 max_requests_jitter = 50
 preload_app = True
 
@@ -26,7 +76,8 @@ log_dir = os.getenv('LOG_DIR', 'C:/var/log/meowsite')
 accesslog = os.path.join(log_dir, "gunicorn_access.log")
 errorlog = os.path.join(log_dir, "gunicorn_error.log")
 loglevel = "info"
-access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+# combined 格式，末尾附加请求耗时（微秒），供 python manage.py accesslog 统计延迟分位数
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)s'
 
 # 进程命名
 proc_name = "meowsite"
@@ -35,3 +86,74 @@ proc_name = "meowsite"
 limit_request_line = 4094
 limit_request_fields = 100
 limit_request_field_size = 8090
+
+
+# =============================================================================
+# 进程钩子
+# =============================================================================
+
+def when_ready(server):
+    """主进程完成preload后、fork worker前：预热惰性资源并冻结GC"""
+    if preload_app:
+        try:
+            from app.core.warmup import warm_up
+            warm_up()
+        except Exception as e:
+            server.log.warning(f"应用预热失败: {e}")
+    if PRELOAD_GC_FREEZE:
+        gc.collect()
+        # 把现有对象移入永久代，worker中的GC不再扫描（写入）这些对象所在的内存页
+        gc.freeze()
+        gc.enable()
+
+
+def pre_fork(server, worker):
+    """每次fork前冻结主进程中新产生的对象（重启worker时同样生效）"""
+    if PRELOAD_GC_FREEZE:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    """worker fork后丢弃从主进程继承的数据库连接，并启动内存看门狗"""
+    try:
+        from django.db import connections
+        for conn in connections.all(initialized_only=True):
+            # 不调用close()：套接字与主进程共享，关闭会影响主进程
+            conn.connection = None
+    except Exception as e:
+        server.log.warning(f"worker {worker.pid} 重置数据库连接失败: {e}")
+
+    if WORKER_MAX_RSS_MB > 0:
+        MemoryWatchdog(WORKER_MAX_RSS_MB, WORKER_RSS_CHECK_INTERVAL, log=server.log).start()
+
+
+def worker_exit(server, worker):
+    """worker退出时写完日志队列、写出慢查询指纹汇总，并记录数据库连接池统计"""
+    import logging
+    try:
+        from app.core import logqueue
+        queue_stats = logqueue.stats()
+        # 写完队列中剩余的日志，处理器还给原来的日志记录器
+        logqueue.stop()
+        if queue_stats and queue_stats['dropped']:
+            server.log.warning(f"worker {worker.pid} 日志队列累计丢弃 {queue_stats['dropped']} 条日志")
+    except Exception as e:
+        server.log.warning(f"worker {worker.pid} 写完日志队列失败: {e}")
+
+    for handler in logging.getLogger('django.db.backends').handlers:
+        if hasattr(handler, 'write_summary'):
+            handler.write_summary()
+
+    try:
+        from app.core.backends.mysql_pool.base import get_pool_stats
+    except Exception:
+        return
+    for stats in get_pool_stats():
+        server.log.info(f"worker {worker.pid} 数据库连接池统计: {stats}")
+
+
+def child_exit(server, worker):
+    """worker退出后标记其指标文件（仅影响按存活进程汇总的Gauge）"""
+    if METRICS_ENABLED:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -8,15 +8,23 @@ python log_viewer.py                                    # 查看最近50条应
 python log_viewer.py --type error                       # 查看最近50条错误日志
 python log_viewer.py --type security                    # 查看最近50条安全日志
 python log_viewer.py --tail                            # 实时监控应用日志
+python log_viewer.py --tail app error --level warning  # 同时监控多个日志（按时间合并），只显示WARNING及以上
 python log_viewer.py --lines 100                       # 查看最近100条日志
 python log_viewer.py --env dev                         # 查看开发环境日志
 python log_viewer.py --env production                  # 查看生产环境日志
+python log_viewer.py --since 2h --level warning        # 最近2小时的WARNING及以上日志（含滚动备份和归档）
+python log_viewer.py --since 2026-10-01 --until 2026-10-03 --grep "Traceback"  # 按时间范围和正则搜索
 """
 import os
+import re
 import argparse
 import time
 from pathlib import Path
 
+# 日志行解析（文本和JSON两种格式），不依赖Django
+from app.core.jsonlog import line_level
+from app.core.logfiles import LogFollower, LogQuery, log_family, parse_time_arg, tail_lines
+
 def get_log_path(log_type='app', environment='dev'):
     """获取日志文件路径"""
     base_dir = Path(__file__).resolve().parent
@@ -43,37 +51,80 @@ def read_log_lines(file_path, lines=50):
         return []
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            all_lines = f.readlines()
-            return all_lines[-lines:] if len(all_lines) > lines else all_lines
+        # 从文件末尾按块向前读取，不把整个文件读入内存
+        return tail_lines(file_path, lines)
     except Exception as e:
         print(f"读取日志文件失败: {e}")
         return []
 
-def tail_log(file_path):
-    """实时监控日志文件"""
-    if not file_path.exists():
-        print(f"日志文件不存在: {file_path}")
-        return
-    
-    print(f"正在监控日志文件: {file_path}")
+def follow_logs(log_types, environment='dev', level=None, pattern=None, interval=0.2):
+    """实时监控一个或多个日志，文件滚动或被清空后继续跟随，多个日志按时间合并输出"""
+    followers = {log_type: LogFollower(get_log_path(log_type, environment)) for log_type in log_types}
+    query = LogQuery(level=level, pattern=pattern)
+    show_type = len(followers) > 1
+
+    for log_type, follower in followers.items():
+        state = "" if follower.path.exists() else "（文件尚不存在，创建后开始显示）"
+        print(f"正在监控日志文件: {follower.path}{state}")
     print("按 Ctrl+C 停止监控\n")
-    
+
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            # 定位到文件末尾
-            f.seek(0, 2)
-            
-            while True:
-                line = f.readline()
-                if line:
-                    print(line.rstrip())
-                else:
-                    time.sleep(0.1)
+        while True:
+            batch = []
+            for log_type, follower in followers.items():
+                batch.extend((timestamp or '', log_type, record_level, record)
+                             for timestamp, record_level, record in follower.poll())
+            # 同一轮读到的记录按时间合并（排序是稳定的，同一文件内的顺序不变）
+            batch.sort(key=lambda item: item[0])
+            for timestamp, log_type, record_level, record in batch:
+                text = query.match(record, timestamp or None, record_level)
+                if text is None:
+                    continue
+                prefix = f"[{log_type}] " if show_type else ""
+                print(f"{prefix}{level_marker(record_level)} {text.rstrip()}", flush=True)
+            if not batch:
+                time.sleep(interval)
     except KeyboardInterrupt:
         print("\n监控已停止")
-    except Exception as e:
-        print(f"监控失败: {e}")
+    finally:
+        for follower in followers.values():
+            follower.close()
+
+def search_logs(log_path, since=None, until=None, level=None, pattern=None):
+    """在当前文件、滚动备份和归档中按时间范围、最低级别和正则搜索"""
+    files = log_family(log_path)
+    if not files:
+        print(f"日志文件不存在: {log_path}")
+        return
+
+    query = LogQuery(since, until, level, pattern)
+    total_bytes = sum(path.stat().st_size for path in files)
+    print(f"=== 搜索 {len(files)} 个日志文件 "
+          f"({since or '最早'} ~ {until or '最新'}"
+          f"{'，级别 ≥ ' + level.upper() if level else ''}"
+          f"{'，匹配 ' + pattern if pattern else ''}) ===\n")
+
+    matched = 0
+    try:
+        for _path, _timestamp, record_level, record in query.search(files):
+            matched += 1
+            print(f"{level_marker(record_level)} {record.rstrip()}")
+    except KeyboardInterrupt:
+        print("\n搜索已中断")
+
+    print(f"\n共 {matched} 条匹配；读取 {query.bytes_scanned / (1024 * 1024):.2f} MB"
+          f"（日志共 {total_bytes / (1024 * 1024):.2f} MB，压缩文件按解压后计），"
+          f"跳过时间范围外的文件 {query.files_skipped} 个")
+
+def level_marker(level):
+    """日志级别对应的颜色标识"""
+    if level in ('ERROR', 'CRITICAL'):
+        return "🔴"
+    if level == 'WARNING':
+        return "🟡"
+    if level == 'INFO':
+        return "🔵"
+    return "⚪"
 
 def format_log_output(lines, log_type):
     """格式化日志输出"""
@@ -89,14 +140,7 @@ def format_log_output(lines, log_type):
             continue
             
         # 根据日志级别添加颜色标识
-        if 'ERROR' in line:
-            print(f"🔴 {line}")
-        elif 'WARNING' in line:
-            print(f"🟡 {line}")
-        elif 'INFO' in line:
-            print(f"🔵 {line}")
-        else:
-            print(f"⚪ {line}")
+        print(f"{level_marker(line_level(line))} {line}")
 
 def show_log_summary(environment='dev'):
     """显示日志文件摘要"""
@@ -112,8 +156,9 @@ def show_log_summary(environment='dev'):
             
             # 统计最近的错误和警告数量
             recent_lines = read_log_lines(log_path, 100)
-            error_count = sum(1 for line in recent_lines if 'ERROR' in line)
-            warning_count = sum(1 for line in recent_lines if 'WARNING' in line)
+            levels = [line_level(line) for line in recent_lines]
+            error_count = sum(1 for level in levels if level in ('ERROR', 'CRITICAL'))
+            warning_count = levels.count('WARNING')
             
             print(f"📁 {log_type.upper()} 日志:")
             print(f"   路径: {log_path}")
@@ -131,12 +176,19 @@ def main():
                        default='app', help='日志类型 (默认: app)')
     parser.add_argument('--lines', type=int, default=50, 
                        help='显示的行数 (默认: 50)')
-    parser.add_argument('--tail', action='store_true', 
-                       help='实时监控日志')
+    parser.add_argument('--tail', nargs='*', choices=['app', 'error', 'security', 'db'], metavar='TYPE',
+                       help='实时监控日志，可指定多个日志类型 (默认: --type 指定的日志)，支持 --level/--grep 过滤')
     parser.add_argument('--summary', action='store_true',
                        help='显示所有日志文件的摘要信息')
     parser.add_argument('--env', choices=['dev', 'production'], 
                        default='dev', help='环境类型 (默认: dev)')
+    parser.add_argument('--since',
+                       help='搜索起始时间：2026-10-13、"2026-10-13 08:00" 或相对时间 30m / 2h / 7d')
+    parser.add_argument('--until',
+                       help='搜索结束时间（含），只写日期时包括当天全部日志')
+    parser.add_argument('--level', type=str.upper, choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+                       help='只显示该级别及以上的日志')
+    parser.add_argument('--grep', help='只显示匹配该正则表达式的日志记录')
     
     args = parser.parse_args()
     
@@ -146,8 +198,21 @@ def main():
     
     log_path = get_log_path(args.type, args.env)
     
-    if args.tail:
-        tail_log(log_path)
+    if args.grep:
+        try:
+            re.compile(args.grep)
+        except re.error as e:
+            parser.error(f"无效的正则表达式: {e}")
+    
+    if args.tail is not None:
+        follow_logs(args.tail or [args.type], args.env, args.level, args.grep)
+    elif args.since or args.until or args.level or args.grep:
+        try:
+            since = parse_time_arg(args.since) if args.since else None
+            until = parse_time_arg(args.until, end_of_day=True) if args.until else None
+        except ValueError as e:
+            parser.error(f"无法识别的时间: {e}")
+        search_logs(log_path, since, until, args.level, args.grep)
     else:
         lines = read_log_lines(log_path, args.lines)
         format_log_output(lines, args.type)
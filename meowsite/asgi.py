@@ -24,5 +24,7 @@ if str(app_path) not in sys.path:
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "meowsite.settings_production")
+# 生产配置据此关闭持久连接（见 settings_production.py）
+os.environ.setdefault("ASGI_SERVER", "true")
 
 application = get_asgi_application()
\ No newline at end of file
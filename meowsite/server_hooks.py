@@ -0,0 +1,195 @@
+"""
+Gunicorn 进程钩子辅助模块
+供 gunicorn.conf.py 调用，不依赖Django，可在主进程和worker进程中使用
+
+提供：
+    MemoryWatchdog: worker内的内存看门狗，RSS超过阈值时让worker优雅退出，由主进程重新拉起
+    read_memory_breakdown / worker_memory_report: 统计worker独占与共享内存（Linux）
+    reset_metrics_dir: 启动时清空多进程指标目录
+
+使用方法（查看各worker独占内存，检验preload + gc.freeze 的共享效果）：
+python -m meowsite.server_hooks                     # 自动查找gunicorn主进程
+python -m meowsite.server_hooks --master-pid 12345  # 指定主进程PID
+"""
+import argparse
+import os
+import random
+import signal
+import threading
+import time
+from pathlib import Path
+
+# 模块级别特殊变量 - 遵循PEP8规范
+__all__ = [
+    'read_rss_bytes', 'MemoryWatchdog',
+    'read_memory_breakdown', 'find_gunicorn_master', 'worker_memory_report',
+    'reset_metrics_dir',
+]
+
+
+def read_rss_bytes():
+    """读取当前进程的常驻内存（RSS）字节数，无法获取时返回None"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+
+class MemoryWatchdog(threading.Thread):
+    """
+    worker内存看门狗
+    每隔 interval 秒检查一次RSS，超过阈值后向本进程发送SIGTERM，
+    worker处理完手头的请求后退出，主进程随即拉起新的worker
+    阈值附加少量随机抖动，避免所有worker同时重启
+    """
+
+    def __init__(self, max_rss_mb, interval=10, log=None, jitter=0.05):
+        super().__init__(name='memory-watchdog', daemon=True)
+        self.max_rss_bytes = int(max_rss_mb * 1024 * 1024 * (1 + random.uniform(0, jitter)))
+        self.interval = interval
+        self.log = log
+        self.started_at = time.monotonic()
+
+    def run(self):
+        pid = os.getpid()
+        while True:
+            time.sleep(self.interval)
+            rss = read_rss_bytes()
+            if rss is None:
+                if self.log:
+                    self.log.warning(f"worker {pid} 无法读取内存占用，内存看门狗停止")
+                return
+            if rss > self.max_rss_bytes:
+                if self.log:
+                    uptime = time.monotonic() - self.started_at
+                    self.log.warning(
+                        f"worker {pid} 内存超过阈值，准备回收: "
+                        f"RSS {rss / 1024 / 1024:.1f} MB > {self.max_rss_bytes / 1024 / 1024:.1f} MB, "
+                        f"已运行 {uptime:.0f} 秒"
+                    )
+                os.kill(pid, signal.SIGTERM)
+                return
+
+
+# =============================================================================
+# 多进程指标目录
+# =============================================================================
+
+def reset_metrics_dir(path):
+    """创建并清空多进程指标目录，避免上次运行的worker数据混入本次统计"""
+    directory = Path(path)
+    directory.mkdir(parents=True, exist_ok=True)
+    for entry in directory.glob('*.db'):
+        try:
+            entry.unlink()
+        except OSError:
+            pass
+
+
+# =============================================================================
+# worker内存报告
+# =============================================================================
+
+def read_memory_breakdown(pid):
+    """
+    读取进程内存构成（KB）：rss 常驻内存、pss 按共享比例分摊后的内存、
+    uss 独占内存（Private_Clean + Private_Dirty）、shared 与其他进程共享的内存
+    """
+    rollup = Path(f'/proc/{pid}/smaps_rollup')
+    source = rollup if rollup.exists() else Path(f'/proc/{pid}/smaps')
+    totals = {'Rss': 0, 'Pss': 0, 'Private_Clean': 0, 'Private_Dirty': 0,
+              'Shared_Clean': 0, 'Shared_Dirty': 0}
+    with open(source) as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in totals:
+                totals[key] += int(rest.split()[0])
+    return {
+        'rss': totals['Rss'],
+        'pss': totals['Pss'],
+        'uss': totals['Private_Clean'] + totals['Private_Dirty'],
+        'shared': totals['Shared_Clean'] + totals['Shared_Dirty'],
+    }
+
+
+def _is_gunicorn(pid):
+    """进程本身是否为gunicorn（解释器或脚本名为gunicorn，排除 timeout/sudo 等包装命令）"""
+    try:
+        argv = Path(f'/proc/{pid}/cmdline').read_bytes().split(b'\0')
+    except OSError:
+        return False
+    return any(os.path.basename(arg).startswith(b'gunicorn') for arg in argv[:2])
+
+
+def _read_ppid(pid):
+    try:
+        stat = Path(f'/proc/{pid}/stat').read_text()
+    except OSError:
+        return None
+    # 进程名可能包含空格，从最后一个右括号之后解析
+    return int(stat.rsplit(')', 1)[1].split()[1])
+
+
+def _list_pids():
+    return [int(entry.name) for entry in Path('/proc').iterdir() if entry.name.isdigit()]
+
+
+def find_gunicorn_master():
+    """查找gunicorn主进程：命令行含gunicorn且父进程不是gunicorn"""
+    for pid in _list_pids():
+        if _is_gunicorn(pid):
+            ppid = _read_ppid(pid)
+            if ppid is not None and not _is_gunicorn(ppid):
+                return pid
+    return None
+
+
+def worker_memory_report(master_pid):
+    """返回主进程及各worker的内存构成列表"""
+    pids = [master_pid] + sorted(pid for pid in _list_pids() if _read_ppid(pid) == master_pid)
+    report = []
+    for pid in pids:
+        try:
+            breakdown = read_memory_breakdown(pid)
+        except OSError:
+            continue
+        breakdown['pid'] = pid
+        breakdown['role'] = 'master' if pid == master_pid else 'worker'
+        report.append(breakdown)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='gunicorn worker内存共享报告')
+    parser.add_argument('--master-pid', type=int, help='gunicorn主进程PID（默认自动查找）')
+    args = parser.parse_args()
+
+    master_pid = args.master_pid or find_gunicorn_master()
+    if not master_pid:
+        print("未找到gunicorn主进程，请通过 --master-pid 指定")
+        return
+
+    report = worker_memory_report(master_pid)
+    print(f"=== gunicorn 内存报告 (主进程 {master_pid}) ===\n")
+    print(f"{'PID':>8} {'角色':<6} {'RSS(MB)':>9} {'PSS(MB)':>9} {'独占(MB)':>9} {'共享(MB)':>9}")
+    for item in report:
+        print(f"{item['pid']:>8} {item['role']:<8} {item['rss'] / 1024:>9.1f} {item['pss'] / 1024:>9.1f} "
+              f"{item['uss'] / 1024:>9.1f} {item['shared'] / 1024:>9.1f}")
+
+    workers = [item for item in report if item['role'] == 'worker']
+    if workers:
+        total_uss = sum(item['uss'] for item in workers) / 1024
+        total_pss = sum(item['pss'] for item in report) / 1024
+        print(f"\nworker数: {len(workers)}, worker独占内存合计: {total_uss:.1f} MB, "
+              f"平均: {total_uss / len(workers):.1f} MB, 全部进程PSS合计: {total_pss:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -61,6 +61,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 运行时指标（放在首位，耗时覆盖全部中间件）
+    "app.core.middleware.MetricsMiddleware",
+    # 请求日志上下文：请求ID、用户、视图、耗时和查询次数（LOG_FORMAT=json 时启用）
+    "app.core.middleware.RequestContextMiddleware",
+    # HTML空白精简与gzip/brotli压缩（紧随指标中间件，指标记录实际传输的字节数）
+    "app.core.middleware.CompressionMiddleware",
+
     # Django内置中间件
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -71,7 +78,11 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     
     # 项目自定义中间件
+    "app.core.middleware.ProfilingMiddleware",  # 超级用户/抽样请求的性能分析
     "app.accounts.middleware.UserStatusMiddleware",  # 用户状态检查中间件
+    "app.core.middleware.ReplicaPinMiddleware",  # 写操作后固定读主库
+    "app.core.middleware.QueryLogMiddleware",  # 慢查询日志标注调用视图
+    "app.core.middleware.QueryBudgetMiddleware",  # 开发环境查询预算检查
 ]
 
 # =============================================================================
@@ -96,6 +107,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "meowsite.wsgi.application"
+ASGI_APPLICATION = "meowsite.asgi.application"
+
+# 点赞/收藏/关注等JSON接口使用异步视图（需通过ASGI部署，默认关闭，与worker类型无关）
+ASYNC_INTERACTION_VIEWS = os.getenv('ASYNC_INTERACTION_VIEWS', 'False').lower() == 'true'
 
 # =============================================================================
 # 数据库配置
@@ -108,6 +123,12 @@ DATABASES = {
     }
 }
 
+# 主从路由：配置了 replica 别名时，只读视图的查询发往副本
+DATABASE_ROUTERS = ['app.core.db_router.PrimaryReplicaRouter']
+
+# 用户写操作后固定读主库的秒数（应大于副本的复制延迟）
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+
 
 # =============================================================================
 # 密码验证配置
@@ -178,6 +199,13 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = False  # 不在浏览器关闭时过期
 # 记住登录状态的配置
 REMEMBER_ME_DURATION = 60 * 60 * 24 * 30  # 30天
 
+# 登录限流配置 - 滑动窗口内失败次数超限后直接拒绝登录
+LOGIN_THROTTLE_WINDOW = int(os.getenv('LOGIN_THROTTLE_WINDOW', 60 * 15))  # 15分钟
+LOGIN_THROTTLE_IP_LIMIT = int(os.getenv('LOGIN_THROTTLE_IP_LIMIT', 30))
+LOGIN_THROTTLE_USERNAME_LIMIT = int(os.getenv('LOGIN_THROTTLE_USERNAME_LIMIT', 5))
+# 是否信任反向代理设置的X-Real-IP（仅在应用只能经nginx访问时开启）
+LOGIN_THROTTLE_TRUST_X_REAL_IP = os.getenv('LOGIN_THROTTLE_TRUST_X_REAL_IP', 'False').lower() == 'true'
+
 # =============================================================================
 # 日志配置
 # =============================================================================
@@ -186,6 +214,47 @@ REMEMBER_ME_DURATION = 60 * 60 * 24 * 30  # 30天
 # 注意：不在基础配置中创建目录，由具体环境配置文件决定
 LOGS_DIR = BASE_DIR / 'logs'
 
+# 慢查询阈值（毫秒），超过的查询写入 db.log；查询指纹汇总的写出间隔（秒）
+SLOW_QUERY_THRESHOLD_MS = int(os.getenv('SLOW_QUERY_THRESHOLD_MS', 200))
+SLOW_QUERY_SUMMARY_INTERVAL = int(os.getenv('SLOW_QUERY_SUMMARY_INTERVAL', 300))
+
+# 查询预算（app.core.querybudget）：默认随DEBUG开启，超出视图预算时记录警告
+QUERY_BUDGET_ENABLED = os.getenv('QUERY_BUDGET_ENABLED', str(DEBUG)).lower() == 'true'
+# 未声明预算的视图允许的查询数
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', 30))
+# 超出预算时抛出异常而不是记录警告
+QUERY_BUDGET_RAISE = os.getenv('QUERY_BUDGET_RAISE', 'False').lower() == 'true'
+# 同一SQL指纹执行达到该次数时报告为重复查询，并附带调用栈
+QUERY_BUDGET_DUPLICATE_THRESHOLD = int(os.getenv('QUERY_BUDGET_DUPLICATE_THRESHOLD', 3))
+QUERY_BUDGET_STACKS = QUERY_BUDGET_ENABLED
+
+# 响应精简与压缩（app.core.compression）：去掉HTML中的多余空白，按 Accept-Encoding 压缩文本响应
+RESPONSE_MINIFY_HTML = os.getenv('RESPONSE_MINIFY_HTML', 'True').lower() == 'true'
+RESPONSE_COMPRESSION = os.getenv('RESPONSE_COMPRESSION', 'True').lower() == 'true'
+# 客户端支持时优先使用brotli（需安装 brotli 包）
+RESPONSE_COMPRESSION_BROTLI = os.getenv('RESPONSE_COMPRESSION_BROTLI', 'True').lower() == 'true'
+# 小于该字节数的响应不处理
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', 200))
+
+# 日志队列（app.core.logqueue）：日志处理器在每个进程的后台线程中执行，请求线程只负责入队
+LOGGING_QUEUE_ENABLED = os.getenv('LOGGING_QUEUE_ENABLED', 'False').lower() == 'true'
+# 队列容量（条），队列满时丢弃新记录并计数
+LOGGING_QUEUE_SIZE = int(os.getenv('LOGGING_QUEUE_SIZE', 10000))
+
+# 请求性能分析（app.core.profiling）：超级用户的请求带 X-Profile 头或 ?_profile=1 时分析该请求
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True').lower() == 'true'
+# 默认分析方式：cprofile（.prof，pstats格式）或 sample（栈采样，.folded 火焰图格式）
+PROFILING_MODE = os.getenv('PROFILING_MODE', 'cprofile').lower()
+# 随机抽样分析：每N个请求分析一个（0 表示不抽样）
+PROFILING_SAMPLE_RATE = int(os.getenv('PROFILING_SAMPLE_RATE', 0))
+# 分析结果目录（默认为日志目录下的 profiles，随日志目录一起在环境配置中覆盖）与保留的文件数
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(LOGS_DIR / 'profiles'))
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', 200))
+
+# 日志文件格式：text（默认，verbose文本）或 json（每行一个JSON对象，带请求ID、用户、视图、耗时和查询次数，见 app.core.jsonlog）
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+FILE_LOG_FORMATTER = 'json' if LOG_FORMAT == 'json' else 'verbose'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -198,6 +267,9 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'app.core.jsonlog.JsonFormatter',
+        },
     },
     'handlers': {
         'file': {
@@ -206,7 +278,7 @@ LOGGING = {
             'filename': LOGS_DIR / 'django.log',
             'maxBytes': 1024*1024*5,  # 5MB
             'backupCount': 5,
-            'formatter': 'verbose',
+            'formatter': FILE_LOG_FORMATTER,
             'encoding': 'utf-8',
         },
         'console': {
@@ -220,7 +292,18 @@ LOGGING = {
             'filename': LOGS_DIR / 'error.log',
             'maxBytes': 1024*1024*5,  # 5MB
             'backupCount': 5,
-            'formatter': 'verbose',
+            'formatter': FILE_LOG_FORMATTER,
+            'encoding': 'utf-8',
+        },
+        'db_file': {
+            'level': 'DEBUG',
+            'class': 'app.core.querylog.SlowQueryHandler',
+            'filename': LOGS_DIR / 'db.log',
+            'threshold_ms': SLOW_QUERY_THRESHOLD_MS,
+            'summary_interval': SLOW_QUERY_SUMMARY_INTERVAL,
+            'maxBytes': 1024*1024*5,  # 5MB
+            'backupCount': 5,
+            'formatter': FILE_LOG_FORMATTER,
             'encoding': 'utf-8',
         },
     },
@@ -234,6 +317,13 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # 慢查询日志：DEBUG模式下Django为每条查询输出DEBUG日志；
+        # 非DEBUG模式由 app.core.querylog 计时，只有慢查询才产生WARNING日志，调高到ERROR即关闭
+        'django.db.backends': {
+            'handlers': ['db_file'],
+            'level': 'DEBUG' if DEBUG else 'WARNING',
+            'propagate': False,
+        },
         'django.request': {
             'handlers': ['error_file', 'console'],
             'level': 'ERROR',
@@ -261,13 +351,30 @@ LOGGING = {
 # 缓存配置
 # =============================================================================
 
+# default 通过 MeteredCache 使用 local，/metrics 中的缓存命中指标才有数据
 CACHES = {
     'default': {
+        'BACKEND': 'app.core.cache.MeteredCache',
+        'LOCATION': 'local',
+    },
+    'local': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
 }
 
+# 管理面板统计快照的刷新间隔（秒）：超过该时间未刷新时由一个请求重算，定时刷新间隔应小于该值
+DASHBOARD_METRICS_TTL = int(os.getenv('DASHBOARD_METRICS_TTL', 60 * 10))
+
+# =============================================================================
+# 运行时指标（/metrics）
+# =============================================================================
+
+# 关闭后不再记录指标，/metrics 返回404
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+# Prometheus抓取令牌（Authorization: Bearer <token>），留空时仅超级管理员可访问
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 # =============================================================================
 # 邮件配置
 # =============================================================================
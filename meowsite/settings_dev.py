@@ -60,6 +60,7 @@ LOGS_DIR.mkdir(exist_ok=True)
 # 更新日志配置中的文件路径
 LOGGING['handlers']['file']['filename'] = LOGS_DIR / 'django.log'
 LOGGING['handlers']['error_file']['filename'] = LOGS_DIR / 'error.log'
+LOGGING['handlers']['db_file']['filename'] = LOGS_DIR / 'db.log'
 
 # 缓存配置 - 开发环境使用虚拟缓存
 CACHES = {
@@ -82,7 +83,7 @@ LOGGING['loggers']['core']['level'] = 'DEBUG'
 # 添加数据库查询日志
 LOGGING['loggers']['django.db.backends'] = {
     'level': 'DEBUG',
-    'handlers': ['console'],
+    'handlers': ['console', 'db_file'],
     'propagate': False,
 }
 
@@ -94,10 +95,25 @@ LOGGING['loggers']['django.db.backends'] = {
 # INSTALLED_APPS += ['debug_toolbar']
 # MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
 
+# 查询预算检查：超出视图预算或出现重复查询时在日志中给出报告和调用栈
+QUERY_BUDGET_ENABLED = os.getenv('QUERY_BUDGET_ENABLED', 'True').lower() == 'true'
+QUERY_BUDGET_STACKS = QUERY_BUDGET_ENABLED
+
 # =============================================================================
 # 数据库配置 - 开发环境
 # =============================================================================
 
+# 本地测试主从路由：用第二个SQLite文件模拟只读副本
+# 例如先复制 db.sqlite3 为 db_replica.sqlite3，再设置 DB_REPLICA_NAME=db_replica.sqlite3
+if os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / os.getenv('DB_REPLICA_NAME'),
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+
 # 支持通过环境变量配置数据库（默认使用SQLite）
 # if os.getenv('DB_NAME'):
 #     # 如果配置了DB_NAME，则使用MySQL
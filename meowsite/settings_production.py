@@ -43,6 +43,13 @@ if not os.path.exists(LOGS_DIR):
 # 更新日志配置中的文件路径
 LOGGING['handlers']['file']['filename'] = os.path.join(LOGS_DIR, 'django.log')
 LOGGING['handlers']['error_file']['filename'] = os.path.join(LOGS_DIR, 'error.log')
+LOGGING['handlers']['db_file']['filename'] = os.path.join(LOGS_DIR, 'db.log')
+
+# 性能分析结果写入生产日志目录
+PROFILING_DIR = os.getenv('PROFILING_DIR', os.path.join(LOGS_DIR, 'profiles'))
+
+# 日志处理器在每个worker的后台线程中执行，文件写入和滚动不阻塞请求（见 app.core.logqueue）
+LOGGING_QUEUE_ENABLED = os.getenv('LOGGING_QUEUE_ENABLED', 'True').lower() == 'true'
 
 # =============================================================================
 # 安全设置 - 生产环境
@@ -79,6 +86,9 @@ SESSION_COOKIE_HTTPONLY = os.getenv('SESSION_COOKIE_HTTPONLY', 'True').lower() =
 SESSION_COOKIE_SAMESITE = os.getenv('SESSION_COOKIE_SAMESITE', 'Lax')
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 30  # 30天
 
+# 登录限流 - 生产环境经nginx代理，按X-Real-IP统计客户端IP
+LOGIN_THROTTLE_TRUST_X_REAL_IP = os.getenv('LOGIN_THROTTLE_TRUST_X_REAL_IP', 'True').lower() == 'true'
+
 # =============================================================================
 # 数据库配置 - 生产环境
 # =============================================================================
@@ -96,6 +106,9 @@ DATABASES = {
             'charset': 'utf8mb4',
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
         },
+        # 持久连接：同一线程在 CONN_MAX_AGE 秒内复用连接，请求开始时先做健康检查
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
         'TEST': {
             'CHARSET': 'utf8mb4',
             'COLLATION': 'utf8mb4_unicode_ci',
@@ -103,6 +116,39 @@ DATABASES = {
     }
 }
 
+# 可选：每个worker进程内的连接池（gthread等多线程worker下线程共享有限的连接）
+# 启用后连接在每个请求结束时归还连接池，由连接池负责复用和健康检查
+DB_POOL = os.getenv('DB_POOL', 'False').lower() == 'true'
+if DB_POOL:
+    DATABASES['default']['ENGINE'] = 'app.core.backends.mysql_pool'
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+        'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        'MAX_LIFETIME': int(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+        'PING_INTERVAL': int(os.getenv('DB_POOL_PING_INTERVAL', '30')),
+    }
+
+# ASGI部署（asgi.py 和 gunicorn.conf.py 的uvicorn模式设置 ASGI_SERVER）：同步代码在线程池中执行，
+# 持久连接按线程保存，请求结束的清理与查询不在同一线程，连接会累积到 max_connections；
+# 未启用连接池时不使用持久连接，需要复用连接请开启 DB_POOL
+ASGI_SERVER = os.getenv('ASGI_SERVER', 'False').lower() == 'true'
+if ASGI_SERVER and not DB_POOL:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
+# 只读副本：配置 DB_REPLICA_HOST 后，只读视图的查询发往副本
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+
 # 注释掉之前的SQLite配置
 # DATABASES = {
 #     'default': {
@@ -130,20 +176,66 @@ STATICFILES_DIRS = [
 STATIC_URL = os.getenv('STATIC_URL', '/static/')
 MEDIA_URL = os.getenv('MEDIA_URL', '/media/')
 
-# 生产环境性能优化
-STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+# 生产环境性能优化：静态文件名带内容哈希（可长期缓存），collectstatic 时生成 .gz/.br 预压缩副本
+# Django 5.x 只读取 STORAGES，旧的 STATICFILES_STORAGE 设置不再生效
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'app.core.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+# 生成 brotli 压缩副本（需安装 brotli 包；nginx 需要 ngx_brotli 模块并打开 brotli_static 才会使用，默认关闭）
+STATIC_COMPRESS_BROTLI = os.getenv('STATIC_COMPRESS_BROTLI', 'False').lower() == 'true'
+# 小于该字节数的文件不生成压缩副本
+STATIC_COMPRESS_MIN_SIZE = int(os.getenv('STATIC_COMPRESS_MIN_SIZE', 256))
 
 # =============================================================================
 # 缓存配置 - 生产环境
 # =============================================================================
 
-# 缓存配置（可选，提高性能）
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+# 配置 CACHE_REDIS_URL 时使用两级缓存：每个gunicorn worker内的小型LRU（L1） + 所有worker共享的Redis（L2，需安装 redis 包）；
+# 两级缓存的跨进程失效依赖L2的原子递增，文件缓存不满足，未配置Redis时直接使用本机文件缓存（不带L1，只统计命中）
+CACHE_DIR = os.getenv('CACHE_DIR', 'C:/var/cache/meowsite')
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', '')
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'app.core.cache.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'L1_MAX_ENTRIES': int(os.getenv('CACHE_L1_MAX_ENTRIES', '500')),
+                'L1_TIMEOUT': int(os.getenv('CACHE_L1_TIMEOUT', '30')),
+                'STAMP_CHECK_INTERVAL': float(os.getenv('CACHE_STAMP_CHECK_INTERVAL', '1')),
+                'STAMP_BUCKETS': int(os.getenv('CACHE_STAMP_BUCKETS', '64')),
+                # 登录限流计数频繁写入，不进入L1，直接读写共享缓存
+                'L1_EXCLUDE_PREFIXES': ['login_throttle:'],
+            },
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'meowsite',
+        },
+    }
+else:
+    CACHES = {
+        # 通过 MeteredCache 统计命中/未命中
+        'default': {
+            'BACKEND': 'app.core.cache.MeteredCache',
+            'LOCATION': 'shared',
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR,
+            'KEY_PREFIX': 'meowsite',
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000')),
+            },
+        },
     }
-}
 
 # =============================================================================
 # 邮件配置 - 生产环境
@@ -167,7 +259,8 @@ if DEBUG:
     # DEBUG模式下显示SQL查询
     LOGGING['loggers']['django.db.backends'] = {
         'level': 'DEBUG',
-        'handlers': ['console'],
+        'handlers': ['console', 'db_file'],
+        'propagate': False,
     }
     
     print("DEBUG模式已启用 - 生产环境调试模式")
@@ -11,6 +11,7 @@ urlpatterns = [
     path('terms/', core_views.terms_of_service, name='terms_of_service'),
     path('privacy/', core_views.privacy_policy, name='privacy_policy'),
     path('disclaimer/', core_views.disclaimer, name='disclaimer'),
+    path('metrics', core_views.metrics, name='metrics'),
     path('blog/', include('app.blog.urls', namespace='blog')),
     # 新增：包含accounts应用的URL
     path('accounts/', include('app.accounts.urls', namespace='accounts')),
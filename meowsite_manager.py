@@ -380,7 +380,9 @@ class MeowSiteManager:
         # 检查Gunicorn (Linux/macOS推荐)
         try:
             self.run_command([str(self.python_exe), '-c', 'import gunicorn'], capture_output=True)
-            return 'gunicorn', [str(self.python_exe), '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'meowsite.wsgi:application']
+            # uvicorn worker模式需要ASGI应用入口
+            app_path = 'meowsite.asgi:application' if os.getenv('GUNICORN_WORKER_CLASS') == 'uvicorn' else 'meowsite.wsgi:application'
+            return 'gunicorn', [str(self.python_exe), '-m', 'gunicorn', '-c', 'gunicorn.conf.py', app_path]
         except subprocess.CalledProcessError:
             pass
         
@@ -20,6 +20,8 @@
             initCopyToClipboard();
             initGlobalMessages();
             initCopyMarkdown();
+            initFollowButtons();
+            initPostCards();
         }
         
         /**
@@ -563,6 +565,110 @@ ${markdownContent}
             }, 1000);
         }
         
+        /**
+         * 获取CSRF token：页面表单中的隐藏字段，或 base.html 中的 csrf-token meta 标签
+         */
+        function getCsrfToken() {
+            const input = document.querySelector('[name=csrfmiddlewaretoken]');
+            if (input && input.value) {
+                return input.value;
+            }
+            const meta = document.querySelector('meta[name=csrf-token]');
+            return meta ? meta.getAttribute('content') : '';
+        }
+        
+        /**
+         * 关注按钮（blog/includes/user_avatar.html）
+         * 在 document 上委托处理所有 .follow-btn 的点击，按钮状态来自 data- 属性：
+         * data-user-id、data-following、data-follow-url、data-unfollow-url
+         */
+        function initFollowButtons() {
+            document.addEventListener('click', function(e) {
+                const button = e.target.closest('.follow-btn[data-follow-url]');
+                if (!button) return;
+                
+                e.preventDefault();
+                e.stopPropagation();
+                if (button.disabled) return;
+                
+                const csrfToken = getCsrfToken();
+                if (!csrfToken) {
+                    showToastMessage('安全验证失败，请刷新页面后重试', 'error');
+                    return;
+                }
+                
+                const isFollowing = button.dataset.following === 'true';
+                const url = isFollowing ? button.dataset.unfollowUrl : button.dataset.followUrl;
+                const icon = button.querySelector('.follow-icon');
+                icon.textContent = '⏳ 处理中...';
+                button.disabled = true;
+                
+                fetch(url, {
+                    method: 'POST',
+                    headers: {
+                        'X-CSRFToken': csrfToken,
+                        'Content-Type': 'application/json',
+                    },
+                })
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP error! status: ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    if (data.success) {
+                        // 同步页面上同一用户的所有关注按钮
+                        updateFollowButtons(button.dataset.userId, data.is_following);
+                        if (data.message) {
+                            showToastMessage(data.message, 'success');
+                        }
+                    } else {
+                        updateFollowButtons(button.dataset.userId, isFollowing);
+                        showToastMessage(data.message || '操作失败，请重试', 'error');
+                    }
+                })
+                .catch(error => {
+                    console.error('关注操作失败:', error);
+                    updateFollowButtons(button.dataset.userId, isFollowing);
+                    let errorMessage = '操作失败，请重试';
+                    if (error.message.includes('HTTP error')) {
+                        errorMessage = '服务器错误，请稍后重试';
+                    } else if (error.message.includes('Failed to fetch')) {
+                        errorMessage = '网络连接失败，请检查网络连接';
+                    }
+                    showToastMessage(errorMessage, 'error');
+                })
+                .finally(() => {
+                    button.disabled = false;
+                });
+            });
+        }
+        
+        function updateFollowButtons(userId, isFollowing) {
+            document.querySelectorAll(`.follow-btn[data-user-id="${userId}"]`).forEach(button => {
+                const icon = button.querySelector('.follow-icon');
+                if (icon) {
+                    icon.textContent = isFollowing ? '✓ 已关注' : '+ 关注';
+                }
+                button.classList.toggle('following', isFollowing);
+                button.classList.toggle('not-following', !isFollowing);
+                button.dataset.following = isFollowing ? 'true' : 'false';
+            });
+        }
+        
+        /**
+         * 文章卡片（blog/includes/post_card.html）
+         * 点击卡片空白处跳转到 data-post-url，链接、按钮和带 data-card-click-ignore 的区域除外
+         */
+        function initPostCards() {
+            document.addEventListener('click', function(e) {
+                const card = e.target.closest('.post-card[data-post-url]');
+                if (!card || e.target.closest('a, button, [data-card-click-ignore]')) return;
+                window.location.href = card.dataset.postUrl;
+            });
+        }
+        
         // 初始化所有功能
         init();
         